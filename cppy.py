@@ -1,7 +1,8 @@
 """
 Commandline tool to interface with cppy
 """
-import argparse, sys, os
+import argparse, sys, os, time
+from cppy import batch
 
 if __name__ == "__main__":
 
@@ -10,14 +11,75 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "-i",
-        type=str, #argparse.FileType("r"),
+        type=str, action="append", #argparse.FileType("r"),
         help="The name of the python module file to convert to c++. "
-             "Should be a fully qualified filename")
+             "Should be a fully qualified filename. Can be given multiple times")
     parser.add_argument(
         "-n",
         type=str,
         help="The name of the output file, defaults to the name of the module file. "
-             "Example -n mymod, to generate mymod.h/mymod.cpp")
+             "Example -n mymod, to generate mymod.h/mymod.cpp. Only for a single module")
+    parser.add_argument(
+        "-m", "--manifest",
+        type=str,
+        help="A file containing one module file per line, optionally followed by the output name. "
+             "All modules are generated in parallel")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        help="The number of processes for generating multiple modules, defaults to the number of cpus")
+    parser.add_argument(
+        "-s", "--static",
+        action="store_true",
+        help="Read the module with the ast module instead of importing it. "
+             "No module code is executed, imports do not need to be installed")
+    parser.add_argument(
+        "--cache",
+        type=str, nargs="?", const=".cppy_cache",
+        help="Reuse the generated code of unchanged functions and classes from previous runs. "
+             "The optional argument is the cache directory, defaults to .cppy_cache")
+    parser.add_argument(
+        "--stamp",
+        type=str, choices=("date", "hash", "none"), default="date",
+        help="The first line of the generated files contains the date, a hash of the content or nothing. "
+             "Use 'hash' or 'none' to create the same files for the same input")
+    parser.add_argument(
+        "--fastcall",
+        action="store_true",
+        help="Call functions with more than one argument with METH_FASTCALL "
+             "and construct classes with vectorcall. Requires python 3.7, vectorcall 3.9")
+    parser.add_argument(
+        "--multiphase",
+        action="store_true",
+        help="Use multi-phase initialization with a module state and heap types, "
+             "so each interpreter gets it's own module. Requires python 3.11")
+    parser.add_argument(
+        "--shards",
+        type=int, default=0,
+        help="Split the classes and functions into this many .cpp files <name>_1.cpp .. <name>_N.cpp, "
+             "which can be compiled in parallel. <name>.cpp then only contains the module definition "
+             "and all files include <name>_private.h")
+    parser.add_argument(
+        "--split-header",
+        action="store_true",
+        help="Write the class structs to <name>_types.h, which is suitable as precompiled header, "
+             "and the module and class functions to <name>_api.h, which does not include Python.h. "
+             "<name>.h includes both")
+    parser.add_argument(
+        "--profile-calls",
+        action="store_true",
+        help="Count the calls and measure the time of each function, getter and setter. "
+             "The module function cppy_profile_stats() returns the statistics")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent in each stage of the generation and in each function and class")
+    parser.add_argument(
+        "--profile-out",
+        type=str,
+        help="Implies --profile. Writes the measurements to this file, in the Chrome trace format "
+             "if the filename ends with .json, otherwise the cProfile statistics of all modules, "
+             "which are then generated in a single process")
     #parser.add_argument(
     #    '-o', default=sys.stdout, type=argparse.FileType('w'),
     #    help='The output file, defaults to stdout')
@@ -28,30 +90,59 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    if not args.i:
+    jobs = []
+    for module_file in args.i or []:
+        jobs.append((module_file, None))
+    if args.manifest:
+        jobs += batch.read_manifest(args.manifest)
+
+    if not jobs:
         parser.print_help()
         exit(-1)
 
-    module_file = args.i
-    module_name = os.path.basename(module_file).split(".")[0]
     if args.n:
-        out_name = str(args.n)
-    else:
-        out_name = module_name
-    out_name = os.path.join(os.path.dirname(module_file), out_name)
+        if len(jobs) > 1:
+            print("-n can only be used with a single module")
+            exit(-1)
+        jobs[0] = (jobs[0][0], str(args.n))
 
-    print("Importing module '%s'" % module_name)
+    stamp = None if args.stamp == "none" else args.stamp
+    options = {
+        "stamp": stamp,
+        "fastcall": args.fastcall,
+        "multiphase": args.multiphase,
+        "profile": args.profile_calls,
+        "shards": args.shards,
+        "split_header": args.split_header,
+    }
+    jobs = [{"module_file": module_file, "out_name": out_name, "cache": args.cache, "static": args.static,
+             "profiler": args.profile or bool(args.profile_out), "options": options}
+            for module_file, out_name in jobs]
 
-    # Python 3.4 way
-    from importlib.machinery import SourceFileLoader
-    module = SourceFileLoader(module_name, module_file).load_module()
-
-    from cppy import compiler
-    ctx = compiler.compile(module)
+    print("Generating %d module(s)" % len(jobs))
+    start = time.perf_counter()
+    if args.profile_out and not args.profile_out.endswith(".json"):
+        import cProfile
+        cprofile = cProfile.Profile()
+        results = cprofile.runcall(batch.generate_all, jobs, 1)
+        cprofile.dump_stats(args.profile_out)
+    else:
+        results = batch.generate_all(jobs, args.jobs)
+    failed = batch.print_results(results)
 
-    print("Writing output to %s.cpp" % out_name)
-    ctx.write_to_file(out_name + ".h", ctx.render_hpp())
-    ctx.write_to_file(out_name + ".cpp", ctx.render_cpp())
+    if args.profile or args.profile_out:
+        from cppy.profiler import Profiler
+        profiler = Profiler()
+        for r in results:
+            if "profiler" in r:
+                profiler.merge(r["profiler"])
+        print()
+        profiler.report()
+        if args.profile_out and args.profile_out.endswith(".json"):
+            profiler.save_trace(args.profile_out)
+    print("%d of %d module(s) generated in %.3fs" % (len(jobs) - failed, len(jobs), time.perf_counter() - start))
+    if failed:
+        exit(1)
 
     #ctx.context.dump()
 
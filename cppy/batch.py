@@ -0,0 +1,213 @@
+"""
+Generation of the c++ files for one or many modules,
+used by the cppy.py command line tool
+"""
+import os, sys, time, traceback
+
+
+def load_module(module_file):
+    """
+    Executes the python file in a new module object.
+    The module is only in sys.modules while it executes, and only if the name is free,
+    so modules with the same name in different directories never share their contents
+    :param module_file: str, filename of the module
+    :return: module
+    """
+    module_name = os.path.basename(module_file).split(".")[0]
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(module_name, module_file)
+    module = importlib.util.module_from_spec(spec)
+    register = module_name not in sys.modules
+    if register:
+        sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if register:
+            sys.modules.pop(module_name, None)
+    return module
+
+
+def get_out_name(module_file, out_name=None):
+    """
+    Returns the filename of the output files without extension
+    :param module_file: str, filename of the module
+    :param out_name: str, optional name of the output files, defaults to the module name
+    :return: str
+    """
+    if not out_name:
+        out_name = os.path.basename(module_file).split(".")[0]
+    return os.path.join(os.path.dirname(module_file), out_name)
+
+
+"""
+Default settings of the Renderer in generate(), each is set as attribute of the Renderer,
+e.g. {"fastcall": True} sets Renderer.fastcall. The shards and headers written depend on "shards" and "split_header"
+"""
+RENDER_OPTIONS = {
+    "stamp": "date",
+    "fastcall": False,
+    "multiphase": False,
+    "profile": False,
+    "shards": 0,
+    "split_header": False,
+}
+
+
+def generate(module_file, out_name=None, cache=None, static=False, profiler=False, options=None):
+    """
+    Imports, compiles and renders the module and writes the .h and .cpp files
+    :param module_file: str, filename of the module
+    :param out_name: str, optional name of the output files, see get_out_name()
+    :param cache: str, optional cache directory, see Renderer.use_cache()
+    :param static: bool, if True, the module is scanned with scanner.py instead of being imported
+    :param profiler: bool, if True, the result contains a profiler.Profiler with the timings
+        of each stage and code object in the "profiler" entry
+    :param options: dict, optional settings of the Renderer, see RENDER_OPTIONS.
+        With "shards", the shards are written to <out_name>_1.cpp etc. and the private header to <out_name>_private.h.
+        With "split_header", the headers are written to <out_name>_types.h and <out_name>_api.h
+    :return: dict with "module", "files", "unchanged", "timings" and "messages"
+    """
+    unknown = set(options or ()) - set(RENDER_OPTIONS)
+    if unknown:
+        raise ValueError("Unknown renderer options %s" % ", ".join(sorted(unknown)))
+    options = dict(RENDER_OPTIONS, **(options or {}))
+    result = {
+        "module": module_file,
+        "files": [],
+        "unchanged": [],
+        "timings": [],
+        "messages": [],
+    }
+    start = time.perf_counter()
+    def timing(name):
+        nonlocal start
+        t = time.perf_counter()
+        result["timings"].append((name, t - start))
+        start = t
+
+    if profiler:
+        from cppy.profiler import Profiler
+        profiler = result["profiler"] = Profiler()
+
+    out_name = get_out_name(module_file, out_name)
+    if static:
+        from cppy import scanner
+        module = _measure(profiler, "scan", module_file, lambda: scanner.load_module(module_file))
+        timing("scan")
+    else:
+        module = _measure(profiler, "import", module_file, lambda: load_module(module_file))
+        timing("import")
+
+    from cppy import compiler
+    ctx = compiler.compile(module, profiler or None)
+    for name, value in options.items():
+        setattr(ctx, name, value)
+    if cache:
+        render_cache = ctx.use_cache(cache)
+    timing("compile")
+
+    files = [(out_name + ".h", ctx.render_hpp()),
+             (out_name + ".cpp", ctx.render_cpp())]
+    if ctx.split_header:
+        files += [(out_name + "_types.h", ctx.render_types_hpp()),
+                  (out_name + "_api.h", ctx.render_api_hpp())]
+    if ctx.shards:
+        files.append((out_name + "_private.h", ctx.render_private_hpp()))
+        files += [("%s_%d.cpp" % (out_name, i + 1), code) for i, code in enumerate(ctx.render_shards())]
+    timing("render")
+
+    for filename, code in files:
+        result["files"].append(filename)
+        if not _measure(profiler, "write", filename, lambda: ctx.write_to_file(filename, code)):
+            result["unchanged"].append(filename)
+    if cache:
+        ctx.save_cache()
+        result["messages"].append("Reused %d of %d rendered objects from %s" % (
+            render_cache.hits, render_cache.hits + render_cache.misses, render_cache))
+    timing("write")
+    return result
+
+
+def _measure(profiler, stage, name, func):
+    """Returns func(), measured by the profiler if there is one"""
+    if not profiler:
+        return func()
+    with profiler.measure(stage, name):
+        return func()
+
+
+def _generate_job(job):
+    """
+    Calls generate() with the keyword arguments in the dict 'job' and returns the result,
+    or a result with the "error" entry on any exception
+    """
+    try:
+        return generate(**job)
+    except Exception:
+        return {
+            "module": job["module_file"],
+            "error": traceback.format_exc(),
+        }
+
+
+def generate_all(jobs, processes=None):
+    """
+    Runs generate() for each module in a pool of processes.
+    An exception in one module does not stop the others.
+    :param jobs: list of dicts, the keyword arguments to generate(),
+        e.g. {"module_file": "a.py", "options": {"fastcall": True}}
+    :param processes: int, number of processes, defaults to the number of cpus
+    :return: list of dicts, the results of generate() in order of 'jobs'.
+        Failed modules have an "error" entry with the traceback
+    """
+    jobs = list(jobs)
+    if len(jobs) < 2 or processes == 1:
+        return [_generate_job(j) for j in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_generate_job, jobs))
+
+
+def read_manifest(filename):
+    """
+    Reads a manifest file with one module per line.
+    Each line contains the filename of the module relative to the manifest
+    and optionally the name of the output files, separated by whitespace.
+    Empty lines and lines starting with # are ignored.
+    :return: list of tuples (module_file, out_name)
+    """
+    path = os.path.dirname(filename)
+    modules = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            if len(parts) > 2:
+                raise ValueError("Invalid line in manifest %s: '%s'" % (filename, line))
+            modules.append((os.path.join(path, parts[0]), parts[1] if len(parts) > 1 else None))
+    return modules
+
+
+def print_results(results, file=sys.stdout):
+    """
+    Prints the timings, messages and errors of each result of generate_all()
+    :return: int, the number of failed modules
+    """
+    failed = 0
+    for r in results:
+        if "error" in r:
+            failed += 1
+            file.write("%s: FAILED\n%s\n" % (r["module"], r["error"]))
+            continue
+        total = sum(t[1] for t in r["timings"])
+        file.write("%s: %.3fs (%s)\n" % (
+            r["module"], total, ", ".join("%s %.3fs" % t for t in r["timings"])))
+        for filename in r["files"]:
+            file.write("    %s%s\n" % (filename, " (unchanged)" if filename in r["unchanged"] else ""))
+        for msg in r["messages"]:
+            file.write("    %s\n" % msg)
+    return failed
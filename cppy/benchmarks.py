@@ -0,0 +1,629 @@
+"""
+Benchmarks for the code generator and the generated code
+
+Run with: python -m cppy.benchmarks [--json results.json]
+
+The generated modules are compiled against the headers of the running python
+with the c++ compiler in $CXX and the call overhead is measured inside
+the embedding executable, see bench_calls()
+"""
+import json, os, platform, subprocess, sys, sysconfig, tempfile, time, types
+from . import __version__, compiler, renderer, class_, scanner
+from .renderer import change_text_indent, is_whitespace
+
+
+def make_module_source(num_classes, num_methods, num_properties=2):
+    """
+    Creates the source of an annotated python module with many classes
+    :param num_classes: int, number of classes
+    :param num_methods: int, number of methods per class
+    :param num_properties: int, number of properties per class
+    :return: str
+    """
+    code = '"""\nGenerated benchmark module\n_CPP_:\n    #include <string>\n"""\n\n'
+    for c in range(num_classes):
+        code += '''
+class Class%(c)d:
+    """
+    Generated class number %(c)d
+    _CPP_:
+        double value;
+        std::string* name;
+    _CPP_(NEW):
+        value = %(c)d;
+        name = new std::string("$NAME()");
+    _CPP_(FREE):
+        delete name;
+    _CPP_(COPY):
+        copy->value = value;
+        *copy->name = *name;
+    """
+    def __init__(self):
+        """
+        _CPP_:
+            self->value = 0.;
+            return 0;
+        """
+    def __str__(self):
+        """
+        _CPP_:
+            return PyUnicode_FromString(self->name->c_str());
+        """
+''' % { "c": c }
+        for m in range(num_methods):
+            code += '''
+    def method%(m)d(self, other):
+        """
+        method%(m)d(Class%(c)d) -> Class%(c)d
+        Returns a modified copy
+        _CPP_:
+            if (!$IS_INSTANCE(arg1))
+                return NULL;
+            auto copy = $COPY(self);
+            copy->value += $CAST(arg1)->value * %(m)d;
+            return (PyObject*)copy;
+        """
+''' % { "c": c, "m": m }
+        for p in range(num_properties):
+            code += '''
+    @property
+    def prop%(p)d(self):
+        """
+        _CPP_:
+            return PyFloat_FromDouble(self->value + %(p)d);
+        _CPP_(SET):
+            self->value = PyFloat_AsDouble(arg1) - %(p)d;
+            return 0;
+        """
+''' % { "p": p }
+    return code
+
+
+def load_module_source(name, source):
+    """
+    Executes the source and returns a new module object
+    :return: module
+    """
+    module = types.ModuleType(name)
+    exec(compile(source, "<%s>" % name, "exec"), module.__dict__)
+    return module
+
+
+def make_module(num_classes, num_methods, num_properties=2):
+    """
+    Creates and loads a generated module, see make_module_source()
+    :return: module
+    """
+    name = "bench_%d_%d" % (num_classes, num_methods)
+    return load_module_source(name, make_module_source(num_classes, num_methods, num_properties))
+
+
+def legacy_apply_string_dict(code_, dic):
+    """
+    The former implementation of renderer.apply_string_dict(),
+    which splices each value into the complete text and rescans from the start.
+    Kept as reference for benchmarks.
+    :return: str
+    """
+    code = str(code_)
+    for key in dic:
+        skey = "%(" + key + ")s"
+        pos = code.find(skey)
+        while pos >= 0:
+            linestart = code.rfind("\n", 0, pos)
+            if linestart < 0:
+                linestart = pos
+                indent = 0
+            else:
+                linestart += 1
+                for i in range(linestart, pos):
+                    if not is_whitespace(code[i]):
+                        linestart = pos
+                        break
+                indent = pos - linestart
+            text = change_text_indent(dic[key], indent)
+            code = code[:linestart] + text + code[pos + len(skey):]
+            pos = code.find(skey)
+    return code
+
+
+def timeit(func, repeat=3):
+    """
+    Calls func() 'repeat' times
+    :return: tuple (float, result), the best time in seconds and the last result of func()
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        ret = func()
+        t = time.perf_counter() - start
+        best = t if best is None else min(best, t)
+    return best, ret
+
+
+def _strip_date(code):
+    return code[code.find("\n", 1):]
+
+
+def _render(ctx):
+    return _strip_date(ctx.render_hpp()) + _strip_date(ctx.render_cpp())
+
+
+def bench_apply_string_dict(sizes=((10, 5), (40, 10), (100, 10)), repeat=3, out=sys.stdout):
+    """
+    Compares the rendering time of generated modules using
+    the template engine and the legacy apply_string_dict()
+    """
+    out.write("# apply_string_dict: template engine vs. legacy\n")
+    out.write("%8s %8s %10s %12s %12s %8s\n" % ("classes", "methods", "size", "legacy", "template", "speedup"))
+    for num_classes, num_methods in sizes:
+        ctx = compiler.compile(make_module(num_classes, num_methods))
+
+        t_new, code_new = timeit(lambda: _render(ctx), repeat)
+
+        # the modules that call apply_string_dict()
+        patched = (renderer, class_)
+        current = renderer.apply_string_dict
+        try:
+            for m in patched:
+                m.apply_string_dict = legacy_apply_string_dict
+            t_old, code_old = timeit(lambda: _render(ctx), repeat)
+        finally:
+            for m in patched:
+                m.apply_string_dict = current
+
+        if code_new != code_old:
+            raise AssertionError("Output of template engine and legacy function differs "
+                                 "for %d classes" % num_classes)
+
+        out.write("%8d %8d %10d %11.4fs %11.4fs %7.1fx\n" % (
+            num_classes, num_methods, len(code_new), t_old, t_new, t_old / max(t_new, 1e-9)))
+
+    out.write("\n# apply_string_dict on a single template with many tags\n")
+    out.write("%8s %10s %12s %12s %8s\n" % ("tags", "size", "legacy", "template", "speedup"))
+    for num_tags in (100, 1000, 4000):
+        code = "".join("{\n    %%(key%d)s\n}\n" % i for i in range(num_tags))
+        dic = dict(("key%d" % i, "int a%d = 0;\nint b%d = 1;" % (i, i)) for i in range(num_tags))
+        t_old, code_old = timeit(lambda: legacy_apply_string_dict(code, dic), repeat)
+        t_new, code_new = timeit(lambda: renderer.apply_string_dict(code, dic), repeat)
+        if code_new != code_old:
+            raise AssertionError("Output of template engine and legacy function differs "
+                                 "for %d tags" % num_tags)
+        out.write("%8d %10d %11.4fs %11.4fs %7.1fx\n" % (
+            num_tags, len(code_new), t_old, t_new, t_old / max(t_new, 1e-9)))
+
+
+EXAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example")
+
+
+def load_example():
+    """
+    Scans example/example.py without importing it
+    :return: module
+    """
+    return scanner.load_module(os.path.join(EXAMPLE_PATH, "example.py"))
+
+
+def bench_generate(sizes=(25, 50, 100, 200), num_methods=10, repeat=3, out=sys.stdout):
+    """
+    Measures the time for compiling and rendering example/example.py
+    and generated modules of increasing number of classes
+    :return: list of dicts with the timings of each module
+    """
+    modules = [(load_example(), None, None)]
+    modules += [(make_module(num_classes, num_methods), num_classes, num_methods)
+                for num_classes in sizes]
+
+    out.write("\n# compile and render\n")
+    out.write("%-14s %8s %8s %12s %12s %12s %10s\n" % (
+        "module", "classes", "methods", "compile", "render_hpp", "render_cpp", "size"))
+    results = []
+    for module, num_classes, num_methods in modules:
+        t_compile, ctx = timeit(lambda: compiler.compile(module), repeat)
+        ctx.stamp = None
+        t_hpp, hpp = timeit(ctx.render_hpp, repeat)
+        t_cpp, cpp = timeit(ctx.render_cpp, repeat)
+        if num_classes is None:
+            num_classes = len(ctx.classes)
+        results.append({
+            "module": module.__name__,
+            "classes": num_classes,
+            "methods": num_methods,
+            "size": len(hpp) + len(cpp),
+            "compile": t_compile,
+            "render_hpp": t_hpp,
+            "render_cpp": t_cpp,
+        })
+        out.write("%-14s %8d %8s %11.4fs %11.4fs %11.4fs %10d\n" % (
+            module.__name__, num_classes, "-" if num_methods is None else num_methods,
+            t_compile, t_hpp, t_cpp, len(hpp) + len(cpp)))
+    return results
+
+
+"""
+Module for measuring the call overhead of each calling convention and slot type.
+The function bodies do as little as possible.
+"""
+CALL_MODULE_SOURCE = '''"""
+Call overhead benchmark module
+"""
+
+def noargs():
+    """
+    _CPP_:
+        Py_RETURN_NONE;
+    """
+
+def one(a):
+    """
+    _CPP_:
+        Py_INCREF(arg1);
+        return arg1;
+    """
+
+def two(a, b):
+    """
+    _CPP_:
+        PyObject* r = $ARG(1);
+        Py_INCREF(r);
+        return r;
+    """
+
+class Vec:
+    """
+    _CPP_:
+        double x;
+    """
+    count: int = 0
+
+    def __init__(self, x):
+        """
+        _CPP_:
+            if (!PyArg_ParseTuple(arg1, "|d", &self->x))
+                return -1;
+            return 0;
+        """
+
+    def __add__(self, other):
+        """
+        _CPP_:
+            if (!$IS_INSTANCE(arg0) || !$IS_INSTANCE(arg1))
+                Py_RETURN_NOTIMPLEMENTED;
+            auto o = $NEW(Vec);
+            o->x = $CAST(arg0)->x + $CAST(arg1)->x;
+            return (PyObject*)o;
+        """
+
+    def __len__(self):
+        """
+        _CPP_:
+            return 3;
+        """
+
+    def __getitem__(self, i):
+        """
+        _CPP_:
+            if (arg1 < 0 || arg1 >= 3)
+            {
+                PyErr_SetString(PyExc_IndexError, "index out of range");
+                return NULL;
+            }
+            return PyFloat_FromDouble(self->x);
+        """
+
+    @property
+    def value(self):
+        """
+        _CPP_:
+            return PyFloat_FromDouble(self->x);
+        _CPP_(SET):
+            self->x = PyFloat_AsDouble(arg1);
+            return PyErr_Occurred() ? -1 : 0;
+        """
+
+    @value.setter
+    def value(self, x):
+        pass
+
+    def get(self):
+        """
+        _CPP_:
+            return PyFloat_FromDouble(self->x);
+        """
+
+    def set(self, x):
+        """
+        _CPP_:
+            self->x = PyFloat_AsDouble(arg1);
+            if (PyErr_Occurred())
+                return NULL;
+            Py_RETURN_NONE;
+        """
+
+    def pick(self, a, b):
+        """
+        _CPP_:
+            PyObject* r = $ARG(1);
+            Py_INCREF(r);
+            return r;
+        """
+'''
+
+"""
+The call overhead benchmarks, tuples of (name, statement),
+executed with the module 'm' and an instance 'v' of m.Vec.
+"loop" is the empty timeit loop for reference
+"""
+CALL_BENCHMARKS = (
+    ("loop",                    "pass"),
+    ("METH_NOARGS",             "f0()"),
+    ("METH_O",                  "f1(1)"),
+    ("METH_VARARGS",            "f2(1, 2)"),
+    ("method METH_NOARGS",      "v.get()"),
+    ("method METH_O",           "v.set(1.)"),
+    ("method METH_VARARGS",     "v.pick(1, 2)"),
+    ("tp_new + tp_init",        "Vec(1.)"),
+    ("nb_add",                  "v + v"),
+    ("sq_length",               "len(v)"),
+    ("sq_item",                 "v[1]"),
+    ("getset get",              "v.value"),
+    ("getset set",              "v.value = 1."),
+    ("member get",              "v.count"),
+    ("member set",              "v.count = 1"),
+)
+
+CALL_SETUP = "import %(name)s as m; f0, f1, f2, Vec = m.noargs, m.one, m.two, m.Vec; v = Vec(2.)"
+
+CALL_SCRIPT = '''import json, sys, timeit
+results = []
+for name, stmt in %(benchmarks)r:
+    timer = timeit.Timer(stmt, %(setup)r)
+    best = min(timer.repeat(%(repeat)d, %(number)d))
+    results.append((name, stmt, best / %(number)d))
+with open(%(out)r, "w") as f:
+    json.dump(results, f)
+'''
+
+MAIN_CPP = '''#include <vector>
+
+#include <python3.4/Python.h>
+#include "%(header)s"
+
+int main(int argc, char** argv)
+{
+    std::vector<wchar_t*> wargs;
+    for (int i=0; i<argc; ++i)
+        wargs.push_back(Py_DecodeLocale(argv[i], NULL));
+
+    %(init)s();
+
+    return Py_Main(argc, wargs.data());
+}
+'''
+
+
+def build_variants():
+    """
+    Returns the renderer settings to build the call module with.
+    The multiphase module requires python 3.11 headers
+    :return: list of tuples (name, dict of Renderer attributes)
+    """
+    variants = [("default", {}), ("fastcall", {"fastcall": True}), ("profile", {"profile": True})]
+    if sys.version_info >= (3, 11):
+        variants.append(("multiphase", {"multiphase": True}))
+    return variants
+
+
+def build_command(sources, executable, include_dirs=()):
+    """
+    Returns the command line to compile and link an embedding executable
+    against the installed python. The compiler is taken from $CXX
+    :param sources: list of str, the c++ files
+    :param executable: str, filename of the executable
+    :param include_dirs: list of str, additional include directories
+    :return: list of str
+    """
+    return _compile_flags(include_dirs) + ["-o", executable] + list(sources) + _link_flags()
+
+
+def compile_command(source, obj, include_dirs=()):
+    """
+    Returns the command line to compile one c++ file into an object file, see build_command()
+    :return: list of str
+    """
+    return _compile_flags(include_dirs) + ["-c", "-o", obj, source]
+
+
+def link_command(objects, executable):
+    """
+    Returns the command line to link the object files into an embedding executable, see build_command()
+    :return: list of str
+    """
+    return os.environ.get("CXX", "c++").split() + ["-o", executable] + list(objects) + _link_flags()
+
+
+def _compile_flags(include_dirs):
+    paths = sysconfig.get_paths()
+    cmd = os.environ.get("CXX", "c++").split() + ["-std=c++11", "-O2"]
+    for i in list(include_dirs) + [paths["include"], paths["platinclude"]]:
+        cmd.append("-I" + i)
+    return cmd
+
+
+def _link_flags():
+    config = sysconfig.get_config_var
+    cmd = ["-L" + config("LIBDIR"), "-Wl,-rpath," + config("LIBDIR"),
+           "-lpython" + (config("LDVERSION") or config("VERSION"))]
+    return cmd + (config("LIBS") or "").split() + (config("SYSLIBS") or "").split()
+
+
+def build_module(ctx, directory, extra_sources=(), include_dirs=()):
+    """
+    Renders the compiled module into 'directory' and builds an executable
+    that embeds python with the module.
+    The generated code includes <python3.4/Python.h>, which is redirected
+    to the headers of the running python.
+    With Renderer.shards, all files are compiled in parallel and then linked.
+    With Renderer.split_header, the main file only includes the api header
+    :param ctx: Renderer returned by compiler.compile()
+    :param directory: str, existing build directory
+    :return: tuple (str, float), filename of the executable and the build time in seconds
+    """
+    name = ctx.context.name
+    include = os.path.join(directory, "include")
+    if not os.path.exists(include):
+        os.mkdir(include)
+        os.symlink(sysconfig.get_paths()["include"], os.path.join(include, "python3.4"))
+
+    ctx.stamp = None
+    files = [(name + ".h", ctx.render_hpp()), (name + ".cpp", ctx.render_cpp())]
+    if ctx.shards:
+        files.append((ctx.private_hpp_name, ctx.render_private_hpp()))
+        files += [("%s_%d.cpp" % (name, i + 1), code) for i, code in enumerate(ctx.render_shards())]
+    if ctx.split_header:
+        files += [(ctx.types_hpp_name, ctx.render_types_hpp()), (ctx.api_hpp_name, ctx.render_api_hpp())]
+    for filename, code in files:
+        with open(os.path.join(directory, filename), "w") as f:
+            f.write(code)
+    main = os.path.join(directory, "main_%s.cpp" % name)
+    with open(main, "w") as f:
+        f.write(MAIN_CPP % {
+            "header": ctx.api_hpp_name if ctx.split_header else name + ".h",
+            "init": "::".join(ctx.namespaces + ["initialize_module_" + name]),
+        })
+
+    executable = os.path.join(directory, name)
+    sources = [main] + [os.path.join(directory, f[0]) for f in files if f[0].endswith(".cpp")] \
+        + list(extra_sources)
+    include_dirs = [include, directory] + list(include_dirs)
+    start = time.perf_counter()
+    if not ctx.shards:
+        _run_build(name, [build_command(sources, executable, include_dirs)])
+    else:
+        objects = [os.path.join(directory, "%s_%d.o" % (name, i)) for i in range(len(sources))]
+        _run_build(name, [compile_command(src, obj, include_dirs) for src, obj in zip(sources, objects)])
+        _run_build(name, [link_command(objects, executable)])
+    return executable, time.perf_counter() - start
+
+
+def _run_build(name, commands):
+    """Runs the commands in parallel, raises RuntimeError with the compiler output if one fails"""
+    procs = [subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+             for cmd in commands]
+    for proc in procs:
+        output = proc.communicate()[0]
+        if proc.returncode:
+            raise RuntimeError("Building %s failed:\n%s" % (name, output))
+
+
+def run_module(executable, script):
+    """
+    Runs the python script file in the embedding executable
+    """
+    env = dict(os.environ, PYTHONHOME=sys.base_prefix)
+    subprocess.check_call([executable, script], env=env)
+
+
+def bench_build(directory, out=sys.stdout):
+    """
+    Builds example/example.py with the sources of the example,
+    once as single .cpp file and once split into shards that are compiled in parallel
+    :return: list of dicts with the build time
+    """
+    out.write("\n# build\n")
+    results = []
+    shards = max(2, min(4, os.cpu_count() or 1))
+    for variant, settings in (("default", {}), ("shards=%d" % shards, {"shards": shards})):
+        path = os.path.join(directory, "example_" + variant.replace("=", "_"))
+        os.mkdir(path)
+        ctx = compiler.compile(load_example())
+        for key in settings:
+            setattr(ctx, key, settings[key])
+        executable, seconds = build_module(ctx, path, [os.path.join(EXAMPLE_PATH, "py_utils.cpp")],
+                                           [EXAMPLE_PATH])
+        out.write("%-14s %-10s %11.2fs\n" % ("example", variant, seconds))
+        results.append({"module": "example", "variant": variant, "build": seconds})
+    return results
+
+
+def bench_calls(directory, number=200000, repeat=5, out=sys.stdout):
+    """
+    Builds the CALL_MODULE_SOURCE module for each of build_variants()
+    and measures the time per call of each CALL_BENCHMARKS statement
+    :return: tuple (list of dicts with the build times, list of dicts with the time per call)
+    """
+    name = "cppy_calls"
+    builds, results = [], []
+    for variant, settings in build_variants():
+        path = os.path.join(directory, variant)
+        os.mkdir(path)
+        ctx = compiler.compile(load_module_source(name, CALL_MODULE_SOURCE))
+        for key in settings:
+            setattr(ctx, key, settings[key])
+        executable, seconds = build_module(ctx, path)
+        builds.append({"module": name, "variant": variant, "build": seconds})
+
+        script = os.path.join(path, "bench.py")
+        result_file = os.path.join(path, "results.json")
+        with open(script, "w") as f:
+            f.write(CALL_SCRIPT % {
+                "benchmarks": CALL_BENCHMARKS,
+                "setup": CALL_SETUP % {"name": name},
+                "repeat": repeat,
+                "number": number,
+                "out": result_file,
+            })
+        run_module(executable, script)
+        with open(result_file) as f:
+            for bench, stmt, seconds in json.load(f):
+                results.append({"variant": variant, "benchmark": bench, "stmt": stmt, "call": seconds})
+
+    variants = [v[0] for v in build_variants()]
+    out.write("\n# call overhead in ns (built in %s)\n" % ", ".join(
+        "%s %.1fs" % (b["variant"], b["build"]) for b in builds))
+    out.write("%-22s %-16s" % ("benchmark", "statement") + "".join("%12s" % v for v in variants) + "\n")
+    for bench, stmt in CALL_BENCHMARKS:
+        times = dict((r["variant"], r["call"]) for r in results if r["benchmark"] == bench)
+        out.write("%-22s %-16s" % (bench, stmt)
+                  + "".join("%12.1f" % (times[v] * 1e9) for v in variants) + "\n")
+    return builds, results
+
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="cppy benchmarks")
+    parser.add_argument("--json", type=str, default=None,
+                        help="Write the results to this file")
+    parser.add_argument("--no-build", action="store_true",
+                        help="Only benchmark the code generator, do not compile the generated code")
+    parser.add_argument("--quick", action="store_true",
+                        help="Use smaller modules and fewer repetitions")
+    args = parser.parse_args(args)
+
+    results = {
+        "cppy": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "compiler": os.environ.get("CXX", "c++"),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if args.quick:
+        results["generate"] = bench_generate(sizes=(10, 25), repeat=1)
+    else:
+        bench_apply_string_dict()
+        results["generate"] = bench_generate()
+
+    if not args.no_build:
+        with tempfile.TemporaryDirectory(prefix="cppy_bench_") as directory:
+            results["build"] = bench_build(directory)
+            builds, results["calls"] = bench_calls(
+                directory, number=20000 if args.quick else 200000, repeat=3 if args.quick else 5)
+            results["build"] += builds
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -40,11 +40,65 @@ FUNCTIONS = {
     "objobjproc":           ("int",         ("PyObject*", "PyObject*")),
     "visitproc":            ("int",         ("PyObject*", "void*")),
     "traverseproc":         ("int",         ("PyObject*", "visitproc", "void*")),
+    "getbufferproc":        ("int",         ("PyObject*", "Py_buffer*", "int")),
+    "releasebufferproc":    ("void",        ("PyObject*", "Py_buffer*")),
+}
+
+"""
+Function pointers that changed in later python versions, they are only checked before that version
+typename: PY_VERSION_HEX
+"""
+FUNCTIONS_UNTIL = {
+    # python 3.8 replaced tp_print by tp_vectorcall_offset and printfunc by Py_ssize_t
+    "printfunc":            "0x03080000",
+}
+
+
+"""
+Function pointers of the fastcall calling convention, python >= 3.7 (vectorcallfunc >= 3.8).
+They are only checked in fastcall mode, see Renderer.fastcall
+typename: (return_type, (args,))
+"""
+FASTCALL_FUNCTIONS = {
+    "_PyCFunctionFast":             ("PyObject*",   ("PyObject*", "PyObject* const*", "Py_ssize_t")),
+    "_PyCFunctionFastWithKeywords": ("PyObject*",   ("PyObject*", "PyObject* const*", "Py_ssize_t", "PyObject*")),
+    "vectorcallfunc":               ("PyObject*",   ("PyObject*", "PyObject* const*", "size_t", "PyObject*")),
+}
+
+
+"""
+Python types of typed signatures as dict, see Function.get_signature():
+name: (c++ type, type check, conversion from python, error check or "", conversion to python)
+%(o)s is the python object and %(v)s the c++ value
+"""
+SIGNATURE_TYPES = {
+    "float":  ("double",      "PyFloat_Check(%(o)s) || PyLong_Check(%(o)s)", "PyFloat_AsDouble(%(o)s)",
+               "%(v)s == -1. && PyErr_Occurred()", "PyFloat_FromDouble(%(v)s)"),
+    "int":    ("long",        "PyLong_Check(%(o)s)", "PyLong_AsLong(%(o)s)",
+               "%(v)s == -1 && PyErr_Occurred()", "PyLong_FromLong(%(v)s)"),
+    "bool":   ("bool",        "PyBool_Check(%(o)s)", "%(o)s == Py_True",
+               "", "PyBool_FromLong(%(v)s)"),
+    "str":    ("const char*", "PyUnicode_Check(%(o)s)", "PyUnicode_AsUTF8(%(o)s)",
+               "!%(v)s", "PyUnicode_FromString(%(v)s)"),
+    "object": ("PyObject*",   "", "%(o)s",
+               "", "%(v)s"),
+}
+
+
+"""
+Python types of typed class attributes as dict, see Class.get_attributes():
+name: (c++ type, PyMemberDef type from structmember.h)
+"""
+ATTRIBUTE_TYPES = {
+    "float": ("double", "T_DOUBLE"),
+    "int":   ("long",   "T_LONG"),
+    "bool":  ("bool",   "T_BOOL"),
 }
 
 
 """
-All members of PyTypeObject (member_name, type)
+All members of PyTypeObject (member_name, type[, minimum PY_VERSION_HEX[, maximum PY_VERSION_HEX]]),
+members with a version are only rendered for these python versions, see render_struct()
 """
 PyTypeObject = [
     ("tp_name",             "const char*"),
@@ -54,7 +108,8 @@ PyTypeObject = [
     ("tp_print",            "printfunc"),
     ("tp_getattr",          "getattrfunc"),
     ("tp_setattr",          "setattrfunc"),
-    ("tp_reserved",         "void*"),
+    ("tp_reserved",         "void*",                None, "0x03050000"),
+    ("tp_as_async",         "PyAsyncMethods*",      "0x03050000"),
     ("tp_repr",             "reprfunc"),
     ("tp_as_number",        "PyNumberMethods*"),
     ("tp_as_sequence",      "PySequenceMethods*"),
@@ -131,6 +186,8 @@ PyNumberMethods = [
     ("nb_inplace_floor_divide", "binaryfunc"),
     ("nb_inplace_true_divide",  "binaryfunc"),
     ("nb_index",                "unaryfunc"),
+    ("nb_matrix_multiply",          "binaryfunc",   "0x03050000"),
+    ("nb_inplace_matrix_multiply",  "binaryfunc",   "0x03050000"),
 ]
 
 PySequenceMethods = [
@@ -162,12 +219,34 @@ PyModuleDef = [
     ("m_doc", "const char*"),
     ("m_size", "Py_ssize_t"),
     ("m_methods", "PyMethodDef*"),
-    ("m_reload", "inquiry"),
+    ("m_reload", "inquiry", None, "0x03050000"),
+    ("m_slots", "PyModuleDef_Slot*", "0x03050000"),
     ("m_traverse", "traverseproc"),
     ("m_clear", "inquiry"),
     ("m_free", "freefunc"),
 ]
 
+"""
+PyModuleDef for multi-phase initialization, which requires m_slots, see Renderer.multiphase
+"""
+PyModuleDef_multiphase = [(i[0], i[1]) for i in PyModuleDef if i[0] != "m_reload"]
+
+"""
+Description of a heap type, created per module with multi-phase initialization.
+All members of PyTypeObject but the ones in PyType_Spec and TYPE_SPEC_EXCLUDE
+become a PyType_Slot with the id 'Py_<member>', e.g. Py_tp_dealloc
+"""
+PyType_Spec = [
+    ("name",        "const char*"),
+    ("basicsize",   "int"),
+    ("itemsize",    "int"),
+    ("flags",       "unsigned int"),
+    ("slots",       "PyType_Slot*"),
+]
+
+TYPE_SPEC_EXCLUDE = ("tp_name", "tp_basicsize", "tp_itemsize", "tp_flags", "tp_base",
+                     "tp_as_number", "tp_as_sequence", "tp_as_mapping", "tp_as_buffer")
+
 SEQUENCE_FUNCS = [
     ("__len__",         "sq_length"),
     ("__???__",         "sq_concat"),
@@ -186,28 +265,28 @@ NUMBER_FUNCS = [
     ("__sub__", "nb_subtract", "binaryfunc"),
     ("__mul__", "nb_multiply", "binaryfunc"),
     ("__mod__", "nb_remainder", "binaryfunc"),
-    ("__???__", "nb_divmod", "binaryfunc"),
+    ("__divmod__", "nb_divmod", "binaryfunc"),
     ("__pow__", "nb_power", "ternaryfunc"),
     ("__neg__", "nb_negative", "unaryfunc"),
     ("__pos__", "nb_positive", "unaryfunc"),
     ("__abs__", "nb_absolute", "unaryfunc"),
     ("__bool__", "nb_bool", "inquiry"),
-    ("__???__", "nb_invert", "unaryfunc"),
-    ("__???__", "nb_lshift", "binaryfunc"),
-    ("__???__", "nb_rshift", "binaryfunc"),
+    ("__invert__", "nb_invert", "unaryfunc"),
+    ("__lshift__", "nb_lshift", "binaryfunc"),
+    ("__rshift__", "nb_rshift", "binaryfunc"),
     ("__and__", "nb_and", "binaryfunc"),
     ("__xor__", "nb_xor", "binaryfunc"),
     ("__or__", "nb_or", "binaryfunc"),
-    ("__???__", "nb_int", "unaryfunc"),
+    ("__int__", "nb_int", "unaryfunc"),
     ("__???__", "nb_reserved", "void*"),
-    ("__???__", "nb_float", "unaryfunc"),
+    ("__float__", "nb_float", "unaryfunc"),
     ("__iadd__", "nb_inplace_add", "binaryfunc"),
     ("__isub__", "nb_inplace_subtract", "binaryfunc"),
     ("__imul__", "nb_inplace_multiply", "binaryfunc"),
     ("__imod__", "nb_inplace_remainder", "binaryfunc"),
     ("__ipow__", "nb_inplace_power", "ternaryfunc"),
-    ("__???__", "nb_inplace_lshift", "binaryfunc"),
-    ("__???__", "nb_inplace_rshift", "binaryfunc"),
+    ("__ilshift__", "nb_inplace_lshift", "binaryfunc"),
+    ("__irshift__", "nb_inplace_rshift", "binaryfunc"),
     ("__iand__", "nb_inplace_and", "binaryfunc"),
     ("__ixor__", "nb_inplace_xor", "binaryfunc"),
     ("__ior__", "nb_inplace_or", "binaryfunc"),
@@ -215,7 +294,44 @@ NUMBER_FUNCS = [
     ("__truediv__", "nb_true_divide", "binaryfunc"),
     ("__ifloordiv__", "nb_inplace_floor_divide", "binaryfunc"),
     ("__itruediv__", "nb_inplace_true_divide", "binaryfunc"),
-    ("__???__", "nb_index", "unaryfunc"),
+    ("__index__", "nb_index", "unaryfunc"),
+    ("__matmul__", "nb_matrix_multiply", "binaryfunc"),
+    ("__imatmul__", "nb_inplace_matrix_multiply", "binaryfunc"),
+]
+
+"""
+Reflected binary number functions as dict, see Class._render_number_funcs():
+name of the function: name of the reflected function
+The slot of these functions is called for the left or the right operand
+and dispatches to the function or to the reflected function with swapped operands
+"""
+REFLECTED_NUMBER_FUNCS = {
+    "__add__": "__radd__",
+    "__sub__": "__rsub__",
+    "__mul__": "__rmul__",
+    "__matmul__": "__rmatmul__",
+    "__truediv__": "__rtruediv__",
+    "__floordiv__": "__rfloordiv__",
+    "__mod__": "__rmod__",
+    "__divmod__": "__rdivmod__",
+    "__pow__": "__rpow__",
+    "__lshift__": "__rlshift__",
+    "__rshift__": "__rrshift__",
+    "__and__": "__rand__",
+    "__xor__": "__rxor__",
+    "__or__": "__ror__",
+}
+
+"""
+Functions of the mapping protocol, which replace the SEQUENCE_FUNCS of the same name
+in classes with _CPP_(MAPPING), see Class.is_mapping():
+(name, struct member, function type)
+"""
+MAPPING_FUNCS = [
+    ("__len__", "mp_length", "lenfunc"),
+    ("__getitem__", "mp_subscript", "binaryfunc"),
+    ("__setitem__", "mp_ass_subscript", "objobjargproc"),
+    ("__delitem__", "mp_ass_subscript", "objobjproc"),
 ]
 
 
@@ -224,7 +340,22 @@ TYPE_FUNCS = [
     ("__unicode__", "tp_str"),
     ("__repr__", "tp_repr"),
     ("__init__", "tp_init"),
-    ("__eq__", "tp_richcompare")
+    ("__hash__", "tp_hash"),
+    ("__iter__", "tp_iter"),
+    ("__next__", "tp_iternext"),
+]
+
+"""
+Comparison functions, which are collected into one richcmpfunc, see Class._render_richcompare_func():
+(name, comparison operator)
+"""
+RICHCOMPARE_FUNCS = [
+    ("__lt__", "Py_LT"),
+    ("__le__", "Py_LE"),
+    ("__eq__", "Py_EQ"),
+    ("__ne__", "Py_NE"),
+    ("__gt__", "Py_GT"),
+    ("__ge__", "Py_GE"),
 ]
 
 # otherwise PyObject*
@@ -251,4 +382,8 @@ FUNCNAME_TO_TYPE = dict()
 for i in FUNCNAME_TO_STRUCT_MEMBER:
     mem = FUNCNAME_TO_STRUCT_MEMBER.get(i)
     if mem in STRUCT_MEMBER_TO_TYPE:
-        FUNCNAME_TO_TYPE.setdefault(i, STRUCT_MEMBER_TO_TYPE[mem])
\ No newline at end of file
+        FUNCNAME_TO_TYPE.setdefault(i, STRUCT_MEMBER_TO_TYPE[mem])
+for i in RICHCOMPARE_FUNCS:
+    FUNCNAME_TO_TYPE.setdefault(i[0], "binaryfunc")
+for i in REFLECTED_NUMBER_FUNCS:
+    FUNCNAME_TO_TYPE.setdefault(REFLECTED_NUMBER_FUNCS[i], FUNCNAME_TO_TYPE[i])
\ No newline at end of file
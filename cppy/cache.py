@@ -0,0 +1,93 @@
+"""
+Persistent cache for the rendered code of CodeObjects
+"""
+import hashlib, json, os
+from . import __version__
+
+
+def hash_data(data):
+    """
+    Returns a hash of the repr() of 'data'
+    :return: str
+    """
+    return hashlib.sha1(repr(data).encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    On-disk cache of the rendered code of each CodeObject in a module.
+    Entries are keyed by CodeObject.source_hash(), the context and the cppy version,
+    so an object is only rendered again when it's doc-string or signature changed.
+    """
+    def __init__(self, directory, name):
+        """
+        :param directory: str, path of the cache files, e.g. ".cppy_cache"
+        :param name: str, name of the module
+        """
+        self.filename = os.path.join(directory, "%s.json" % name)
+        self.entries = dict()
+        # the entries used in this run, only those are saved
+        self.used = dict()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def __str__(self):
+        return "RenderCache(%s)" % self.filename
+
+    def load(self):
+        self.entries = dict()
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == __version__:
+            self.entries = data.get("entries", dict())
+
+    def save(self):
+        """Writes all entries that have been used since construction"""
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({ "version": __version__, "entries": self.used }, f)
+        os.replace(tmp, self.filename)
+
+    def get_key(self, o):
+        """
+        Returns the cache key for the CodeObject
+        :return: str
+        """
+        return hash_data((__version__, o.context.source_hash(), o.source_hash()))
+
+    def render(self, o, part):
+        """
+        Returns the code of o.render_<part>(), either from the cache
+        or by calling the render function
+        :param o: CodeObject
+        :param part: str, e.g. "python_api"
+        :return: str
+        """
+        entry = self._use(o)
+        if part in entry:
+            self.hits += 1
+            return entry[part]
+        self.misses += 1
+        code = entry[part] = getattr(o, "render_" + part)()
+        return code
+
+    def _use(self, o):
+        """
+        Returns the entry for the CodeObject and keeps it, and the entries of
+        it's members, for the next run, even if the members are not rendered in this run
+        :return: dict
+        """
+        key = self.get_key(o)
+        entry = self.used.get(key)
+        if entry is None:
+            entry = self.used[key] = dict(self.entries.get(key, dict()))
+            for i in getattr(o, "all_objects", []):
+                self._use(i)
+        return entry
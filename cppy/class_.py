@@ -1,6 +1,8 @@
-import inspect
+import inspect, re
 from .function_ import *
+from .function_ import _annotation_name
 from .renderer import *
+from .profiler import profiled
 
 class Class(CodeObject):
     """A python c-api implementation of a class"""
@@ -15,22 +17,54 @@ class Class(CodeObject):
         self.properties = []
         self.class_struct_name = "%s_struct" % self.name
         self.type_struct_name = "%s_type_struct" % self.name
+        self.type_spec_name = "%s_type_spec" % self.name
+        self.type_slots_name = "%s_type_slots" % self.name
+        self.state_type_name = "%s_type" % self.name
         self.method_struct_name = "%s_method_struct" % self.name
         self.number_struct_name = "%s_number_struct" % self.name
         self.mapping_struct_name = "%s_mapping_struct" % self.name
         self.sequence_struct_name = "%s_sequence_struct" % self.name
         self.getset_struct_name = "%s_getset_struct" % self.name
+        self.member_struct_name = "%s_member_struct" % self.name
+        self.buffer_struct_name = "%s_buffer_struct" % self.name
+        self.getbuffer_func_name = "cppy_getbuffer_%s" % self.name
+        self.releasebuffer_func_name = "cppy_releasebuffer_%s" % self.name
+        self.richcompare_func_name = "cppy_richcompare_%s" % self.name
+        self.ass_subscript_func_name = "cppy_ass_subscript_%s" % self.name
+        self.traverse_func_name = "cppy_traverse_%s" % self.name
+        self.clear_func_name = "cppy_clear_%s" % self.name
+        self.iterator_struct_name = "%s_iterator_struct" % self.name
+        self.iterator_type_struct_name = "%s_iterator_type_struct" % self.name
+        self.iterator_type_spec_name = "%s_iterator_type_spec" % self.name
+        self.iterator_type_slots_name = "%s_iterator_type_slots" % self.name
+        self.iterator_state_type_name = "%s_iterator_type" % self.name
+        self.iter_func_name = "cppy_iter_%s" % self.name
+        self.iternext_func_name = "cppy_iternext_%s" % self.name
+        self.iterator_dealloc_func_name = "destroy_%s_iterator" % self.name
         self.class_new_func_name = "create_%s" % self.name
+        self.class_tp_new_func_name = "new_%s" % self.name
         self.class_copy_func_name = "copy_%s" % self.name
         self.class_dealloc_func_name = "destroy_%s" % self.name
         self.class_is_instance_func_name = "is_%s" % self.name
+        self.class_vectorcall_func_name = "vectorcall_%s" % self.name
+        self.freelist_name = "%s_freelist" % self.name
+        self.clear_freelist_func_name = "clear_freelist_%s" % self.name
 
     @property
     def all_objects(self):
         return self.functions + self.properties
 
+    def __str__(self):
+        return "Class(%s)" % self.name
+
     def supported_doc_tags(self):
-        return [None, "DEF", "IMPL", "NEW", "COPY", "FREE"]
+        return [None, "DEF", "IMPL", "NEW", "COPY", "FREE", "GETBUFFER", "RELEASEBUFFER", "FREELIST", "MEMBERS", "ITER", "TRAVERSE"]
+
+    def cache_data(self):
+        return (super().cache_data(),
+                [i.source_hash() for i in self.bases],
+                [i.source_hash() for i in self.all_objects],
+                self.get_attributes())
 
     def has_cpp(self, key=None):
         for i in self.bases:
@@ -47,6 +81,157 @@ class Class(CodeObject):
             cpp = self.format_code(cpp)
         return cpp
 
+    def get_inherited_cpp(self, key):
+        """
+        Returns the unformatted code for 'key' of this class or of the nearest base class that has it.
+        Unlike cpp(), the code of the bases is not concatenated
+        :return: str
+        """
+        if super(Class, self).has_cpp(key):
+            return super(Class, self).cpp(key, False)
+        for i in self.bases:
+            if i.has_cpp(key):
+                return i.get_inherited_cpp(key)
+        return ""
+
+    def get_members(self):
+        """
+        Returns the c++ members from _CPP_(MEMBERS) of this class and it's bases.
+        Unlike the members in _CPP_, they are constructed in cppy_new(), destroyed in cppy_free()
+        and copied with the assignment operator in cppy_copy().
+        Each member needs it's own declaration 'type name;' or 'type name = value;'
+        :return: list of tuples (declaration, name, initial value)
+        """
+        members = []
+        for i in self.bases:
+            members += i.get_members()
+        return members + self._get_own_members()
+
+    def _get_own_members(self):
+        """Returns the c++ members from _CPP_(MEMBERS) of this class without the bases, see get_members()"""
+        members = []
+        code = _re_comment.sub("", super(Class, self).cpp("MEMBERS"))
+        for decl in code.split(";"):
+            decl = " ".join(decl.split())
+            if not decl:
+                continue
+            init = ""
+            if "=" in decl:
+                decl, init = [x.strip() for x in decl.split("=", 1)]
+            match = _re_member_name.search(decl)
+            if not match or not match.start():
+                raise ValueError("Unsupported declaration '%s' in _CPP_(MEMBERS) of class %s" % (decl, self.name))
+            members.append((decl, match.group(1), init))
+        return members
+
+    def get_attributes(self):
+        """
+        Returns the typed class attributes of this class and it's bases, e.g. 'count: int = 0'.
+        They become fields of the struct, initialized in cppy_new() with the value or zero,
+        and are accessed from python through PyMemberDef without a c function.
+        The type is one of ATTRIBUTE_TYPES, 'Final[type]' makes the attribute read-only.
+        Attributes with other annotations are ignored. An attribute that is declared again
+        in a derived class keeps the field of the base class but gets the new value and read-only flag.
+        :return: list of tuples (name, python type, read-only, initial value)
+        """
+        attributes = []
+        for i in self.bases:
+            attributes += [a for a in i.get_attributes() if a[0] not in [b[0] for b in attributes]]
+        for a in self._get_own_attributes():
+            names = [b[0] for b in attributes]
+            if a[0] not in names:
+                attributes.append(a)
+                continue
+            base = attributes[names.index(a[0])]
+            if base[1] != a[1]:
+                raise ValueError("Typed attribute '%s' of class %s can not change the type '%s' of the base class"
+                                 % (a[0], self.name, base[1]))
+            attributes[names.index(a[0])] = a
+        return attributes
+
+    def _get_own_attributes(self):
+        """Returns the typed class attributes of this class without the bases, see get_attributes()"""
+        attributes = []
+        annotations = self.the_class.__dict__.get("__annotations__", {})
+        for name, annotation in annotations.items():
+            if not isinstance(annotation, (str, type)):
+                annotation = str(annotation)
+            else:
+                annotation = _annotation_name(annotation)
+            match = _re_final.match(annotation)
+            readonly = bool(match)
+            if readonly:
+                annotation = match.group(1)
+            if annotation not in ATTRIBUTE_TYPES:
+                continue
+            attributes.append((name, annotation, readonly,
+                               _attribute_value(annotation, self.the_class.__dict__.get(name))))
+        return attributes
+
+    def get_traverse_members(self):
+        """
+        Returns the names of the members from _CPP_(TRAVERSE) of this class and it's bases.
+        These are PyObject* or class struct pointers that hold a reference, separated by whitespace,
+        commas or semicolons. They are visited by the garbage collector and cleared to break cycles
+        :return: list of str
+        """
+        return _split_traverse_members(self.cpp("TRAVERSE"), "class %s" % self.name)
+
+    def has_gc(self):
+        """Returns True if the class supports the cyclic garbage collector, see get_traverse_members()"""
+        return self.has_cpp("TRAVERSE")
+
+    def has_iterator(self):
+        """Returns True if the class has a generated iterator type, see _render_iterator()"""
+        return self.has_cpp("ITER")
+
+    def has_buffer(self):
+        """Returns True if the class implements the buffer protocol"""
+        return self.has_cpp("GETBUFFER")
+
+    def get_freelist_size(self):
+        """
+        Returns the capacity of the freelist from _CPP_(FREELIST), or 0.
+        Instances of classes with a freelist are not freed but kept for reuse by create_<Class>()
+        :return: int
+        """
+        if not self.has_cpp("FREELIST"):
+            return 0
+        try:
+            size = int(self.get_inherited_cpp("FREELIST").strip())
+        except ValueError:
+            raise ValueError("_CPP_(FREELIST) of class %s must contain the capacity" % self.name)
+        if size < 0:
+            raise ValueError("Negative capacity in _CPP_(FREELIST) of class %s" % self.name)
+        # a freelist is shared by all interpreters
+        if self.context.multiphase:
+            return 0
+        return size
+
+    def type_object(self, arg="arg0"):
+        """
+        Returns the expression of the PyTypeObject* of this class.
+        With multi-phase initialization each module has it's own heap type in the module state,
+        which is found through the object 'arg', see Renderer.multiphase
+        :param arg: str, the module, an instance or a type of the module
+        :return: str
+        """
+        if self.context.multiphase:
+            return "%s(%s)->%s" % (self.context.state_func_name, arg, self.state_type_name)
+        return "&" + self.type_struct_name
+
+    def iterator_type_object(self, arg="arg0"):
+        """Returns the expression of the PyTypeObject* of the iterator, see type_object()"""
+        if self.context.multiphase:
+            return "%s(%s)->%s" % (self.context.state_func_name, arg, self.iterator_state_type_name)
+        return "&" + self.iterator_type_struct_name
+
+    def render_new_call(self, arg="arg0"):
+        """Returns the call of create_<Class>(), see type_object()"""
+        if self.context.multiphase:
+            return "%s(%s)" % (self.class_new_func_name, self.type_object(arg))
+        return "%s()" % self.class_new_func_name
+
     def append(self, o):
         if isinstance(o, Function):
             self.functions.append(o)
@@ -65,16 +250,57 @@ class Class(CodeObject):
 
     def has_sequence_function(self):
         for i in SEQUENCE_FUNCS:
+            if self.has_function(i[0]) and self.get_function(i[0]).is_sequence_function():
+                return True
+        return False
+
+    def is_mapping(self):
+        """
+        Returns True if the class implements the mapping protocol, which is the case
+        when __getitem__, __setitem__ or __delitem__ have their code in _CPP_(MAPPING).
+        The MAPPING_FUNCS then go into the PyMappingMethods and receive the key as python object,
+        e.g. an int or a slice. Without __delitem__, __setitem__ gets NULL as value to delete the item
+        """
+        for name in ("__getitem__", "__setitem__", "__delitem__"):
+            if self.has_function(name) and self.get_function(name).has_cpp("MAPPING"):
+                return True
+        return False
+
+    def has_richcompare_function(self):
+        for i in RICHCOMPARE_FUNCS:
             if self.has_function(i[0]):
                 return True
         return False
 
+    def has_hash_cache(self):
+        """Returns True if the class stores the result of __hash__, see Function.is_hash_cached()"""
+        return self.has_function("__hash__") and self.get_function("__hash__").is_hash_cached()
+
+    def has_hash_field(self):
+        """Returns True if the struct of this class or of a base class has the 'cppy_hash' field"""
+        return self.has_hash_cache() or any(i.has_hash_field() for i in self.bases)
+
     def has_number_function(self):
         for i in NUMBER_FUNCS:
             if self.has_function(i[0]):
                 return True
+        for i in REFLECTED_NUMBER_FUNCS.values():
+            if self.has_function(i):
+                return True
         return False
 
+    def has_reflected_number_function(self, name):
+        """
+        Returns True if the slot of the binary number function 'name', e.g. "__add__",
+        needs the dispatcher of _render_number_funcs(), see c_types.REFLECTED_NUMBER_FUNCS
+        """
+        return name in REFLECTED_NUMBER_FUNCS \
+            and (self.has_function(name) or self.has_function(REFLECTED_NUMBER_FUNCS[name]))
+
+    def number_func_name(self, member):
+        """Returns the name of the dispatcher for the PyNumberMethods member, e.g. "nb_add" """
+        return "cppy_%s_%s" % (member, self.name)
+
     def render_header_forwards(self):
         """Stuff that needs to be known by all other code in the .h file"""
         return self._render_forward_def()
@@ -85,6 +311,9 @@ class Class(CodeObject):
 
     def render_forwards(self):
         """Stuff that needs to be known by all other code in .cpp file"""
+        if self.context.shards and not self.context.multiphase:
+            # defined in the shard of the class, see Renderer.shards
+            return "extern PyTypeObject %s;" % self.type_struct_name
         return ""
 
     def render_impl(self):
@@ -95,70 +324,102 @@ class Class(CodeObject):
         """The general python c-api constructs"""
         return self._render_cpp_declaration()
 
+    @profiled
     def _render_forward_def(self):
         code = """
         /* %(name)s forward decl */
         struct %(struct_name)s;
-        %(struct_name)s* %(new_func)s();
+        %(struct_name)s* %(new_func)s(%(new_args)s);
         void %(dealloc_func)s(PyObject* self);
         %(struct_name)s* %(copy_func)s(%(struct_name)s* self);
         bool %(is_instance_func)s(PyObject* arg);
+        %(clear_freelist)s
         """
         code %= {
             "name": self.name,
             "struct_name": self.class_struct_name,
             "new_func": self.class_new_func_name,
+            "new_args": "PyTypeObject* type" if self.context.multiphase else "",
             "copy_func": self.class_copy_func_name,
             "dealloc_func": self.class_dealloc_func_name,
             "is_instance_func": self.class_is_instance_func_name,
+            "clear_freelist": "void %s();" % self.clear_freelist_func_name if self.get_freelist_size() else "",
         }
         for i in self.all_objects:
-            code += "\n" + i.render_forwards()
+            code += "\n" + i.render_part("forwards")
         return self.format_code(code)
 
+    @profiled
     def _render_cpp_declaration(self):
         """Renders the complete cpp code to define the class and it's functions"""
-        code = ""
-        code += "\n" + self._render_doc_string()
-        code += "\n" + self._render_class_struct_impl()
+        code = []
+        code.append("\n" + self._render_doc_string())
+        code.append("\n" + self._render_class_struct_impl())
         if self.functions:
-            code += "\n\n/* ---------- %s methods ----------- */\n\n" % self.name
+            code.append("\n\n/* ---------- %s methods ----------- */\n\n" % self.name)
             for i in self.functions:
-                code += "\n" + i.render_python_api()
+                code.append("\n" + i.render_part("python_api"))
+            if self.has_richcompare_function():
+                code.append("\n" + self._render_richcompare_func())
+            if self.has_function("__delitem__") and self.is_mapping():
+                code.append("\n" + self._render_ass_subscript_func())
+            if self.has_number_function():
+                code.append("\n" + self._render_number_funcs())
+        if self.has_gc():
+            code.append("\n\n/* ---------- %s garbage collection ----------- */\n\n" % self.name)
+            code.append("\n" + self._render_gc_funcs())
         if self.properties:
-            code += "\n\n/* ---------- %s properties ----------- */\n\n" % self.name
+            code.append("\n\n/* ---------- %s properties ----------- */\n\n" % self.name)
             for i in self.properties:
-                code += "\n" + i.render_python_api()
-        code += "\n\n/* ---------- %s structs ----------- */\n\n" % self.name
-        code += "\n" + self._render_method_struct()
+                code.append("\n" + i.render_part("python_api"))
+        if self.has_iterator():
+            code.append("\n\n/* ---------- %s iterator ----------- */\n\n" % self.name)
+            code.append("\n" + self._render_iterator())
+        if self.has_buffer():
+            code.append("\n\n/* ---------- %s buffer ----------- */\n\n" % self.name)
+            code.append("\n" + self._render_buffer_functions())
+        code.append("\n\n/* ---------- %s structs ----------- */\n\n" % self.name)
+        code.append("\n" + self._render_method_struct())
         if self.properties:
-            code += "\n" + self._render_getset_struct()
-        if self.has_sequence_function():
-            code += "\n" + self._render_sequence_struct()
-        if self.has_number_function():
-            code += "\n" + self._render_number_struct()
-        code += "\n" + self._render_type_struct()
-        code += "\n\n/* ---------- %s ctor/dtor ----------- */\n\n" % self.name
-        code += "\n" + self._render_ctor_impl()
+            code.append("\n" + self._render_getset_struct())
+        if self.get_attributes():
+            code.append("\n" + self._render_member_struct())
+        if self.context.multiphase:
+            code.append("\n" + self._render_type_spec())
+        else:
+            if self.has_sequence_function():
+                code.append("\n" + self._render_sequence_struct())
+            if self.is_mapping():
+                code.append("\n" + self._render_mapping_struct())
+            if self.has_number_function():
+                code.append("\n" + self._render_number_struct())
+            if self.has_buffer():
+                code.append("\n" + self._render_buffer_struct())
+            code.append("\n" + self._render_type_struct())
+        code.append("\n\n/* ---------- %s ctor/dtor ----------- */\n\n" % self.name)
+        code.append("\n" + self._render_ctor_impl())
+        if self.context.fastcall:
+            code.append("\n" + self._render_vectorcall_impl())
 
-        code = apply_string_dict('extern "C" {\n' + INDENT + '%(decl)s\n} // extern "C"\n',
-                                 { "decl": code })
+        code = [apply_string_dict('extern "C" {\n' + INDENT + '%(decl)s\n} // extern "C"\n',
+                                  { "decl": "".join(code) })]
 
-        code += "\n" + self._render_init_func()
+        code.append("\n" + self._render_init_func())
         for i in self.all_objects:
-            c = i.render_impl()
+            c = i.render_part("impl")
             if c:
-                code += "\n" + c
+                code.append("\n" + c)
 
-        return code
+        return "".join(code)
 
+    @profiled
     def _render_class_struct(self):
         code = """
         /* class '%(name)s' */
         struct %(struct_name)s
         {
             PyObject_HEAD
-            %(decl)s
+            %(fields)s
 
             void cppy_new();
             void cppy_free();
@@ -170,10 +431,50 @@ class Class(CodeObject):
         code = apply_string_dict(code, {
             "name": self.name,
             "struct_name": self.class_struct_name,
-            "decl": self.cpp() or self.cpp("DEF"),
+            "fields": self._render_struct_fields(self),
         })
         return self.format_code(code)
 
+    def _render_struct_fields(self, for_class):
+        """
+        Renders the fields of the class struct one class level at a time, the bases first.
+        The struct of a derived class so starts with the layout of the base struct,
+        which the inherited functions, slots and PyMemberDef offsets of the base rely on
+        :param for_class: Class, the class of the struct
+        """
+        fields = [i._render_struct_fields(for_class) for i in self.bases]
+        fields.append(for_class.format_code(super(Class, self).cpp(None, False)
+                                            or super(Class, self).cpp("DEF", False)))
+        fields.append(self._render_members_decl())
+        fields.append(self._render_attributes_decl(for_class))
+        if self.has_hash_cache() and not any(i.has_hash_field() for i in self.bases):
+            fields.append("Py_hash_t cppy_hash; // cached result of __hash__, or -1")
+        return join_code(fields, "\n\n")
+
+    @profiled
+    def _render_members_decl(self):
+        members = self._get_own_members()
+        if not members:
+            return ""
+        # an anonymous union keeps the member from being constructed with the struct
+        code = "/* c++ members, constructed in cppy_new() */\n"
+        for decl, name, init in members:
+            code += "union { %s; };\n" % decl
+        return code
+
+    @profiled
+    def _render_attributes_decl(self, for_class):
+        # attributes that are declared again keep the field of the base class
+        inherited = [a[0] for i in self.bases for a in i.get_attributes()]
+        attributes = [a for a in self._get_own_attributes() if a[0] not in inherited]
+        if not attributes:
+            return ""
+        code = "/* typed attributes, see %s */\n" % for_class.member_struct_name
+        for name, type, readonly, value in attributes:
+            code += "%s %s;\n" % (ATTRIBUTE_TYPES[type][0], name)
+        return code
+
+    @profiled
     def _render_class_struct_impl(self):
         code = """
 
@@ -196,12 +497,49 @@ class Class(CodeObject):
         code = apply_string_dict(code, {
             "name": self.name,
             "struct_name": self.class_struct_name,
-            "decl_new": change_text_indent(self.cpp("NEW"), 12),
-            "decl_free": change_text_indent(self.cpp("FREE"), 12),
-            "decl_copy": change_text_indent(self.cpp("COPY"), 12),
+            "decl_new": ("cppy_hash = -1;\n" if self.has_hash_field() else "")
+                        + self._render_attributes_new() + self._render_members_new() + self.cpp("NEW"),
+            "decl_free": self.cpp("FREE") + self._render_members_free(),
+            "decl_copy": self._render_attributes_copy() + self._render_members_copy() + self.cpp("COPY"),
         })
         return self.format_code(code)
 
+    @profiled
+    def _render_attributes_new(self):
+        code = ""
+        for name, type, readonly, value in self.get_attributes():
+            code += "%s = %s;\n" % (name, value)
+        return code
+
+    @profiled
+    def _render_attributes_copy(self):
+        code = ""
+        for name, type, readonly, value in self.get_attributes():
+            code += "copy->%s = %s;\n" % (name, name)
+        return code
+
+    @profiled
+    def _render_members_new(self):
+        code = ""
+        for decl, name, init in self.get_members():
+            code += "new (&%s) decltype(%s)(%s);\n" % (name, name, init)
+        return code
+
+    @profiled
+    def _render_members_free(self):
+        code = ""
+        for decl, name, init in reversed(self.get_members()):
+            code += "\n{ typedef decltype(%s) T; %s.~T(); }" % (name, name)
+        return code
+
+    @profiled
+    def _render_members_copy(self):
+        code = ""
+        for decl, name, init in self.get_members():
+            code += "copy->%s = %s;\n" % (name, name)
+        return code
+
+    @profiled
     def _render_method_struct(self):
         code = "static PyMethodDef %s[] =\n{\n" % self.method_struct_name
         for i in self.functions:
@@ -210,6 +548,7 @@ class Class(CodeObject):
         code += "\n" + INDENT + "{ NULL, NULL, 0, NULL }\n};\n"
         return self.format_code(code)
 
+    @profiled
     def _render_getset_struct(self):
         code = "static PyGetSetDef %s[] =\n{\n" % self.getset_struct_name
         for i in self.properties:
@@ -217,7 +556,21 @@ class Class(CodeObject):
         code += "\n" + INDENT + "{ NULL, NULL, NULL, NULL, NULL }\n};\n"
         return self.format_code(code)
 
-    def _render_type_struct(self):
+    @profiled
+    def _render_member_struct(self):
+        """Renders the PyMemberDef entries of the typed attributes"""
+        attributes = self.get_attributes()
+        code = ""
+        if any(a[1] == "bool" for a in attributes):
+            code += 'static_assert(sizeof(bool) == sizeof(char), "T_BOOL requires a bool of char size");\n'
+        code += "static PyMemberDef %s[] =\n{\n" % self.member_struct_name
+        for name, type, readonly, value in attributes:
+            code += INDENT + '{ const_cast<char*>("%s"), %s, offsetof(%s, %s), %s, NULL },\n' % (
+                name, ATTRIBUTE_TYPES[type][1], self.class_struct_name, name, "READONLY" if readonly else "0")
+        code += INDENT + "{ NULL, 0, 0, 0, NULL }\n};\n"
+        return self.format_code(code)
+
+    def _get_type_dict(self):
         dic = {}
         for i in PyTypeObject:
             dic[i[0]] = "NULL"
@@ -237,70 +590,335 @@ class Class(CodeObject):
         for i in TYPE_FUNCS:
             if self.has_function(i[0]):
                 dic.update({i[1]: self.get_function(i[0]).func_name})
+        if self.has_richcompare_function():
+            dic.update({"tp_richcompare": self.richcompare_func_name})
+        if self.has_iterator():
+            dic.update({"tp_iter": self.iter_func_name})
+        if self.has_gc():
+            dic.update({
+                "tp_flags": "Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_HAVE_GC",
+                "tp_traverse": self.traverse_func_name,
+                "tp_clear": self.clear_func_name,
+                "tp_free": "PyObject_GC_Del",
+            })
         if self.has_sequence_function():
             dic.update({"tp_as_sequence": "&" + self.sequence_struct_name})
+        if self.is_mapping():
+            dic.update({"tp_as_mapping": "&" + self.mapping_struct_name})
         if self.has_number_function():
             dic.update({"tp_as_number": "&" + self.number_struct_name})
         if self.properties:
             dic.update({"tp_getset": self.getset_struct_name})
+        if self.get_attributes():
+            dic.update({"tp_members": self.member_struct_name})
+        if self.has_buffer():
+            dic.update({"tp_as_buffer": "&" + self.buffer_struct_name})
+        if self.context.multiphase:
+            dic.update({"tp_new": self.class_tp_new_func_name})
+        return dic
 
+    @profiled
+    def _render_type_struct(self):
+        dic = self._get_type_dict()
         return self.format_code(
                 "/* https://docs.python.org/3/c-api/typeobj.html */\n" +
                 render_struct("PyTypeObject", PyTypeObject,
                              self.type_struct_name, dic,
-                             first_line="PyVarObject_HEAD_INIT(NULL, 0)") )
+                             first_line="PyVarObject_HEAD_INIT(NULL, 0)",
+                             static=not self.context.shards) )
+
+    @profiled
+    def _render_type_spec(self):
+        """
+        Renders the PyType_Spec of the heap type that is created for each module
+        with multi-phase initialization, see Renderer.multiphase.
+        The slots are the same as in the PyTypeObject and it's method structs.
+        The base class is given to PyType_FromModuleAndSpec() in _render_init_func()
+        """
+        sub_dicts = []
+        if self.has_sequence_function():
+            sub_dicts.append((PySequenceMethods, self._get_sequence_dict()))
+        if self.is_mapping():
+            sub_dicts.append((PyMappingMethods, self._get_mapping_dict()))
+        if self.has_number_function():
+            sub_dicts.append((PyNumberMethods, self._get_number_dict()))
+        if self.has_buffer():
+            sub_dicts.append((PyBufferProcs, self._get_buffer_dict()))
+        code = "/** tp_new of the heap type, creates a %s for derived types as well */\n" % self.name
+        code += render_function(self.class_tp_new_func_name, "newfunc", "return reinterpret_cast<PyObject*>(%s);"
+                                % self.render_new_call("reinterpret_cast<PyObject*>(arg0)"))
+        code += _render_type_spec(self.type_spec_name, self.type_slots_name, self._get_type_dict(), sub_dicts)
+        return self.format_code(code)
+
+    @profiled
+    def _render_richcompare_func(self):
+        """
+        Renders the richcmpfunc that calls the comparison function for the operator 'arg2'.
+        A missing __ne__ is the negation of __eq__, other missing comparisons return NotImplemented,
+        so python tries the reflected comparison of the other object
+        """
+        code = "switch (arg2)\n{\n"
+        for name, op in RICHCOMPARE_FUNCS:
+            if self.has_function(name):
+                code += INDENT + "case %s: return %s(arg0, arg1);\n" % (op, self.get_function(name).func_name)
+        if self.has_function("__eq__") and not self.has_function("__ne__"):
+            code += INDENT + "case Py_NE:\n" + change_text_indent(strip_newlines("""
+                {
+                    PyObject* ret = %s(arg0, arg1);
+                    if (!ret || ret == Py_NotImplemented)
+                        return ret;
+                    int equal = PyObject_IsTrue(ret);
+                    Py_DECREF(ret);
+                    if (equal < 0)
+                        return NULL;
+                    return PyBool_FromLong(!equal);
+                }""" % self.get_function("__eq__").func_name), 4) + "\n"
+        code += INDENT + "default: Py_RETURN_NOTIMPLEMENTED;\n}"
+        return self.format_code(render_function(self.richcompare_func_name, "richcmpfunc", code))
+
+    @profiled
+    def _render_ass_subscript_func(self):
+        """
+        Renders the objobjargproc that calls __setitem__, or __delitem__ when 'arg2' is NULL
+        """
+        if self.has_function("__setitem__"):
+            code = "if (arg2)\n%sreturn %s(arg0, arg1, arg2);\n" % (
+                INDENT, self.get_function("__setitem__").func_name)
+        else:
+            code = "if (arg2)\n{\n%sPyErr_Format(PyExc_TypeError, " \
+                   "\"'%%.200s' object does not support item assignment\", Py_TYPE(arg0)->tp_name);\n" \
+                   "%sreturn -1;\n}\n" % (INDENT, INDENT)
+        code += "return %s(arg0, arg1);" % self.get_function("__delitem__").func_name
+        return self.format_code(render_function(self.ass_subscript_func_name, "objobjargproc", code))
+
+    def _get_mapping_dict(self):
+        dic = {}
+        for i in MAPPING_FUNCS:
+            if self.has_function(i[0]):
+                dic.update({i[1]: self.get_function(i[0]).func_name})
+        if self.has_function("__delitem__"):
+            dic.update({"mp_ass_subscript": self.ass_subscript_func_name})
+        return dic
 
+    @profiled
     def _render_mapping_struct(self):
-        pass
+        return self.format_code(render_struct("PyMappingMethods", PyMappingMethods,
+                             self.mapping_struct_name, self._get_mapping_dict()))
 
-    def _render_sequence_struct(self):
+    def _get_sequence_dict(self):
         dic = dict()
         for i in SEQUENCE_FUNCS:
-            if self.has_function(i[0]):
+            if self.has_function(i[0]) and self.get_function(i[0]).is_sequence_function():
                 val = self.get_function(i[0]).func_name
                 dic.update({i[1]: val})
+        return dic
 
+    @profiled
+    def _render_sequence_struct(self):
         return self.format_code(render_struct("PySequenceMethods", PySequenceMethods,
-                             self.sequence_struct_name, dic))
+                             self.sequence_struct_name, self._get_sequence_dict()))
 
-    def _render_number_struct(self):
+    @profiled
+    def _render_number_funcs(self):
+        """
+        Renders the slots of the binary number functions, which are called for the left
+        or the right operand. The function gets the instance as 'arg0' and the other operand as 'arg1',
+        the reflected function, e.g. __radd__, as well with swapped operands.
+        Missing functions return NotImplemented
+        """
+        code = ""
+        for name, member, type in NUMBER_FUNCS:
+            if not self.has_reflected_number_function(name):
+                continue
+            reflected = REFLECTED_NUMBER_FUNCS[name]
+            mod = ", arg2" if type == "ternaryfunc" else ""
+            body = "if (%s(arg0))\n" % self.class_is_instance_func_name
+            if self.has_function(name):
+                body += INDENT + "return %s(arg0, arg1%s);\n" % (self.get_function(name).func_name, mod)
+            else:
+                body += INDENT + "Py_RETURN_NOTIMPLEMENTED;\n"
+            if self.has_function(reflected):
+                body += "return %s(arg1, arg0%s);" % (self.get_function(reflected).func_name, mod)
+            else:
+                body += "Py_RETURN_NOTIMPLEMENTED;"
+            code += render_function(self.number_func_name(member), type, body) + "\n"
+        return self.format_code(code)
+
+    def _get_number_dict(self):
         dic = {}
         for i in NUMBER_FUNCS:
-            if self.has_function(i[0]):
+            if self.has_reflected_number_function(i[0]):
+                dic.update({i[1]: self.number_func_name(i[1])})
+            elif self.has_function(i[0]):
                 val = self.get_function(i[0]).func_name
                 dic.update({i[1]: val})
+        return dic
+
+    @profiled
+    def _render_number_struct(self):
         return self.format_code(render_struct("PyNumberMethods", PyNumberMethods,
-                             self.number_struct_name, dic))
+                             self.number_struct_name, self._get_number_dict()))
+
+    @profiled
+    def _render_gc_funcs(self):
+        """Renders the traverseproc and the inquiry that clears the members of _CPP_(TRAVERSE)"""
+        members = self.get_traverse_members()
+        # Py_VISIT() expects 'visit' and 'arg'
+        code = "visitproc visit = arg1;\nvoid* arg = arg2;\n"
+        if self.context.multiphase:
+            # instances of heap types hold a reference to their type
+            code += "Py_VISIT(Py_TYPE(arg0));\n"
+        for name in members:
+            code += "Py_VISIT(self->%s);\n" % name
+        code = render_function(self.traverse_func_name, "traverseproc", code + "return 0;", self)
+        clear = ""
+        for name in members:
+            clear += "Py_CLEAR(self->%s);\n" % name
+        code += render_function(self.clear_func_name, "inquiry", clear + "return 0;", self)
+        return self.format_code(code)
+
+    @profiled
+    def _render_iterator(self):
+        """
+        Renders the iterator type for _CPP_(ITER) and the getiterfunc of the class that creates it.
+        The code gets the container as 'self' and the position as 'index'
+        and returns a new reference to the element, or NULL to end the iteration without an exception
+        """
+        code = """
+        /** Iterator of a %(name)s instance, see _CPP_(ITER) */
+        struct %(iterator_struct)s
+        {
+            PyObject_HEAD
+            %(struct_name)s* self;
+            Py_ssize_t index;
+        };
+
+        static void %(dealloc_func)s(PyObject* arg0)
+        {
+            %(dealloc)s
+        }
+
+        static PyObject* %(iternext_func)s(PyObject* arg0)
+        {
+            %(iterator_struct)s* iter = reinterpret_cast<%(iterator_struct)s*>(arg0);
+            if (!iter->self)
+                return NULL;
+            %(struct_name)s* self = iter->self;
+            Py_ssize_t index = iter->index;
+            CPPY_UNUSED(self); CPPY_UNUSED(index);
+            PyObject* cppy_result = [&]() -> PyObject*
+            {
+                %(cpp)s
+            }();
+            if (cppy_result)
+                ++iter->index;
+            else
+                Py_CLEAR(iter->self);
+            return cppy_result;
+        }
+
+        %(type_struct)s
+        static PyObject* %(iter_func)s(PyObject* arg0)
+        {
+            %(iterator_struct)s* iter = PyObject_New(%(iterator_struct)s, %(iterator_type)s);
+            if (!iter)
+                return NULL;
+            Py_INCREF(arg0);
+            iter->self = reinterpret_cast<%(struct_name)s*>(arg0);
+            iter->index = 0;
+            return reinterpret_cast<PyObject*>(iter);
+        }
+        """
+        dic = {}
+        for i in PyTypeObject:
+            dic[i[0]] = "NULL"
+        dic.update({
+            "tp_name": '"%s.%s_iterator"' % (self.context.name, self.name),
+            "tp_basicsize": "sizeof(%s)" % self.iterator_struct_name,
+            "tp_dealloc": self.iterator_dealloc_func_name,
+            "tp_getattro": "PyObject_GenericGetAttr",
+            "tp_flags": "Py_TPFLAGS_DEFAULT",
+            "tp_iter": "PyObject_SelfIter",
+            "tp_iternext": self.iternext_func_name,
+        })
+        dealloc = "Py_XDECREF(reinterpret_cast<%s*>(arg0)->self);\nPyObject_Del(arg0);" % self.iterator_struct_name
+        if self.context.multiphase:
+            type_struct = _render_type_spec(self.iterator_type_spec_name, self.iterator_type_slots_name, dic)
+            dealloc = "PyTypeObject* type = Py_TYPE(arg0);\n%s\nPy_DECREF(type);" % dealloc
+        else:
+            type_struct = render_struct("PyTypeObject", PyTypeObject, self.iterator_type_struct_name, dic,
+                                        first_line="PyVarObject_HEAD_INIT(NULL, 0)")
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "name": self.name,
+            "struct_name": self.class_struct_name,
+            "iterator_struct": self.iterator_struct_name,
+            "iterator_type": self.iterator_type_object(),
+            "dealloc_func": self.iterator_dealloc_func_name,
+            "dealloc": dealloc,
+            "iternext_func": self.iternext_func_name,
+            "iter_func": self.iter_func_name,
+            "cpp": strip_newlines(self.get_inherited_cpp("ITER")),
+            "type_struct": type_struct,
+        })
+        return self.format_code(code)
+
+    @profiled
+    def _render_buffer_functions(self):
+        """
+        Renders the _CPP_(GETBUFFER) and _CPP_(RELEASEBUFFER) code as getbufferproc and releasebufferproc,
+        with 'arg1' being the Py_buffer* and 'arg2' the flags
+        """
+        code = "/* https://docs.python.org/3/c-api/buffer.html */\n"
+        code += render_function(self.getbuffer_func_name, "getbufferproc",
+                                self.get_inherited_cpp("GETBUFFER"), self)
+        if self.has_cpp("RELEASEBUFFER"):
+            code += "\n" + render_function(self.releasebuffer_func_name, "releasebufferproc",
+                                           self.get_inherited_cpp("RELEASEBUFFER"), self)
+        return self.format_code(code)
+
+    def _get_buffer_dict(self):
+        dic = { "bf_getbuffer": self.getbuffer_func_name }
+        if self.has_cpp("RELEASEBUFFER"):
+            dic.update({ "bf_releasebuffer": self.releasebuffer_func_name })
+        return dic
 
+    @profiled
+    def _render_buffer_struct(self):
+        return self.format_code(render_struct("PyBufferProcs", PyBufferProcs,
+                             self.buffer_struct_name, self._get_buffer_dict()))
+
+    @profiled
     def _render_doc_string(self):
         return self.format_code(
             "static const char* %s_doc_string = \"%s\";\n" % (self.class_struct_name, to_c_string(self.doc))
         )
 
+    @profiled
     def _render_ctor_impl(self):
         code = """
+        %(freelist_decl)s
         /** Creates new instance of %(name)s class.
             @note Original function signature requires to return PyObject*,
             but here we return the actual %(name)s struct for convenience. */
-        %(struct_name)s* %(new_func)s()
+        %(struct_name)s* %(new_func)s(%(new_args)s)
         {
-            auto o = PyObject_New(%(struct_name)s, &%(type_struct)s);
-            o->cppy_new();
+            %(alloc)s
+            %(init)s
             return o;
         }
 
         /** Deletes a %(name)s instance */
         void %(dealloc_func)s(PyObject* self)
         {
-            reinterpret_cast<%(struct_name)s*>(self)->cppy_free();
-            self->ob_type->tp_free(self);
+            %(destroy)s
+            %(free)s
         }
 
         /** Makes a copy of the %(name)s instance @p self,
             using user-supplied %(struct_name)s::cppy_copy() */
         %(struct_name)s* %(copy_func)s(%(struct_name)s* self)
         {
-            %(struct_name)s* copy = $NEW(%(name)s);
+            %(struct_name)s* copy = %(new_copy)s;
             self->cppy_copy(copy);
             return copy;
         }
@@ -308,10 +926,10 @@ class Class(CodeObject):
         /** Wrapper for type checking after declaration of %(type_struct)s */
         bool %(is_instance_func)s(PyObject* arg)
         {
-            return PyObject_TypeCheck(arg, &%(type_struct)s);
+            %(is_instance)s
         }
 """
-        code %= {
+        dic = {
             "name": self.name,
             "struct_name": self.class_struct_name,
             "type_struct": self.type_struct_name,
@@ -319,15 +937,148 @@ class Class(CodeObject):
             "copy_func": self.class_copy_func_name,
             "dealloc_func": self.class_dealloc_func_name,
             "is_instance_func": self.class_is_instance_func_name,
+            "freelist": self.freelist_name,
+            "clear_freelist_func": self.clear_freelist_func_name,
+            "size": self.get_freelist_size(),
+            "new": "PyObject_GC_New" if self.has_gc() else "PyObject_New",
+            "del": "PyObject_GC_Del" if self.has_gc() else "PyObject_Del",
+            "new_args": "",
+            "new_copy": "$NEW(%s)" % self.name,
+            "is_instance": "return PyObject_TypeCheck(arg, &%s);" % self.type_struct_name,
         }
+        # objects are tracked by the garbage collector only while they are fully initialized
+        dic.update({
+            "init": "o->cppy_new();" + ("\nPyObject_GC_Track(o);" if self.has_gc() else ""),
+            "destroy": ("PyObject_GC_UnTrack(self);\n" if self.has_gc() else "")
+                       + "reinterpret_cast<%(struct_name)s*>(self)->cppy_free();" % dic,
+        })
+        if dic["size"]:
+            dic.update({
+                "freelist_decl": """
+                    /** Freelist of up to %(size)d %(name)s instances, see _CPP_(FREELIST) */
+                    static %(struct_name)s* %(freelist)s[%(size)d];
+                    static int %(freelist)s_size = 0;
+
+                    /** Frees all instances in the freelist, called at module teardown */
+                    void %(clear_freelist_func)s()
+                    {
+                        while (%(freelist)s_size)
+                            %(del)s(%(freelist)s[--%(freelist)s_size]);
+                    }
+                    """ % dic,
+                "alloc": """
+                    %(struct_name)s* o;
+                    if (%(freelist)s_size)
+                    {
+                        o = %(freelist)s[--%(freelist)s_size];
+                        (void)PyObject_INIT(o, &%(type_struct)s);
+                    }
+                    else
+                        o = %(new)s(%(struct_name)s, &%(type_struct)s);
+                    """ % dic,
+                # instances of derived types have a different size
+                "free": """
+                    if (Py_TYPE(self) == &%(type_struct)s && %(freelist)s_size < %(size)d)
+                        %(freelist)s[%(freelist)s_size++] = reinterpret_cast<%(struct_name)s*>(self);
+                    else
+                        self->ob_type->tp_free(self);
+                    """ % dic,
+            })
+        else:
+            dic.update({
+                "freelist_decl": "",
+                "alloc": "auto o = %(new)s(%(struct_name)s, &%(type_struct)s);" % dic,
+                "free": "self->ob_type->tp_free(self);",
+            })
+        if self.context.multiphase:
+            # the heap type of the module is passed to create_<Class>(), instances hold a reference to it
+            dic.update({
+                "type_struct": self.type_spec_name,
+                "new_args": "PyTypeObject* type",
+                "new_copy": self.render_new_call("reinterpret_cast<PyObject*>(self)"),
+                "is_instance": "auto state = %s(arg);\nreturn state && PyObject_TypeCheck(arg, state->%s);" % (
+                    self.context.state_func_name, self.state_type_name),
+                "alloc": "auto o = %(new)s(%(struct_name)s, type);" % dic,
+                "free": "PyTypeObject* type = Py_TYPE(self);\ntype->tp_free(self);\nPy_DECREF(type);",
+            })
+        return self.format_code(apply_string_dict(code, dic))
+
+    @profiled
+    def _render_vectorcall_impl(self):
+        """
+        Renders the vectorcall function that is called instead of the generic
+        type_call() for constructing the class, python >= 3.9
+        """
+        if self.has_function("__init__"):
+            # __init__ is an initproc and always gets an argument tuple
+            body = """
+            Py_ssize_t nargs = PyVectorcall_NARGS(arg2);
+            PyObject* args = PyTuple_New(nargs);
+            if (!args)
+                return NULL;
+            for (Py_ssize_t i = 0; i < nargs; ++i)
+            {
+                Py_INCREF(arg1[i]);
+                PyTuple_SET_ITEM(args, i, arg1[i]);
+            }
+            PyObject* kwargs = NULL;
+            if (arg3 && PyTuple_GET_SIZE(arg3))
+            {
+                kwargs = PyDict_New();
+                for (Py_ssize_t i = 0; kwargs && i < PyTuple_GET_SIZE(arg3); ++i)
+                    if (0 != PyDict_SetItem(kwargs, PyTuple_GET_ITEM(arg3, i), arg1[nargs + i]))
+                        Py_CLEAR(kwargs);
+                if (!kwargs)
+                {
+                    Py_DECREF(args);
+                    return NULL;
+                }
+            }
+            PyObject* self = reinterpret_cast<PyObject*>($NEW(%(name)s));
+            int ret = %(init_func)s(self, args, kwargs);
+            Py_DECREF(args);
+            Py_XDECREF(kwargs);
+            if (ret < 0)
+            {
+                Py_DECREF(self);
+                return NULL;
+            }
+            return self;
+            """ % {
+                "name": self.name,
+                "init_func": self.get_function("__init__").func_name,
+            }
+        else:
+            body = "return reinterpret_cast<PyObject*>($NEW(%s));" % self.name
+
+        code = "#if PY_VERSION_HEX >= 0x03090000\n/** Constructs a %s instance */\n%s#endif\n" % (
+            self.name, render_function(self.class_vectorcall_func_name, "vectorcallfunc", body))
         return self.format_code(code)
 
+    @profiled
     def _render_init_func(self):
+        if self.context.multiphase:
+            return self._render_heap_type_init_func()
+        vectorcall = ""
+        if self.context.fastcall:
+            vectorcall = "#if PY_VERSION_HEX >= 0x03090000\n%s.tp_vectorcall = %s;\n#endif" % (
+                self.type_struct_name, self.class_vectorcall_func_name)
+        iterator = ""
+        if self.has_iterator():
+            iterator = """
+                if (0 != PyType_Ready(&%(type)s))
+                {
+                    CPPY_ERROR("Failed to readify iterator of class %(name)s for Python 3.4 module");
+                    return false;
+                }
+                """ % { "type": self.iterator_type_struct_name, "name": self.name }
         code = """
         bool initialize_class_%(name)s(void* vmodule)
         {
             PyObject* module = reinterpret_cast<PyObject*>(vmodule);
 
+            %(vectorcall)s
+            %(iterator)s
             if (0 != PyType_Ready(&%(struct_name)s))
             {
                 CPPY_ERROR("Failed to readify class %(name)s for Python 3.4 module");
@@ -344,9 +1095,127 @@ class Class(CodeObject):
             }
             return true;
         }
-        """ % {
+        """
+        code = apply_string_dict(code, {
             "name": self.name,
-            "struct_name": self.type_struct_name
+            "struct_name": self.type_struct_name,
+            "vectorcall": vectorcall,
+            "iterator": iterator,
+        })
+        return self.format_code(code)
+
+
+    @profiled
+    def _render_heap_type_init_func(self):
+        """
+        Renders initialize_class_<Class>() for multi-phase initialization,
+        which creates the heap types of the module and stores them in the module state.
+        The heap types of the base classes must be created before
+        """
+        state = "state->%s" % self.state_type_name
+        vectorcall = ""
+        if self.context.fastcall:
+            vectorcall = "%s->tp_vectorcall = %s;" % (state, self.class_vectorcall_func_name)
+        iterator = ""
+        if self.has_iterator():
+            iterator = """
+                state->%(iterator_type)s = reinterpret_cast<PyTypeObject*>(
+                    PyType_FromModuleAndSpec(module, &%(spec)s, NULL));
+                if (!state->%(iterator_type)s)
+                {
+                    CPPY_ERROR("Failed to create iterator of class %(name)s");
+                    return false;
+                }
+                """ % { "iterator_type": self.iterator_state_type_name,
+                        "spec": self.iterator_type_spec_name, "name": self.name }
+        code = """
+        bool initialize_class_%(name)s(void* vmodule)
+        {
+            PyObject* module = reinterpret_cast<PyObject*>(vmodule);
+            auto state = %(state_func)s(module);
+
+            %(iterator)s
+            %(type)s = reinterpret_cast<PyTypeObject*>(
+                PyType_FromModuleAndSpec(module, &%(spec)s, %(base)s));
+            if (!%(type)s)
+            {
+                CPPY_ERROR("Failed to create class %(name)s");
+                return false;
+            }
+            %(vectorcall)s
+            if (0 != PyModule_AddType(module, %(type)s))
+            {
+                CPPY_ERROR("Failed to add class %(name)s to module");
+                return false;
+            }
+            return true;
         }
+        """
+        code = apply_string_dict(code, {
+            "name": self.name,
+            "state_func": self.context.state_func_name,
+            "type": state,
+            "spec": self.type_spec_name,
+            "base": "reinterpret_cast<PyObject*>(state->%s)" % self.bases[0].state_type_name
+                    if self.bases else "NULL",
+            "vectorcall": vectorcall,
+            "iterator": iterator,
+        })
         return self.format_code(code)
 
+
+_re_comment = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_re_member_name = re.compile(r"([A-Za-z_][A-Za-z_0-9]*)$")
+_re_identifier = re.compile(r"^[A-Za-z_][A-Za-z_0-9]*$")
+_re_separator = re.compile(r"[\s,;]+")
+_re_final = re.compile(r"^(?:typing\.)?Final\[(.*)\]$")
+
+
+def _split_traverse_members(code, owner):
+    """
+    Returns the member names in the code of a _CPP_(TRAVERSE) section
+    :param owner: str, the class or module for error messages
+    :return: list of str
+    """
+    members = []
+    for name in _re_separator.split(_re_comment.sub("", code)):
+        if not name or name in members:
+            continue
+        if not _re_identifier.match(name):
+            raise ValueError("Invalid member '%s' in _CPP_(TRAVERSE) of %s" % (name, owner))
+        members.append(name)
+    return members
+
+
+def _render_type_spec(spec_name, slots_name, dic, sub_dicts=()):
+    """
+    Renders a PyType_Slot array and the PyType_Spec from the dictionaries
+    of the members of PyTypeObject and of the method structs, see c_types.PyType_Spec
+    :param sub_dicts: list of tuples (struct table, dict), e.g. (PyNumberMethods, { "nb_add": "my_add" })
+    :return: str
+    """
+    code = "static PyType_Slot %s[] =\n{\n" % slots_name
+    for table, d in [(PyTypeObject, dic)] + list(sub_dicts):
+        for i in table:
+            if i[0] in TYPE_SPEC_EXCLUDE or d.get(i[0], "NULL") == "NULL":
+                continue
+            code += INDENT + "{ Py_%s, (void*)%s },\n" % (i[0], d[i[0]])
+    code += INDENT + "{ 0, NULL }\n};\n"
+    return code + render_struct("PyType_Spec", PyType_Spec, spec_name, {
+        "name": dic["tp_name"],
+        "basicsize": dic["tp_basicsize"],
+        "itemsize": "0",
+        "flags": dic["tp_flags"],
+        "slots": slots_name,
+    })
+
+
+def _attribute_value(type, value):
+    """Returns the c++ literal of the initial value of a typed attribute"""
+    if type == "bool":
+        return "true" if value else "false"
+    if type == "int" and isinstance(value, int):
+        return "%d" % value
+    if type == "float" and isinstance(value, (int, float)):
+        return repr(float(value))
+    return "0"
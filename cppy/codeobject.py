@@ -1,4 +1,5 @@
 from .renderer import split_doc_cpp
+from .cache import hash_data
 
 class DocObject:
     def __init__(self, doc):
@@ -32,6 +33,7 @@ class CodeObject(DocObject):
         super(CodeObject, self).__init__(doc)
         self.module = None
         self.context = None
+        self._source_hash = None
 
     def __str__(self):
         return "%s" % self.name
@@ -39,6 +41,36 @@ class CodeObject(DocObject):
     def format_code(self, code):
         return self.context.format_cpp(code, self)
 
+    def cache_data(self):
+        """Return everything that determines the rendered code, used for source_hash()"""
+        return (self.name, self.src_pos, self.doc, sorted(self._cpp.items(), key=lambda i: str(i[0])))
+
+    def source_hash(self):
+        """
+        Returns a hash of the doc-string and signature of this object
+        :return: str
+        """
+        if self._source_hash is None:
+            self._source_hash = hash_data((self.__class__.__name__, self.cache_data()))
+        return self._source_hash
+
+    def render_part(self, part):
+        """
+        Returns the code of self.render_<part>(),
+        from the cache of the context if there is one
+        :param part: str, e.g. "python_api"
+        :return: str
+        """
+        if self.context and self.context.profiler is not None:
+            with self.context.profiler.measure("%s.render_%s" % (self.__class__.__name__, part), str(self)):
+                return self._render_part(part)
+        return self._render_part(part)
+
+    def _render_part(self, part):
+        if self.context and self.context.cache:
+            return self.context.cache.render(self, part)
+        return getattr(self, "render_" + part)()
+
     def render_header_forwards(self):
         """Stuff that needs to be known by all other code in the .h file"""
         raise NotImplementedError
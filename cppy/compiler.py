@@ -9,14 +9,23 @@ class _Exporter:
     Class responsible to traverse a module and it's members
     and to generate an ExportContext instance from it
     """
-    def __init__(self):
+    def __init__(self, profiler=None, verbose=False):
         self.scope_stack = []
         self.context = None
+        # optional profiler.Profiler
+        self.profiler = profiler
+        self.verbose = verbose
 
     def log(self, str):
-        if 0:
+        if self.verbose:
             print("  " * len(self.scope_stack) + str)
 
+    def measure(self, stage, name):
+        """Returns the profiler's context manager for the stage or a no-op"""
+        if self.profiler is None:
+            return _no_measurement
+        return self.profiler.measure(stage, name)
+
     def scope_name(self):
         return self.scope_stack[-1] if self.scope_stack else ""
 
@@ -33,12 +42,15 @@ class _Exporter:
 
     def inspect_module(self, module):
         self.context = ExportContext(module)
+        self.context.profiler = self.profiler
         mod_name = module.__name__
         self.log("inspect module '%s'" % mod_name)
-        self.push_scope(mod_name)
-        self.inspect_names(module, dir(module))
-        self.pop_scope()
-        self.context.finalize()
+        with self.measure("inspect_module", str(self.context)):
+            self.push_scope(mod_name)
+            self.inspect_names(module, dir(module))
+            self.pop_scope()
+        with self.measure("finalize", str(self.context)):
+            self.context.finalize()
 
     def inspect_names(self, parent, names):
         self.log("scanning names in %s" % type(parent))
@@ -65,12 +77,14 @@ class _Exporter:
     def inspect_function(self, func, class_obj=None):
         self.log("inspecting function %s" % func)
         self.push_scope(func.__name__)
-        o = Function(func, class_obj)
-        o.context = self.context
-        if class_obj is None:
-            self.context.append(o)
-        else:
-            class_obj.append(o)
+        name = "%s.%s" % (class_obj.name, func.__name__) if class_obj else func.__name__
+        with self.measure("inspect_function", "Function(%s)" % name):
+            o = Function(func, class_obj)
+            o.context = self.context
+            if class_obj is None:
+                self.context.append(o)
+            else:
+                class_obj.append(o)
         self.pop_scope()
 
     def inspect_property(self, prop, class_obj):
@@ -81,33 +95,57 @@ class _Exporter:
     def inspect_class(self, cls):
         self.log("inspecting class %s" % cls)
         self.push_scope(cls.__name__)
-        class_obj = Class(cls)
-        for n, mem in inspect.getmembers(cls):
-            if inspect.isfunction(mem):
-                self.inspect_function(mem, class_obj)
-            elif isinstance(mem, property):
-                self.inspect_property(mem, class_obj)
-
-        self.context.append(class_obj)
+        with self.measure("inspect_class", "Class(%s)" % cls.__name__):
+            class_obj = Class(cls)
+            for n, mem in inspect.getmembers(cls):
+                if inspect.isfunction(mem):
+                    self.inspect_function(mem, class_obj)
+                elif isinstance(mem, property):
+                    self.inspect_property(mem, class_obj)
+
+            self.context.append(class_obj)
         self.pop_scope()
 
 
+class _NoMeasurement:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
 
+_no_measurement = _NoMeasurement()
 
-def compile(module):
+
+def compile(module, profiler=None, verbose=False):
     """
     Scans the module and returns an cppy.Module class
     :param module: a loaded module
+    :param profiler: profiler.Profiler, optional, records the time of each stage
+        of the inspection and of the rendering by the returned Renderer
+    :param verbose: bool, print each inspected object
     :return: a Module instance
     """
     if not inspect.ismodule(module):
         raise TypeError("Expected module, got %s" % type(module))
 
-    c = _Exporter()
+    c = _Exporter(profiler, verbose)
     c.inspect_module(module)
     return Renderer(c.context)
 
 
+def compile_file(filename, name=None):
+    """
+    Scans the python file without importing it and returns a cppy.Module class.
+    Only the functions and classes defined in the file are exported, see scanner.py
+    :param filename: str, name of the python file
+    :param name: str, optional name of the module, defaults to the basename of the file
+    :return: a Module instance
+    """
+    from . import scanner
+    return compile(scanner.load_module(filename, name))
+
+
 if __name__ == "__main__":
     pass
     #print("TYPE_STRUCT_MEMBER = [")
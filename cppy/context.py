@@ -1,8 +1,10 @@
-import inspect
+import inspect, re
 from .codeobject import *
 from .renderer import *
 from .function_ import *
 from .class_ import *
+from .class_ import _split_traverse_members
+from .cache import hash_data
 
 
 class ExportContext(DocObject):
@@ -17,16 +19,60 @@ class ExportContext(DocObject):
         self.name = module.__name__
         self.struct_name = "cppy_module_%s" % self.name
         self.method_struct_name = "cppy_module_methods_%s" % self.name
+        self.state_struct_name = "cppy_state_%s" % self.name
+        self.state_func_name = "cppy_get_state_%s" % self.name
+        self.profile_table_name = "cppy_profile_%s" % self.name
+        self.private_namespace = "cppy_private_%s" % self.name
+        self.class_dict = dict()
+        self._template_cache = dict()
+        # names of the interned strings used with $STR(name), see finalize()
+        self.strings = []
+        # optional cache.RenderCache
+        self.cache = None
+        # optional profiler.Profiler, see compiler.compile()
+        self.profiler = None
+        self._source_hash = None
+        # METH_FASTCALL functions and vectorcall constructors, see Renderer.fastcall
+        self.fastcall = False
+        # module state and heap types, see Renderer.multiphase
+        self.multiphase = False
+        # call counters and timing in each wrapper, see Renderer.profile
+        self.profile = False
+        # list of tuples (name, src_pos), see _collect_profile_entries()
+        self.profile_entries = []
+        self._profile_index = dict()
+        # number of .cpp files for the classes and functions, see Renderer.shards
+        self.shards = 0
 
     def __str__(self):
         return "Context(%s)" % self.name
 
     def supported_doc_tags(self):
-        return [None, "HEADER"]
+        return [None, "HEADER", "STATE", "TRAVERSE"]
 
     def format_code(self, code):
         return self.format_cpp(code, None)
 
+    def source_hash(self):
+        """
+        Returns a hash of the module doc-string and the names of all classes,
+        which are part of the rendered code of every object
+        :return: str
+        """
+        if self._source_hash is None:
+            self._source_hash = hash_data((self.name, self.doc, sorted(self._cpp.items(), key=lambda i: str(i[0])),
+                                           sorted(self.class_dict), self.fastcall, self.multiphase,
+                                           self.profile and self.profile_entries, self.shards > 0))
+        return self._source_hash
+
+    def invalidate(self):
+        """
+        Clears the cached template arguments and source_hash(),
+        to be called when a setting changes that is part of the rendered code, see Renderer.fastcall
+        """
+        self._template_cache = dict()
+        self._source_hash = None
+
     def append(self, o):
         """Append a CodeObject"""
         o.context = self
@@ -55,16 +101,25 @@ class ExportContext(DocObject):
 
     def finalize(self):
         """To be called after all CodeObjects are added"""
+        # index for the base classes and the template tags
+        self.class_dict = dict((i.name, i) for i in self.classes)
         # first resolve all base classes so we can fetch cpp annotation from bases
         self._resolve_base_classes()
         # remove all objects from export who aren't annotated
         self.functions = self._clear_unused(self.functions)
-        self.classes = self._clear_unused(self.classes)
+        classes = self._clear_unused(self.classes)
+        for i in set(self.classes).difference(classes):
+            del self.class_dict[i.name]
+        self.classes = classes
         for i in self.classes:
             i.functions = self._clear_unused(i.functions)
             i.properties = self._clear_unused(i.properties)
 
         self.all_objects = self.functions + self.classes
+        self.invalidate()
+        self.strings = self._collect_strings()
+        self.profile_entries = self._collect_profile_entries()
+        self._profile_index = dict((e[0], i) for i, e in enumerate(self.profile_entries))
 
     def _clear_unused(self, objs):
         ret = []
@@ -73,10 +128,83 @@ class ExportContext(DocObject):
                 ret.append(i)
         return ret
 
-    def get_class(self, name):
+    def _collect_strings(self):
+        """
+        Returns the sorted names of all $STR(name) tags in the cpp annotations.
+        The sources are scanned because objects from the render cache are not formatted again
+        :return: list of str
+        """
+        objs = [self] + self.all_objects
         for i in self.classes:
-            if i.name == name:
-                return i
+            objs += i.functions + i.properties
+        strings = set()
+        for o in objs:
+            for code in o._cpp.values():
+                for m in _re_template_tag.finditer(code):
+                    if m.group(1).upper() == "STR":
+                        strings.add(_get_string_name(_split_template_args(m.group(2))))
+        return sorted(strings)
+
+    def _collect_profile_entries(self):
+        """
+        Returns the entries of the call profiling table in order of the module's objects,
+        one for each function and each getter and setter of a property
+        :return: list of tuples (name, src_pos)
+        """
+        entries = [(i.profile_name, i.src_pos) for i in self.functions]
+        for c in self.classes:
+            entries += [(i.profile_name, i.src_pos) for i in c.functions]
+            for i in c.properties:
+                if i.has_getter:
+                    entries.append((i.getter_profile_name, i.src_pos))
+                if i.has_setter:
+                    entries.append((i.setter_profile_name, i.src_pos))
+        return entries
+
+    def get_profile_expr(self, name):
+        """
+        Returns the entry of the call profiling table for the function 'name',
+        as listed by _collect_profile_entries(), or None if profiling is disabled
+        :return: str or None
+        """
+        if not self.profile:
+            return None
+        return "%s[%d]" % (self.profile_table_name, self._profile_index[name])
+
+    def get_traverse_members(self):
+        """
+        Returns the names of the members of the module state from _CPP_(TRAVERSE),
+        see Class.get_traverse_members()
+        :return: list of str
+        """
+        return _split_traverse_members(self.cpp("TRAVERSE"), "module %s" % self.name)
+
+    def get_state_expr(self, args):
+        """
+        Returns the expression of the module state for the template tag $STATE(arg),
+        where 'arg' is the module, an instance or a type of the module and defaults to 'arg0'
+        :return: str
+        """
+        if not self.multiphase:
+            raise ValueError("Template tag 'STATE' requires multi-phase initialization, see Renderer.multiphase")
+        if len(args) > 1:
+            raise ValueError("Bad arguments '%s' to template tag 'STATE'" % ", ".join(args))
+        return "%s(%s)" % (self.state_func_name, args[0] if args else "arg0")
+
+    def get_string_expr(self, args):
+        """
+        Returns the expression of the interned string for the template tag $STR(name).
+        With multi-phase initialization the strings are members of the module state, see get_state_expr()
+        :return: str
+        """
+        name = string_var_name(_get_string_name(args))
+        if self.multiphase:
+            return "%s->%s" % (self.get_state_expr([]), name)
+        return name
+
+    def get_class(self, name):
+        if name in self.class_dict:
+            return self.class_dict[name]
         raise RuntimeError("Required base class '%s' not found" % name)
 
     def _resolve_base_classes(self):
@@ -88,94 +216,109 @@ class ExportContext(DocObject):
                 if not "builtins.object" in name and not name == "object":
                     i.bases.append(self.get_class(name))
 
-    def format_cpp(self, code, for_object):
-        """Applies template replacement"""
-        code1 = ""
-        prev = 0
-        import re
-        for i in re.finditer(r"\$([A-Za-z_]+)\(([ ]*[A-Za-z_0-9, ]*)\)", code):
-            span = i.span()
-            code1 += code[prev:span[0]]
-            prev = span[1]
-            code1 += self.get_template_arg(i.groups()[0], i.groups()[1], for_object)
-        code1 += code[prev:]
-        code = strip_newlines(code1)
+    def format_cpp(self, code, for_object, local_tags=None):
+        """
+        Applies template replacement
+        :param local_tags: optional dict with tags that are only valid for one object,
+            tag: function(list of arguments) returning the replacement,
+            e.g. Function.local_template_tags()
+        """
+        if self.profiler is not None:
+            with self.profiler.measure("format_cpp", str(for_object or self)):
+                return self._format_cpp(code, for_object, local_tags)
+        return self._format_cpp(code, for_object, local_tags)
+
+    def _format_cpp(self, code, for_object, local_tags):
+        class_name = for_object.name if for_object else ""
+        if local_tags:
+            code = _re_template_tag.sub(
+                lambda m: self._get_local_template_arg(m.group(1), m.group(2), class_name, local_tags), code)
+        else:
+            code = _re_template_tag.sub(
+                lambda m: self._get_template_arg_cached(m.group(1), m.group(2), class_name), code)
+        code = strip_newlines(code)
         return change_text_indent(code, 0)
 
+    def _get_template_arg_cached(self, tag, the_args, class_name):
+        key = (tag, the_args, class_name)
+        value = self._template_cache.get(key)
+        if value is None:
+            value = self._template_cache[key] = self._get_template_arg(tag, the_args, class_name)
+        return value
+
+    def _get_local_template_arg(self, tag, the_args, class_name, local_tags):
+        func = local_tags.get(tag.upper())
+        if func is None:
+            return self._get_template_arg_cached(tag, the_args, class_name)
+        args = _split_template_args(the_args)
+        try:
+            return func(args)
+        except IndexError:
+            raise ValueError("Bad arguments '%s' to template tag '%s'" % (the_args, tag))
+
     def get_template_arg(self, tag, the_args, for_class):
         """Returns the value for a template tag '$tag(the_args)'"""
-        if the_args:
-            args = the_args.split(",")
-            args = [x.strip() for x in args]
-        else:
-            args = []
-
-        class_name = ""
-        if for_class:
-            class_name = for_class.name
-
-        bad_arg = False
-
-        tag = tag.upper();
-        if tag == "NAME":
-            if len(args):
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return i.name
-            bad_arg = True
-
-        if tag == "STRUCT":
-            if len(args):
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return i.class_struct_name
-            bad_arg = True
-
-        if tag == "TYPE_STRUCT":
-            if len(args):
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return i.type_struct_name
-            bad_arg = True
-
-        if tag == "NEW":
-            if len(args):
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return "%s()" % i.class_new_func_name
-            bad_arg = True
-
-        if tag == "IS_INSTANCE":
-            if len(args) > 1:
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return "%s(%s)" % (i.class_is_instance_func_name, args[0])
-            bad_arg = True
-
-        if tag == "CAST":
-            if len(args) > 1:
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return "reinterpret_cast<%s*>(%s)" % (i.class_struct_name, args[0])
-            bad_arg = True
-
-        if tag == "COPY":
-            if len(args) > 1:
-                class_name = args[-1]
-            for i in self.classes:
-                if i.name == class_name:
-                    return "%s(%s)" % (i.class_copy_func_name, args[0])
-            bad_arg = True
-
-        if bad_arg:
+        return self._get_template_arg(tag, the_args, for_class.name if for_class else "")
+
+    def _get_template_arg(self, tag, the_args, class_name):
+        args = _split_template_args(the_args)
+
+        tag = tag.upper()
+        if tag in MODULE_TEMPLATE_TAGS:
+            return MODULE_TEMPLATE_TAGS[tag](self, args)
+        if not tag in TEMPLATE_TAGS:
+            raise ValueError("Unknown template tag '%s'" % tag)
+        num_args, func = TEMPLATE_TAGS[tag]
+
+        if len(args) >= num_args:
+            class_name = args[-1]
+        if not class_name in self.class_dict:
             raise ValueError("Bad arguments '%s' to template tag '%s' (object:%s)" % (the_args, tag, class_name))
-        raise ValueError("Unknown template tag '%s'" % tag)
+        return func(self.class_dict[class_name], args)
+
+
+def _split_template_args(the_args):
+    if not the_args:
+        return []
+    return [x.strip() for x in the_args.split(",")]
+
+
+_re_identifier = re.compile(r"^[A-Za-z_][A-Za-z_0-9]*$")
+
+
+def _get_string_name(args):
+    if len(args) != 1 or not _re_identifier.match(args[0]):
+        raise ValueError("Bad arguments '%s' to template tag 'STR'" % ", ".join(args))
+    return args[0]
+
+
+"""
+Regex for the template tags '$TAG(args)'
+"""
+_re_template_tag = re.compile(r"\$([A-Za-z_]+)\(([ ]*[A-Za-z_0-9, ]*)\)")
 
 
+"""
+All template tags as dict:
+tag: (number of arguments, from which on the last argument is the class name,
+      function(Class, list of arguments) returning the replacement)
+"""
+TEMPLATE_TAGS = {
+    "NAME":         (1, lambda c, args: c.name),
+    "STRUCT":       (1, lambda c, args: c.class_struct_name),
+    "TYPE_STRUCT":  (1, lambda c, args: "(*%s)" % c.type_object() if c.context.multiphase
+                                        else c.type_struct_name),
+    "NEW":          (1, lambda c, args: c.render_new_call()),
+    "IS_INSTANCE":  (2, lambda c, args: "%s(%s)" % (c.class_is_instance_func_name, args[0])),
+    "CAST":         (2, lambda c, args: "reinterpret_cast<%s*>(%s)" % (c.class_struct_name, args[0])),
+    "COPY":         (2, lambda c, args: "%s(%s)" % (c.class_copy_func_name, args[0])),
+}
 
+"""
+Template tags that do not refer to a class as dict:
+tag: function(ExportContext, list of arguments) returning the replacement
+"""
+MODULE_TEMPLATE_TAGS = {
+    "STR":          lambda ctx, args: ctx.get_string_expr(args),
+    "STATE":        lambda ctx, args: ctx.get_state_expr(args),
+}
@@ -1,4 +1,4 @@
-import inspect
+import ast, inspect
 from .codeobject import *
 from .c_types import *
 from .renderer import *
@@ -13,16 +13,25 @@ class Function(CodeObject):
             src_pos="%s:%d" % (func.__code__.co_filename, func.__code__.co_firstlineno),
         )
         self.func = func
-        self.args = inspect.getargspec(self.func)
+        self.args = inspect.getfullargspec(self.func)
         if self.for_class:
             self.func_name = "cppy_classmethod_%s_%s" % (self.for_class.name, self.name)
+            self.profile_name = "%s.%s" % (self.for_class.name, self.name)
         else:
             self.func_name = "cppy_%s" % self.name
+            self.profile_name = self.name
         # self.doc += "\n" + str(self.args)
 
     def supported_doc_tags(self):
+        if self.name == "__hash__":
+            return [None, "CACHED"]
+        if self.name in ("__getitem__", "__setitem__", "__delitem__"):
+            return [None, "MAPPING"]
         return [None]
 
+    def cache_data(self):
+        return (super().cache_data(), self.for_class.name if self.for_class else None, str(self.args))
+
     def __str__(self):
         if self.for_class:
             return "Function(%s.%s)" % (self.for_class.name, self.name)
@@ -30,13 +39,169 @@ class Function(CodeObject):
             return "Function(%s)" % self.name
 
     def format_code(self, code):
-        return self.context.format_cpp(code, self.for_class)
+        return self.context.format_cpp(code, self.for_class, self.local_template_tags())
+
+    def local_template_tags(self):
+        """
+        Returns the template tags for the arguments of functions with a variable number of arguments:
+            $ARGS()     the array of arguments
+            $NARGS()    the number of arguments
+            $ARG(i)     the i-th argument
+            $KWNAMES()  the tuple of keyword names, or NULL
+        The same code works for the argument tuple of METH_VARARGS and for METH_FASTCALL
+        :return: dict or None
+        """
+        if not self.is_normal_function():
+            return None
+        flags = self.get_args_data()[1]
+        if flags.startswith("METH_FASTCALL"):
+            return FASTCALL_TAGS
+        if flags == "METH_VARARGS":
+            return VARARGS_TAGS
+        return None
+
+    def get_signature(self):
+        """
+        Returns the typed signature of the function from the python annotations,
+        or from the first line of the doc-string, e.g. 'func_add(a: float, b: float) -> float'.
+        Signatures in the doc-string are only used if all arguments have a name and a type.
+        Functions with default values or variable arguments are not typed.
+        All types must be in c_types.SIGNATURE_TYPES or a class of the module,
+        the return type may also be None.
+        :return: tuple (list of (name, type), return type) or None
+        """
+        if not self.is_normal_function() or self.args.varargs or self.args.varkw \
+                or self.args.kwonlyargs or self.args.defaults:
+            return None
+        names = self.args.args[1:] if self.for_class else self.args.args
+        annotations = dict((k, _annotation_name(v)) for k, v in self.args.annotations.items())
+        if not annotations:
+            doc = self._get_doc_signature()
+            if not doc:
+                return None
+            if len(doc[0]) != len(names):
+                raise ValueError("Signature in doc-string of %s does not match the arguments" % self)
+            names, annotations = doc
+
+        args = []
+        for name in names:
+            if not self._get_signature_type(annotations.get(name)):
+                return None
+            args.append((name, annotations[name]))
+        ret = annotations.get("return", "object")
+        if ret != "None" and not self._get_signature_type(ret):
+            return None
+        return args, ret
+
+    def _get_doc_signature(self):
+        """
+        Returns the argument names and types of a doc-string line like 'func_add(a: float, b: float) -> float'
+        :return: tuple (list of str, dict of str) or None
+        """
+        line = self.doc.split("\n", 1)[0].strip()
+        if not line.startswith(self.name + "("):
+            return None
+        try:
+            func = ast.parse("def %s: pass" % line).body[0]
+        except SyntaxError:
+            return None
+        args = func.args.args
+        if self.for_class and args and args[0].arg == "self":
+            args = args[1:]
+        if not args or not all(a.annotation for a in args):
+            return None
+        annotations = dict((a.arg, ast.unparse(a.annotation)) for a in args)
+        if func.returns:
+            annotations["return"] = ast.unparse(func.returns)
+        return [a.arg for a in args], annotations
+
+    def _get_signature_type(self, name):
+        """
+        Returns the c_types.SIGNATURE_TYPES entry for the type name, or None
+        :return: tuple
+        """
+        if name in SIGNATURE_TYPES:
+            return SIGNATURE_TYPES[name]
+        c = self.context.class_dict.get(name) if name else None
+        if c:
+            return ("%s*" % c.class_struct_name,
+                    "%s(%%(o)s)" % c.class_is_instance_func_name,
+                    "reinterpret_cast<%s*>(%%(o)s)" % c.class_struct_name,
+                    "!%(v)s",
+                    "reinterpret_cast<PyObject*>(%(v)s)")
+        return None
+
+    def _render_typed_cpp(self, cpp):
+        """
+        Wraps the code of a typed function into the conversion of the arguments
+        and the return value, see get_signature().
+        The code sees the arguments as c++ variables and returns the c++ value.
+        Errors are signaled by setting an exception and returning -1, NULL or nothing
+        like in the python c-api. bool can not signal an error.
+        :return: str
+        """
+        args, ret = self.get_signature()
+        flags = self.get_args_data()[1]
+        code = ""
+        if flags != "METH_O" and flags != "METH_NOARGS":
+            code += "if ($NARGS() != %d)\n{\n" % len(args)
+            code += INDENT + 'PyErr_Format(PyExc_TypeError, "%s() takes %d arguments (%%zd given)", $NARGS());\n' % (
+                self.name, len(args))
+            code += INDENT + "return NULL;\n}\n"
+        for i, (name, type) in enumerate(args):
+            ctype, check, convert, error, box = self._get_signature_type(type)
+            dic = { "o": "arg1" if flags == "METH_O" else "$ARG(%d)" % i, "v": name }
+            if check:
+                code += "if (!(%s))\n{\n" % (check % dic)
+                code += INDENT + 'PyErr_Format(PyExc_TypeError, "%s() argument %d must be %s, not %%.200s", ' \
+                                 'Py_TYPE(%s)->tp_name);\n' % (self.name, i + 1, type, dic["o"])
+                code += INDENT + "return NULL;\n}\n"
+            code += "%s %s = %s;\n" % (ctype, name, convert % dic)
+            if error:
+                code += "if (%s)\n%sreturn NULL;\n" % (error % dic, INDENT)
+
+        if ret == "object":
+            return code + change_text_indent(strip_newlines(cpp), 0)
+        cpp = change_text_indent(strip_newlines(cpp), 4)
+        if ret == "None":
+            return code + "[&]()\n{\n%s\n}();\nif (PyErr_Occurred())\n%sreturn NULL;\nPy_RETURN_NONE;" % (
+                cpp, INDENT)
+        ctype, check, convert, error, box = self._get_signature_type(ret)
+        dic = { "v": "cppy_result" }
+        code += "%s cppy_result = [&]() -> %s\n{\n%s\n}();\n" % (ctype, ctype, cpp)
+        if error:
+            code += "if (%s)\n%sreturn NULL;\n" % (error % dic, INDENT)
+        return code + "return %s;" % (box % dic)
+
+    def _render_cached_hash_cpp(self, cpp):
+        """
+        Wraps the code of __hash__ so that the hash is stored in 'cppy_hash' of the instance.
+        Errors, signaled by returning -1, are not stored
+        :return: str
+        """
+        code = "if (self->cppy_hash != -1)\n%sreturn self->cppy_hash;\n" % INDENT
+        code += "Py_hash_t cppy_result = [&]() -> Py_hash_t\n{\n%s\n}();\n" % (
+            change_text_indent(strip_newlines(cpp), 4))
+        code += "if (cppy_result != -1)\n%sself->cppy_hash = cppy_result;\n" % INDENT
+        return code + "return cppy_result;"
+
+    def is_fastcall(self):
+        """
+        Returns True if this function is called with METH_FASTCALL, see Renderer.fastcall
+        """
+        return bool(self.context and self.context.fastcall) and self.is_normal_function() \
+            and self._get_tuple_args_data()[1] == "METH_VARARGS"
+
+    def uses_keywords(self):
+        """Returns True if the code accesses the keyword arguments with $KWNAMES()"""
+        return "$KWNAMES(" in self.cpp(formated=False).upper()
 
     def is_normal_function(self):
         """Returns True if this function should go into the general PyMethodDef"""
         if not self.for_class:
             return True
-        return not (self.is_type_function() or self.is_number_function() or self.is_sequence_function())
+        return not (self.is_type_function() or self.is_number_function() or self.is_sequence_function()
+                    or self.is_richcompare_function() or self.is_mapping_function())
 
     def is_type_function(self):
         """
@@ -49,6 +214,24 @@ class Function(CodeObject):
                 return True
         return False
 
+    def is_richcompare_function(self):
+        """
+        Returns True if this function is one of the comparisons in the richcmpfunc of the class
+        """
+        if not self.for_class:
+            return False
+        for i in RICHCOMPARE_FUNCS:
+            if i[0] == self.name:
+                return True
+        return False
+
+    def is_hash_cached(self):
+        """
+        Returns True for a __hash__ function with the code in _CPP_(CACHED).
+        The hash is computed once and stored in the instance, which is only correct for immutable objects
+        """
+        return self.name == "__hash__" and self.has_cpp("CACHED")
+
     def is_number_function(self):
         """
         Returns True if this function should be part of the PyNumberMethods struct
@@ -58,32 +241,57 @@ class Function(CodeObject):
         for i in NUMBER_FUNCS:
             if i[0] == self.name:
                 return True
-        return False
+        return self.name in REFLECTED_NUMBER_FUNCS.values()
 
     def is_sequence_function(self):
         """
         Returns True if this function should be part of the PySequenceMethods struct
         """
-        if not self.for_class:
+        if not self.for_class or self.is_mapping_function():
             return False
         for i in SEQUENCE_FUNCS:
             if i[0] == self.name:
                 return True
         return False
 
+    def is_mapping_function(self):
+        """
+        Returns True if this function should be part of the PyMappingMethods struct,
+        which is the case for the MAPPING_FUNCS of a class with _CPP_(MAPPING)
+        """
+        if not self.for_class or not self.for_class.is_mapping():
+            return False
+        for i in MAPPING_FUNCS:
+            if i[0] == self.name:
+                return True
+        return False
+
+    def get_function_type(self):
+        """
+        Returns the name of the c function type, e.g. "binaryfunc", see c_types.FUNCTIONS
+        :return: str
+        """
+        if self.is_fastcall():
+            return self.get_args_data()[0]
+        if self.is_mapping_function():
+            for i in MAPPING_FUNCS:
+                if i[0] == self.name:
+                    return i[2]
+        return FUNCNAME_TO_TYPE.get(self.name, "binaryfunc")
+
     def get_return_type(self):
-        if not self.name in FUNCNAME_TO_TYPE:
+        if not self.name in FUNCNAME_TO_TYPE and not self.is_mapping_function():
             return "PyObject*"
-        type = FUNCNAME_TO_TYPE[self.name]
+        type = self.get_function_type()
         if not type in FUNCTIONS:
             raise ValueError("Function type for %s not in c_types.FUNCTIONS" % type)
         return FUNCTIONS[type][0]
         #return SPECIAL_RETURN_TYPES.get(self.name, "PyObject*")
 
     def get_argument_types(self):
-        if not self.name in FUNCNAME_TO_TYPE:
+        if not self.name in FUNCNAME_TO_TYPE and not self.is_mapping_function():
             return ("PyObject*", )
-        type = FUNCNAME_TO_TYPE[self.name]
+        type = self.get_function_type()
         if not type in FUNCTIONS:
             raise ValueError("Function type for %s not in c_types.FUNCTIONS" % type)
         return FUNCTIONS[type][1]
@@ -100,6 +308,13 @@ class Function(CodeObject):
         return "PyObject* arg0" + self.get_args_data()[2]
 
     def get_args_data(self):
+        if self.is_fastcall():
+            if self.uses_keywords():
+                return ("_PyCFunctionFastWithKeywords", "METH_FASTCALL | METH_KEYWORDS")
+            return ("_PyCFunctionFast", "METH_FASTCALL")
+        return self._get_tuple_args_data()
+
+    def _get_tuple_args_data(self):
         if self.args.varargs and len(self.args.varargs):
             return ("PyFunctionWithKeywords", "METH_VARARGS")
 
@@ -152,8 +367,22 @@ class Function(CodeObject):
             # "debug": str(self.args),
             "doc": doc
         }
-        func_type = FUNCNAME_TO_TYPE.get(self.name, "binaryfunc")
-        code += render_function(self.func_name, func_type, self.cpp(), self.for_class)
+        func_type = self.get_function_type()
+        cpp = self.cpp(formated=False)
+        if self.has_cpp("MAPPING"):
+            if not self.is_mapping_function():
+                raise ValueError("_CPP_(MAPPING) of %s is not supported for this function" % self)
+            cpp = self.cpp("MAPPING", formated=False)
+        elif self.is_mapping_function() and self.has_cpp() and self.name != "__len__":
+            raise ValueError("%s needs the code in _CPP_(MAPPING) in the mapping class %s" % (
+                self, self.for_class.name))
+        if self.get_signature():
+            cpp = self._render_typed_cpp(cpp)
+        elif self.is_hash_cached():
+            cpp = self._render_cached_hash_cpp(self.cpp("CACHED", formated=False))
+        # the body is formatted together with the whole function
+        code += render_function(self.func_name, func_type, cpp, self.for_class,
+                                self.context.get_profile_expr(self.profile_name))
 
         return self.format_code(code)
 
@@ -167,3 +396,32 @@ class Function(CodeObject):
             "func_type": args[0]
         }
         return s
+
+
+def _annotation_name(annotation):
+    """Returns the name of a type annotation, which is a type, a string or None"""
+    if annotation is None:
+        return "None"
+    if isinstance(annotation, str):
+        return annotation
+    return getattr(annotation, "__name__", str(annotation))
+
+
+"""
+Template tags for the arguments of METH_VARARGS and METH_FASTCALL functions,
+see Function.local_template_tags()
+tag: function(list of arguments) returning the replacement
+"""
+VARARGS_TAGS = {
+    "ARGS":     lambda args: "&PyTuple_GET_ITEM(arg1, 0)",
+    "NARGS":    lambda args: "PyTuple_GET_SIZE(arg1)",
+    "ARG":      lambda args: "PyTuple_GET_ITEM(arg1, %s)" % args[0],
+    "KWNAMES":  lambda args: "NULL",
+}
+
+FASTCALL_TAGS = {
+    "ARGS":     lambda args: "arg1",
+    "NARGS":    lambda args: "arg2",
+    "ARG":      lambda args: "arg1[%s]" % args[0],
+    "KWNAMES":  lambda args: "arg3",
+}
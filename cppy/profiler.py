@@ -0,0 +1,140 @@
+"""
+Profiler for the generation of the c++ code.
+
+Records the wall time and call count of each stage, e.g. "inspect_class",
+"format_cpp" or "Class._render_type_struct", and of each code object.
+Pass a Profiler to compiler.compile(), the rendering stages are then recorded as well.
+"""
+import functools, json, os, sys, time
+
+
+class Profiler:
+    """
+    Collects the timings of nested stages of the code generation
+    """
+    def __init__(self):
+        # stage -> [calls, total time, own time]
+        self.stages = dict()
+        # str(code object) -> [calls, total time, own time]
+        self.objects = dict()
+        # tuples (stage, object, pid, start, duration) for the trace
+        self.events = []
+        self.pid = os.getpid()
+        self._stack = []
+
+    def __str__(self):
+        return "Profiler(%d stages, %d objects)" % (len(self.stages), len(self.objects))
+
+    def measure(self, stage, obj=""):
+        """
+        Returns a context manager that measures the enclosed code.
+        Time spent in nested measurements does not count as own time of the stage and object
+        :param stage: str, name of the stage
+        :param obj: str, name of the code object
+        """
+        return _Measurement(self, stage, obj)
+
+    def _begin(self, stage, obj):
+        # [stage, object, start, time of nested measurements]
+        self._stack.append([stage, obj, time.perf_counter(), 0.])
+
+    def _end(self):
+        stage, obj, start, nested = self._stack.pop()
+        t = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][3] += t
+        for dic, key in ((self.stages, stage), (self.objects, obj)):
+            entry = dic.get(key)
+            if entry is None:
+                entry = dic[key] = [0, 0., 0.]
+            entry[0] += 1
+            entry[1] += t
+            entry[2] += t - nested
+        self.events.append((stage, obj, self.pid, start, t))
+
+    def total_time(self):
+        """
+        Returns the time of all outermost measurements
+        :return: float, seconds
+        """
+        return sum(i[2] for i in self.stages.values())
+
+    def merge(self, other):
+        """Adds the timings of another Profiler, e.g. from another process"""
+        for dic, other_dic in ((self.stages, other.stages), (self.objects, other.objects)):
+            for key, value in other_dic.items():
+                entry = dic.get(key)
+                if entry is None:
+                    dic[key] = list(value)
+                else:
+                    for i in range(3):
+                        entry[i] += value[i]
+        self.events += other.events
+
+    def report(self, file=sys.stdout, limit=20):
+        """
+        Prints the stages and the code objects sorted by their own time
+        :param limit: int, maximum number of code objects
+        """
+        file.write("# generation profile, %.4fs total\n" % self.total_time())
+        file.write("%-40s %8s %11s %11s\n" % ("stage", "calls", "total", "own"))
+        for stage, e in sorted(self.stages.items(), key=lambda i: -i[1][2]):
+            file.write("%-40s %8d %10.4fs %10.4fs\n" % (stage, e[0], e[1], e[2]))
+
+        objects = sorted(((k, v) for k, v in self.objects.items() if k), key=lambda i: -i[1][2])
+        file.write("\n# code objects by own time (%d of %d)\n" % (min(limit, len(objects)), len(objects)))
+        file.write("%-40s %8s %11s\n" % ("object", "calls", "own"))
+        for obj, e in objects[:limit]:
+            file.write("%-40s %8d %10.4fs\n" % (obj, e[0], e[2]))
+
+    def save_trace(self, filename):
+        """
+        Writes the measurements in the Chrome trace event format,
+        which can be loaded in chrome://tracing or https://ui.perfetto.dev
+        """
+        start = min([e[3] for e in self.events] or [0.])
+        events = [{
+            "name": stage,
+            "cat": "cppy",
+            "ph": "X",
+            "pid": pid,
+            "tid": 0,
+            "ts": (t - start) * 1e6,
+            "dur": duration * 1e6,
+            "args": {"object": obj},
+        } for stage, obj, pid, t, duration in self.events]
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class _Measurement:
+    __slots__ = ("profiler", "stage", "obj")
+
+    def __init__(self, profiler, stage, obj):
+        self.profiler = profiler
+        self.stage = stage
+        self.obj = obj
+
+    def __enter__(self):
+        self.profiler._begin(self.stage, self.obj)
+
+    def __exit__(self, *args):
+        self.profiler._end()
+
+
+def profiled(func):
+    """
+    Decorator for methods of objects with a 'context' attribute,
+    which measures each call with the Profiler of the ExportContext, if there is one.
+    The stage is the qualified name of the method, e.g. "Class._render_type_struct"
+    """
+    stage = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        profiler = self.context.profiler if self.context else None
+        if profiler is None:
+            return func(self, *args, **kwargs)
+        with profiler.measure(stage, str(self)):
+            return func(self, *args, **kwargs)
+    return wrapper
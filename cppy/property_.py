@@ -32,6 +32,8 @@ class Property(CodeObject):
         self.getter_func_name = "%s_%s_getter" % (self.for_class.name, self.name)
         self.setter_func_name = "%s_%s_setter" % (self.for_class.name, self.name)
         self.doc_name = "%s_%s_doc" % (self.for_class.name, self.name)
+        self.getter_profile_name = "%s.%s (get)" % (self.for_class.name, self.name)
+        self.setter_profile_name = "%s.%s (set)" % (self.for_class.name, self.name)
 
         self.has_getter &= self.has_cpp() or self.has_cpp("GET")
         self.has_setter &= self.has_cpp("SET")
@@ -42,6 +44,9 @@ class Property(CodeObject):
     def supported_doc_tags(self):
         return [None, "GET", "SET"]
 
+    def cache_data(self):
+        return (super().cache_data(), self.for_class.name, self.has_getter, self.has_setter)
+
     def render_header_forwards(self):
         """Stuff that needs to be known by all other code in the .h file"""
         return ""
@@ -65,11 +70,14 @@ class Property(CodeObject):
             code += "/* %s */\n" % self.src_pos
         if self.doc:
             code += 'static const char* %s = "%s";\n' % (self.doc_name, to_c_string(self.doc))
+        # the bodies are formatted together with the whole functions
         if self.has_getter:
-            cpp = self.cpp() if self.has_cpp() else self.cpp("GET")
-            code += render_function(self.getter_func_name, "getter", cpp, self.for_class)
+            cpp = self.cpp(formated=False) if self.has_cpp() else self.cpp("GET", False)
+            code += render_function(self.getter_func_name, "getter", cpp, self.for_class,
+                                    self.context.get_profile_expr(self.getter_profile_name))
         if self.has_setter:
-            code += render_function(self.setter_func_name, "setter", self.cpp("SET"), self.for_class)
+            code += render_function(self.setter_func_name, "setter", self.cpp("SET", False), self.for_class,
+                                    self.context.get_profile_expr(self.setter_profile_name))
 
         return self.format_code(code)
 
@@ -2,7 +2,9 @@
 Collection of formatting helper functions
 and the final Renderer to generate the output
 """
+import functools, re
 from .c_types import *
+from .profiler import profiled
 
 INDENT = "    "
 
@@ -42,41 +44,144 @@ def strip_newlines(code):
 #    import re
 #    return indent + re.sub(r"\n[ |\t]*", "\n"+indent, code.strip())
 
-def change_text_indent(code, len):
+def change_text_indent(code, indent):
     """
     Changes the indentation of a block of text.
     All leading whitespace on each line is stripped up to the
-    maximum common length of ws for each line and then 'len' spaces are inserted.
+    maximum common length of ws for each line and then 'indent' spaces are inserted.
     Also concats multiple new-lines into one
     :return: str
     """
+    if not ("\n" in code or "\t" in code):
+        # single line
+        stripped = code.lstrip(" ")
+        if stripped:
+            return " " * indent + stripped
+        if not code:
+            return ""
     lines = code.replace("\t", INDENT).split("\n")
     min_space = -1
     for line in lines:
-        for i, k in enumerate(line):
-            if not (k == " " or k == "\n"):
-                if min_space < 0:
-                    min_space = i
-                else:
-                    min_space = min(min_space, i)
-                break
-    pre = " " * len
-    code = ""
+        stripped = line.lstrip(" ")
+        if stripped:
+            space = len(line) - len(stripped)
+            if min_space < 0 or space < min_space:
+                min_space = space
+    pre = " " * indent
+    out = []
     was_nl = False
     for line in lines:
         li = line[min_space:]
         if li:
-            code += pre + li + "\n"
+            out.append(pre + li + "\n")
             was_nl = False
         else:
             if not was_nl:
-                code += "\n"
+                out.append("\n")
             was_nl = True
+    code = "".join(out)
     if code.endswith("\n"):
         code = code[:-1]
     return code
 
 
+def collapse_newlines(code):
+    """
+    Removes \n from beginning and end of string, like strip_newlines(),
+    and concats multiple new-lines into one, like change_text_indent(),
+    without touching the indentation.
+    For text that is assembled from already formatted code.
+    :return: str
+    """
+    return strip_newlines(_re_newlines.sub("\n\n", code))
+
+_re_newlines = re.compile(r"\n\n\n+")
+
+
+def join_code(fragments, separator="\n"):
+    """
+    Concatenates already formatted code fragments.
+    The result is the same as formatting the text 'separator + fragment' for each fragment,
+    e.g. empty fragments are skipped and multiple new-lines are concatenated into one.
+    :param fragments: iterable of str, each fragment formatted by ExportContext.format_cpp()
+    :param separator: str, "\n" or "\n\n"
+    :return: str
+    """
+    code = []
+    newlines = 0
+    for f in fragments:
+        newlines += len(separator)
+        if f:
+            if code:
+                code.append("\n\n" if newlines > 1 else "\n")
+            code.append(f)
+            newlines = 0
+    return "".join(code)
+
+
+class Template:
+    """
+    A %(key)s template, parsed once into literal and placeholder segments.
+
+    Each placeholder stores the indentation it will apply to it's value,
+    so rendering is a single pass over the segments.
+    See apply_string_dict() for the indentation rules.
+    """
+    _re_tag = re.compile(r"%\(([^()]*)\)s")
+
+    def __init__(self, code):
+        self.code = code
+        # list of (literal, key, indent, raw)
+        # 'raw' is the original text replaced by the placeholder,
+        # which is emitted when the key is not in the dictionary
+        self.segments = []
+        self.tail = ""
+        prev = 0
+        for m in self._re_tag.finditer(code):
+            pos = m.start()
+            linestart = code.rfind("\n", prev, pos)
+            if linestart < 0:
+                # another tag or the start of the text on this line
+                linestart = pos
+                indent = 0
+            else:
+                linestart += 1
+                for i in range(linestart, pos):
+                    if not is_whitespace(code[i]):
+                        linestart = pos
+                        break
+                indent = pos - linestart
+            self.segments.append((code[prev:linestart], m.group(1), indent, code[linestart:m.end()]))
+            prev = m.end()
+        self.tail = code[prev:]
+
+    def render(self, dic):
+        """
+        Replaces all placeholders with values from the dictionary 'dic'
+        :return: str
+        """
+        out = []
+        for literal, key, indent, raw in self.segments:
+            out.append(literal)
+            if key in dic:
+                out.append(change_text_indent(dic[key], indent))
+            else:
+                out.append(raw)
+        out.append(self.tail)
+        return "".join(out)
+
+
+@functools.lru_cache(maxsize=256)
+def get_template(code):
+    """
+    Returns the cached Template instance for the given text.
+    The templates of cppy are a few dozen strings, the bound keeps user code
+    passed to apply_string_dict() from growing the cache in long running processes
+    :return: Template
+    """
+    return Template(code)
+
+
 def apply_string_dict(code_, dic):
     """
     Replaces %(key)s tags in the given code_ with values from the dictionary dic.
@@ -98,29 +203,10 @@ def apply_string_dict(code_, dic):
             baz
 
     The original indentation of dic values will be stripped using change_text_indent()
+    Tags that appear inside of dic values are not replaced.
     :return: str
     """
-    code = str(code_)
-    for key in dic:
-        skey = "%(" + key + ")s"
-        pos = code.find(skey)
-        while pos >= 0:
-            linestart = code.rfind("\n", 0, pos)
-            if linestart < 0:
-                linestart = pos
-                indent = 0
-            else:
-                linestart += 1
-                for i in range(linestart, pos):
-                    if not is_whitespace(code[i]):
-                        linestart = pos
-                        break
-                indent = pos - linestart
-            #print(linestart, pos, indent)
-            text = change_text_indent(dic[key], indent)
-            code = code[:linestart] + text + code[pos + len(skey):]
-            pos = code.find(skey)
-    return code
+    return get_template(str(code_)).render(dic)
 
 
 
@@ -155,6 +241,18 @@ def split_doc_cpp(text):
 
 
 
+def get_function_type(type):
+    """
+    Returns the entry of c_types.FUNCTIONS or c_types.FASTCALL_FUNCTIONS
+    :param type: str, name of the function type, e.g. "unaryfunc"
+    :return: tuple (return_type, (args,))
+    """
+    if type in FUNCTIONS:
+        return FUNCTIONS[type]
+    if type in FASTCALL_FUNCTIONS:
+        return FASTCALL_FUNCTIONS[type]
+    raise ValueError("Function type for %s not in c_types.FUNCTIONS" % type)
+
 def render_func_def(name, type):
     """
     Render a function definition will all function arguments
@@ -162,9 +260,7 @@ def render_func_def(name, type):
     :param type: str, name of the function type, e.g. "unaryfunc", see c_types.py
     :return: str
     """
-    if not type in FUNCTIONS:
-        raise ValueError("Function type for %s not in c_types.FUNCTIONS" % type)
-    args = FUNCTIONS[type]
+    args = get_function_type(type)
     code = "static %s %s(" % (args[0], name)
     for i, a in enumerate(args[1]):
         code += "%s arg%d" % (a, i)
@@ -172,7 +268,7 @@ def render_func_def(name, type):
             code += ", "
     return code + ")"
 
-def render_function(name, type, cpp, for_class=None):
+def render_function(name, type, cpp, for_class=None, profile=None):
     """
     Render a function declaration
     :param name: str, name of the function
@@ -180,16 +276,18 @@ def render_function(name, type, cpp, for_class=None):
     :param cpp: str, the function body
     :param for_class: Class, if provided, a cast from 'arg0' to 'self' for the given
             class will be rendered before the user code
+    :param profile: str, optional entry of the call profiling table,
+            which counts and times each call, see Renderer.profile
     :return: str
     """
-    if not type in FUNCTIONS:
-        raise ValueError("Function type for %s not in c_types.FUNCTIONS" % type)
     get_self = ""
     unused = ""
-    for i in range(len(FUNCTIONS[type][1])):
+    for i in range(len(get_function_type(type)[1])):
         unused += "CPPY_UNUSED(arg%d); " % i
     if unused:
         unused = INDENT + unused + "\n"
+    if profile:
+        unused += INDENT + "cppy_profile_scope cppy_profile_scope_(%s);\n" % profile
 
     if for_class:
         get_self = INDENT + "%(struct)s* self = reinterpret_cast<%(struct)s*>(arg0);\n" % {
@@ -203,14 +301,35 @@ def render_function(name, type, cpp, for_class=None):
     return code
 
 
-def render_struct(structtypename, struct_table, name, dictionary, first_line=""):
+def string_var_name(name):
+    """
+    Returns the name of the static variable holding the interned string 'name', see $STR(name)
+    :return: str
+    """
+    return "cppy_str_%s" % name
+
+
+def _version_condition(entry):
+    """Returns the preprocessor condition for a struct member with version entries, see render_struct()"""
+    cond = []
+    if len(entry) > 2 and entry[2]:
+        cond.append("PY_VERSION_HEX >= %s" % entry[2])
+    if len(entry) > 3 and entry[3]:
+        cond.append("PY_VERSION_HEX < %s" % entry[3])
+    return " && ".join(cond)
+
+
+def render_struct(structtypename, struct_table, name, dictionary, first_line="", static=True):
     """
     Renders a struct with the contents from 'dictionary'
     :param structtypename: str, name of the struct type, e.g. "PyNumberMethods"
-    :param struct_table: list, something like, e.g. c_types.PyNumberMethods
+    :param struct_table: list, something like, e.g. c_types.PyNumberMethods,
+            members with a third entry are only rendered for python versions >= PY_VERSION_HEX,
+            members with a fourth entry only for python versions < PY_VERSION_HEX
     :param name: str, name of the struct variable
     :param dictionary: dict, key-value for the struct members, e.g. { "nb_add": "my_add_method" }
     :param first_line: optional first line in struct entry, e.g. "PyVarObject_HEAD_INIT(NULL, 0)"
+    :param static: bool, if False, the struct variable is visible to other translation units
     :return: str
     """
     name_width = 1
@@ -219,12 +338,19 @@ def render_struct(structtypename, struct_table, name, dictionary, first_line="")
         name_width = max(name_width, len(i[0]))
         type_width = max(type_width, len(i[1]))
 
-    code = "static %(type)s %(name)s =\n{\n" % {
-        "type": structtypename, "name": name
+    code = "%(static)s%(type)s %(name)s =\n{\n" % {
+        "static": "static " if static else "", "type": structtypename, "name": name
     }
     if first_line:
         code += INDENT + first_line + "\n"
+    version = None
     for i in struct_table:
+        if _version_condition(i) != version:
+            if version:
+                code += "#endif\n"
+            version = _version_condition(i)
+            if version:
+                code += "#if %s\n" % version
         cast = "static"
         # return type of cppy's 'new' function is the class struct, not PyObject
         if i[0] == "tp_new":
@@ -238,6 +364,8 @@ def render_struct(structtypename, struct_table, name, dictionary, first_line="")
         if not i == struct_table[-1]:
             code += ","
         code += "\n"
+    if version:
+        code += "#endif\n"
     code += "}; /* %s */\n" % name
     return code
 
@@ -257,6 +385,99 @@ class Renderer:
         self.h_footer=""
         self.cpp_header=""
         self.cpp_footer=""
+        # first line of the generated files, "date", "hash" or None
+        # anything but "date" creates the same output for the same input
+        self.stamp = "date"
+        # split the .h file into a types and an api header, see render_types_hpp()
+        self.split_header = False
+
+    def __str__(self):
+        return "Renderer(%s)" % self.context.name
+
+    @property
+    def fastcall(self):
+        """
+        If True, functions with more than one argument are called with METH_FASTCALL
+        and classes are constructed with vectorcall (python >= 3.9).
+        Requires python >= 3.7, see Function.local_template_tags() for accessing the arguments
+        """
+        return self.context.fastcall
+
+    @fastcall.setter
+    def fastcall(self, value):
+        self.context.fastcall = bool(value)
+        self.context.invalidate()
+
+    @property
+    def multiphase(self):
+        """
+        If True, the module uses multi-phase initialization with Py_mod_exec and a module state,
+        which contains the members from the module's _CPP_(STATE) and a heap type for each class.
+        Function bodies reach the state with the template tag $STATE() or $STATE(object).
+        The interned strings of $STR(name) are members of the state as well.
+        Each (sub-)interpreter then gets it's own module and types. Freelists are not used.
+        Requires python >= 3.11
+        """
+        return self.context.multiphase
+
+    @multiphase.setter
+    def multiphase(self, value):
+        self.context.multiphase = bool(value)
+        self.context.invalidate()
+
+    @property
+    def profile(self):
+        """
+        If True, each function, slot, getter and setter counts it's calls and measures
+        the time spent in it with std::chrono::steady_clock. The statistics are returned
+        by the module function cppy_profile_stats(reset=False) as list of tuples
+        (name, src_pos, calls, seconds). The counters are atomic, so calls without the GIL in free-threaded
+        builds are counted as well. They are shared by all instances of the module,
+        so with multi-phase initialization the module does not support a per-interpreter GIL.
+        If False, no profiling code is generated at all
+        """
+        return self.context.profile
+
+    @profile.setter
+    def profile(self, value):
+        self.context.profile = bool(value)
+        self.context.invalidate()
+
+    @property
+    def shards(self):
+        """
+        Number of .cpp files the classes and module functions are split into, so they can
+        be compiled in parallel. The default 0 renders everything into the single file of render_cpp().
+        Otherwise render_cpp() returns the root file with the module definition and initialization,
+        render_shards() the shards and render_private_hpp() the header included by all of them.
+        Each class is rendered into one shard, the module functions into the last one.
+        Note that the module's _CPP_ declarations are compiled in every file,
+        so they may only contain declarations, inline and static functions
+        """
+        return self.context.shards
+
+    @shards.setter
+    def shards(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError("Invalid number of shards %d" % value)
+        self.context.shards = value
+        self.context.invalidate()
+
+    @property
+    def private_hpp_name(self):
+        """Filename of the header included by the root file and the shards, see Renderer.shards"""
+        return "%s_private.h" % self.context.name
+
+    @property
+    def types_hpp_name(self):
+        """Filename of the header with the type definitions, see Renderer.split_header"""
+        return "%s_types.h" % self.context.name
+
+    @property
+    def api_hpp_name(self):
+        """Filename of the header with the api functions, see Renderer.split_header"""
+        return "%s_api.h" % self.context.name
 
     @property
     def classes(self):
@@ -266,15 +487,79 @@ class Renderer:
     def functions(self):
         return self.context.functions
 
+    def use_cache(self, directory=".cppy_cache"):
+        """
+        Reuses the rendered code of all unchanged objects from previous runs.
+        Call save_cache() after rendering.
+        :param directory: str, path of the cache files
+        :return: cache.RenderCache
+        """
+        from .cache import RenderCache
+        self.context.cache = RenderCache(directory, self.context.name)
+        return self.context.cache
+
+    def save_cache(self):
+        if self.context.cache:
+            self.context.cache.save()
+
     @classmethod
     def write_to_file(self, filename, code):
-        import codecs
-        with codecs.open(filename, "w", "utf-8") as file:
+        """
+        Writes the code to the file, unless the file already contains exactly this code,
+        so build systems do not see a change
+        :return: bool, True if the file was written
+        """
+        import codecs, os
+        try:
+            with codecs.open(filename, "r", "utf-8") as file:
+                if file.read() == code:
+                    return False
+        except (OSError, ValueError):
+            pass
+        # write to a temporary file and rename, so the file is never half-written
+        tmp = filename + ".tmp"
+        with codecs.open(tmp, "w", "utf-8") as file:
             file.write(code)
+        os.replace(tmp, filename)
+        return True
 
+    def _apply_stamp(self, code):
+        """
+        Replaces the %(stamp)s tag in the rendered code, see Renderer.stamp
+        :return: str
+        """
+        if self.stamp == "date":
+            import datetime
+            stamp = "generated by cppy on %s" % datetime.datetime.now()
+        elif self.stamp == "hash":
+            import hashlib
+            stamp = "generated by cppy, content hash %s" % hashlib.sha1(code.encode("utf-8")).hexdigest()
+        elif not self.stamp:
+            stamp = "generated by cppy"
+        else:
+            raise ValueError("Unknown stamp '%s', expected 'date', 'hash' or None" % self.stamp)
+        return code.replace("%(stamp)s", stamp, 1)
+
+    @profiled
     def render_hpp(self):
+        if self.split_header:
+            code = """
+            /* %(stamp)s */
+
+            #include "%(types)s"
+            #include "%(api)s"
+
+            %(footer)s
+            """
+            code = apply_string_dict(change_text_indent(code, 0), {
+                "types": self.types_hpp_name,
+                "api": self.api_hpp_name,
+                "footer": self.context.format_cpp(self.h_footer, None),
+            })
+            return self._apply_stamp(collapse_newlines(code) + "\n")
+
         code = """
-        /* generated by cppy on %(date)s */
+        /* %(stamp)s */
 
         #include <python3.4/Python.h>
         %(header)s
@@ -303,39 +588,119 @@ class Renderer:
         #for i in self.classes:
         #    init_types += "bool initialize_class_%s(void* pyObject_module);\n" % i.name
 
-        import datetime
         code = apply_string_dict(code, {
             "name": self.context.name,
-            "header": self.h_header,
-            "footer": self.h_footer,
+            "header": self._render_hpp_includes() + self.context.format_cpp(self.h_header, None),
+            "footer": self.context.format_cpp(self.h_footer, None),
             "user": self.context.cpp("HEADER"),
-            "date": str(datetime.datetime.now()),
             "init_types": init_types,
             "forwards": self._render_hpp_forwards(),
             "impl": self._render_hpp_impl(),
             "namespace_open": self._render_namespace_open(),
             "namespace_close": self._render_namespace_close(),
         })
-        return self.context.format_cpp(code, None)
+        # all parts are formatted already
+        return self._apply_stamp(collapse_newlines(code))
+
+    @profiled
+    def render_types_hpp(self):
+        """
+        Renders the header with the python includes, the module's _CPP_(HEADER)
+        and the definitions of the class structs, used when Renderer.split_header is True.
+        It only changes with the members of the classes, so it is suitable
+        as precompiled header, given a Renderer.stamp other than "date".
+        render_hpp() then includes this and the header of render_api_hpp()
+        :return: str
+        """
+        code = """
+        /* %(stamp)s */
+
+        /* types of module %(name)s, see %(api)s for the functions */
+        #pragma once
+
+        #include <python3.4/Python.h>
+        %(header)s
+
+        %(user)s
+
+        %(namespace_open)s
+
+        extern "C" {
+            %(forwards)s
+
+            %(impl)s
+        } // extern "C"
+
+        %(namespace_close)s
+        """
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "name": self.context.name,
+            "api": self.api_hpp_name,
+            "header": self._render_hpp_includes() + self.context.format_cpp(self.h_header, None),
+            "user": self.context.cpp("HEADER"),
+            "forwards": "".join("struct %s;\n" % i.class_struct_name for i in self.classes),
+            "impl": self._render_hpp_impl(),
+            "namespace_open": self._render_namespace_open(),
+            "namespace_close": self._render_namespace_close(),
+        })
+        return self._apply_stamp(collapse_newlines(code) + "\n")
 
+    @profiled
+    def render_api_hpp(self):
+        """
+        Renders the header with initialize_module_<name>() and the create, destroy, copy and is functions
+        of the classes, used when Renderer.split_header is True. It does not include Python.h,
+        so it is cheap to include for code that only registers the module or passes instances around
+        :return: str
+        """
+        code = """
+        /* %(stamp)s */
 
+        /* api of module %(name)s, see %(types)s for the types */
+        #pragma once
+
+        /* declared as in Python.h */
+        %(typedefs)s
+
+        %(namespace_open)s
+
+        /* Call this before Py_Initialize() */
+        bool initialize_module_%(name)s();
+
+        extern "C" {
+            %(forwards)s
+        } // extern "C"
+
+        %(namespace_close)s
+        """
+        typedefs = "typedef struct _object PyObject;\n"
+        if self.multiphase:
+            typedefs += "typedef struct _typeobject PyTypeObject;\n"
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "name": self.context.name,
+            "types": self.types_hpp_name,
+            "typedefs": typedefs,
+            "forwards": self._render_hpp_forwards(),
+            "namespace_open": self._render_namespace_open(),
+            "namespace_close": self._render_namespace_close(),
+        })
+        return self._apply_stamp(collapse_newlines(code) + "\n")
+
+
+    @profiled
     def render_cpp(self):
+        if self.shards:
+            return self._render_root_cpp()
+
         code = """
-        /* generated by cppy on %(date)s */
+        /* %(stamp)s */
 
-        #include <python3.4/Python.h>
+        %(python_include)s
         #include <python3.4/structmember.h>
 
         #include "%(module_name)s.h"
 
-        #ifndef CPPY_ERROR
-        #   include <iostream>
-        #   define CPPY_ERROR(arg__) { std::cerr << arg__ << std::endl; }
-        #endif
-
-        #ifndef CPPY_UNUSED
-        #   define CPPY_UNUSED(arg__) (void)arg__
-        #endif
+        %(macros)s
 
         /* compatibility checks */
         %(static_asserts)s
@@ -347,7 +712,7 @@ class Renderer:
             %(forwards)s
         } // extern "C"
 
-        %(namespace_close)s
+        %(forwards_close)s
 
         /* declarations from configuration */
         %(header)s
@@ -360,100 +725,666 @@ class Renderer:
         """
         code = change_text_indent(code, 0)
 
-        import datetime
         code = apply_string_dict(code, {
-            "date": str(datetime.datetime.now()),
             "module_name": self.context.name,
+            "python_include": self._render_python_include(),
+            "macros": self._render_macros(),
             "static_asserts" : self._render_static_asserts(),
             "header": self.context.format_cpp(self.cpp_header, None),
             "decl": self.context.format_cpp(self.context.cpp() or self.context.cpp("DEF"), None),
-            "forwards": self._render_cpp_forwards(),
+            "forwards": join_code((self._render_strings_decl(), self._render_cpp_forwards()), "\n\n"),
+            "forwards_close": join_code((self._render_namespace_close(), self._render_profile_decl()), "\n\n"),
             "namespace_open": self._render_namespace_open(),
             "namespace_close": self._render_namespace_close(),
         })
 
+        code = [code]
+        if self.multiphase:
+            code.append("\n\n/* #################### module state ##################### */\n\n")
+            code.append(self._render_state_struct() + "\n")
+        else:
+            self._check_state()
+        code += self._render_python_api(self.classes, self.functions or self.profile)
+        code += self._render_module()
+        return self._apply_stamp("".join(code))
+
+    def render_shards(self):
+        """
+        Renders the .cpp files with the classes and module functions, see Renderer.shards
+        :return: list of str, the code of each shard, can be less than Renderer.shards
+        """
+        if not self.shards:
+            raise ValueError("Renderer.shards is not set for module %s" % self.context.name)
+        groups = self._get_shard_groups()
+        return [self._render_shard(i, len(groups), g) for i, g in enumerate(groups)]
+
+    @profiled
+    def render_private_hpp(self):
+        """
+        Renders the header that is included by the root .cpp file and all shards, see Renderer.shards.
+        It declares everything the files share, the module state, the type structs,
+        the interned strings and the call profiling table
+        :return: str
+        """
+        if not self.shards:
+            raise ValueError("Renderer.shards is not set for module %s" % self.context.name)
+        code = """
+        /* %(stamp)s */
+
+        /* declarations shared by %(module_name)s.cpp and it's shards */
+
+        %(python_include)s
+        #include <python3.4/structmember.h>
+
+        #include "%(module_name)s.h"
+
+        %(macros)s
+
+        /* compatibility checks */
+        %(static_asserts)s
+
+        %(private_decl)s
+
+        %(namespace_open)s
+
+        /* forwards */
+        extern "C" {
+            %(forwards)s
+        } // extern "C"
+
+        %(init_decl)s
+
+        %(namespace_close)s
+
+        /* declarations from configuration */
+        %(header)s
+
+        /* user declarations */
+        %(decl)s
+
+        %(state)s
+        """
+        code = change_text_indent(code, 0)
+
+        forwards = self._render_cpp_forwards()
+        if self.functions or self.profile:
+            forwards = join_code((forwards, "extern PyMethodDef %s[];" % self.context.method_struct_name))
+        init_decl = ""
         if self.classes:
+            init_decl = "/* defined in the shard of each class */\n"
             for i in self.classes:
-                code += "\n\n/* #################### class %s ##################### */\n\n" % i.name
-                code += i.render_python_api()
+                init_decl += "bool initialize_class_%s(void* vmodule);\n" % i.name
+        state = ""
+        if self.multiphase:
+            state = join_code((self._render_namespace_open(), self._render_state_struct(),
+                               self._render_namespace_close()), "\n\n")
+        else:
+            self._check_state()
+
+        code = apply_string_dict(code, {
+            "module_name": self.context.name,
+            "python_include": self._render_python_include(),
+            "macros": self._render_macros(),
+            "static_asserts": self._render_static_asserts(),
+            "private_decl": self._render_private_decl(),
+            "header": self.context.format_cpp(self.cpp_header, None),
+            "decl": self.context.format_cpp(self.context.cpp() or self.context.cpp("DEF"), None),
+            "forwards": forwards,
+            "init_decl": self.context.format_cpp(init_decl, None),
+            "namespace_open": self._render_namespace_open(),
+            "namespace_close": self._render_namespace_close(),
+            "state": state,
+        })
+        return self._apply_stamp(collapse_newlines(code) + "\n")
+
+    @profiled
+    def _render_root_cpp(self):
+        """The .cpp file with the module definition and initialization, see Renderer.shards"""
+        code = """
+        /* %(stamp)s */
+
+        /* module definition and initialization, the classes and functions are rendered into the shards */
+
+        %(private_include)s
+
+        %(private_defs)s
+
+        %(namespace_open)s
+        """
+        code = change_text_indent(code, 0)
+        code = apply_string_dict(code, {
+            "private_include": self._render_private_include(),
+            "private_defs": self._render_private_defs(),
+            "namespace_open": self._render_namespace_open(),
+        })
+        return self._apply_stamp("".join([code] + self._render_module()))
 
-        if self.functions:
-            code += "\n\n/* #################### global functions ##################### */\n\n"
-            code += 'extern "C" {\n'
+    @profiled
+    def _render_shard(self, index, count, units):
+        """
+        Renders one shard
+        :param units: list of Class instances and None for the module functions, see _get_shard_groups()
+        :return: str
+        """
+        classes = [i for i in units if i is not None]
+        contents = []
+        if classes:
+            contents.append("classes %s" % ", ".join(i.name for i in classes))
+        if None in units:
+            contents.append("module functions")
+        code = "/* %%(stamp)s */\n\n/* shard %d of %d of module %s: %s */\n\n%s\n\n" % (
+            index + 1, count, self.context.name, " and ".join(contents), self._render_private_include())
+        code = [code + self._render_namespace_open()]
+        code += self._render_python_api(classes, None in units)
+        code.append("\n" + self._render_namespace_close())
+        return self._apply_stamp("".join(code))
+
+    def _get_shard_groups(self):
+        """
+        Splits the classes and the module functions into at most Renderer.shards groups
+        of about the same number of functions and properties, keeping the order of the classes
+        :return: list of lists of Class instances and None for the module functions
+        """
+        units = [(i, 1 + len(i.functions) + len(i.properties)) for i in self.classes]
+        if self.functions or self.profile:
+            units.append((None, 1 + len(self.functions)))
+        count = min(self.shards, len(units))
+        remaining = sum(i[1] for i in units)
+        groups = []
+        for k, (unit, w) in enumerate(units):
+            # start the next group when this one is full or each remaining group needs one of the units
+            if not groups or len(groups) < count \
+                    and (weight + w / 2 > target or len(units) - k <= count - len(groups)):
+                groups.append([])
+                target = remaining / (count - len(groups) + 1)
+                weight = 0
+            groups[-1].append(unit)
+            weight += w
+            remaining -= w
+        return groups
+
+    def _render_python_include(self):
+        """
+        With Renderer.split_header, the .cpp files include the types header first,
+        so it can be used as precompiled header
+        """
+        if self.split_header:
+            return '#include "%s"' % self.types_hpp_name
+        return "#include <python3.4/Python.h>"
+
+    def _render_private_include(self):
+        code = '#include "%s"' % self.private_hpp_name
+        if self.split_header:
+            code = '#include "%s"\n%s' % (self.types_hpp_name, code)
+        return code
+
+    def _check_state(self):
+        if self.context.has_cpp("STATE") or self.context.has_cpp("TRAVERSE"):
+            raise ValueError("_CPP_(STATE) and _CPP_(TRAVERSE) of module %s require multi-phase initialization, "
+                             "see Renderer.multiphase" % self.context.name)
+
+    def _render_python_api(self, classes, functions):
+        """
+        Renders the python api of the classes and optionally of the module functions
+        :param functions: bool, render the module functions, the profiling statistics and the method struct
+        :return: list of str
+        """
+        code = []
+        for i in classes:
+            code.append("\n\n/* #################### class %s ##################### */\n\n" % i.name)
+            code.append(i.render_part("python_api"))
+
+        if functions:
+            code.append("\n\n/* #################### global functions ##################### */\n\n")
+            code.append('extern "C" {\n')
             for i in self.functions:
-                code += "\n" + i.render_python_api()
-            code += "\n" + self._render_method_struct()
-            code += '} // extern "C"\n'
+                code.append("\n" + i.render_part("python_api"))
+            if self.profile:
+                code.append("\n" + self._render_profile_stats())
+            code.append("\n" + self._render_method_struct())
+            code.append('} // extern "C"\n')
+        return code
 
+    def _render_module(self):
+        """
+        Renders the module implementation, definition and initialization and the end of the .cpp file
+        :return: list of str
+        """
+        code = []
         if self.context.has_cpp("IMPL"):
-            code += "\n" + self.context.format_cpp(self.context.cpp("IMPL")) + "\n"
+            code.append("\n" + self.context.format_cpp(self.context.cpp("IMPL")) + "\n")
 
         decl = self._render_module_def()
         c = self._render_impl_decl()
         if c:
             decl += "\n/* ##### c-api wrapper implementation ##### */\n" + c
-        code += apply_string_dict('\nextern "C" {\n' + INDENT + '%(decl)s\n} // extern "C"\n',
-                                  { "decl": decl })
+        code.append(apply_string_dict('\nextern "C" {\n' + INDENT + '%(decl)s\n} // extern "C"\n',
+                                      { "decl": decl }))
 
-        code += "\n" + self._render_module_init()
-        code += "\n" + self._render_namespace_close()
-        code += "\n/* footer from configuration */\n" + self.cpp_footer
+        code.append("\n" + self._render_module_init())
+        code.append("\n" + self._render_namespace_close())
+        code.append("\n/* footer from configuration */\n" + self.cpp_footer)
         return code
 
+    @profiled
+    def _render_macros(self):
+        code = """
+        #ifndef CPPY_ERROR
+        #   include <iostream>
+        #   define CPPY_ERROR(arg__) { std::cerr << arg__ << std::endl; }
+        #endif
+
+        #ifndef CPPY_UNUSED
+        #   define CPPY_UNUSED(arg__) (void)arg__
+        #endif
+        """
+        return change_text_indent(strip_newlines(code), 0)
 
+    @profiled
     def _render_static_asserts(self):
         code = "#include <type_traits>\n"
         for functype in FUNCTIONS:
-            params = FUNCTIONS[functype]
-            parstr = params[1][0]
-            for j in range(1, len(params[1])):
-                parstr += ", %s" % params[1][j]
-            typedef = "%(ret)s(*)(%(params)s)" % { "ret": params[0], "params": parstr }
-            code += 'static_assert(std::is_same<%s,\n    %s>::value, "cppy/python api mismatch");\n' % (functype, typedef)
+            if functype in FUNCTIONS_UNTIL:
+                code += "#if PY_VERSION_HEX < %s\n%s#endif\n" % (
+                    FUNCTIONS_UNTIL[functype], self._render_static_assert(functype))
+            else:
+                code += self._render_static_assert(functype)
+        if self.fastcall:
+            code += 'static_assert(PY_VERSION_HEX >= 0x03070000, "cppy fastcall mode requires python 3.7");\n'
+            for functype in FASTCALL_FUNCTIONS:
+                if functype == "vectorcallfunc":
+                    code += "#if PY_VERSION_HEX >= 0x03090000\n%s#endif\n" % self._render_static_assert(functype)
+                else:
+                    code += self._render_static_assert(functype)
+        if self.multiphase:
+            code += 'static_assert(PY_VERSION_HEX >= 0x030B0000, "cppy multi-phase mode requires python 3.11");\n'
         return self.context.format_cpp(code, None)
 
-    def _render_hpp_forwards(self):
+    @profiled
+    def _render_static_assert(self, functype):
+        params = get_function_type(functype)
+        parstr = params[1][0]
+        for j in range(1, len(params[1])):
+            parstr += ", %s" % params[1][j]
+        typedef = "%(ret)s(*)(%(params)s)" % { "ret": params[0], "params": parstr }
+        return 'static_assert(std::is_same<%s,\n    %s>::value, "cppy/python api mismatch");\n' % (functype, typedef)
+
+    @profiled
+    def _render_hpp_includes(self):
         code = ""
-        for i in self.context.all_objects:
-            code += "\n\n" + i.render_header_forwards()
-        return self.context.format_cpp(code, None) + "\n"
+        if any(i.get_members() for i in self.classes):
+            # placement-new of the c++ members
+            code += "#include <new>\n"
+        return code
+
+    @profiled
+    def _render_hpp_forwards(self):
+        return join_code((i.render_part("header_forwards") for i in self.context.all_objects), "\n\n") + "\n"
 
+    @profiled
     def _render_hpp_impl(self):
-        code = ""
-        for i in self.context.all_objects:
-            code += "\n\n" + i.render_header_impl()
-        return self.context.format_cpp(code, None) + "\n"
+        return join_code((i.render_part("header_impl") for i in self.context.all_objects), "\n\n") + "\n"
 
+    @profiled
     def _render_cpp_forwards(self):
-        code = ""
-        for i in self.context.all_objects:
-            code += "\n" + i.render_forwards()
+        return join_code(i.render_part("forwards") for i in self.context.all_objects)
+
+    @profiled
+    def _render_strings_decl(self):
+        # with multi-phase initialization the strings are members of the module state
+        if not self.context.strings or self.multiphase:
+            return ""
+        code = "/* interned strings, see template tag STR(name) */\n"
+        for i in self.context.strings:
+            code += "static PyObject* %s = nullptr;\n" % string_var_name(i)
         return self.context.format_cpp(code, None)
 
-    def _render_impl_decl(self):
-        code = ""
-        for i in self.context.all_objects:
-            code += "\n" + i.render_impl()
+    @profiled
+    def _render_strings_funcs(self):
+        """
+        Creation and release of the interned strings, called by module init and teardown.
+        With multi-phase initialization, the module's exec function creates them instead, see _render_module_exec()
+        """
+        code = "/* interned strings */\nstatic void cppy_release_strings_%s()\n{\n" % self.context.name
+        for i in self.context.strings:
+            code += INDENT + "Py_CLEAR(%s);\n" % string_var_name(i)
+        code += "}\n\nstatic bool cppy_create_strings_%s()\n{\n" % self.context.name
+        for i in self.context.strings:
+            code += INDENT + "%s = PyUnicode_InternFromString(\"%s\");\n" % (string_var_name(i), i)
+            code += INDENT + "if (!%s)\n" % string_var_name(i)
+            code += INDENT + "{\n" + INDENT*2 + "cppy_release_strings_%s();\n" % self.context.name
+            code += INDENT*2 + "return false;\n" + INDENT + "}\n"
+        code += INDENT + "return true;\n}\n\n"
+        return code
+
+    @profiled
+    def _render_profile_decl(self):
+        """The counters of the call profiling, see Renderer.profile"""
+        if not self.profile:
+            return ""
+        code = """
+        /* call profiling, see Renderer.profile */
+        #include <atomic>
+        #include <chrono>
+
+        namespace {
+            %(types)s
+
+            %(table)s
+        } // namespace
+        """
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "types": self._render_profile_types(),
+            "table": self._render_profile_table(),
+        })
         return self.context.format_cpp(code, None)
 
+    def _render_profile_types(self):
+        code = """
+        /** The counters are atomic, as wrappers run in parallel without the GIL (Py_GIL_DISABLED) */
+        struct cppy_profile_entry
+        {
+            const char* name;
+            const char* src_pos;
+            std::atomic<unsigned long long> calls;
+            // ticks of std::chrono::steady_clock
+            std::atomic<std::chrono::steady_clock::rep> time;
+        };
+
+        /** Counts the call and adds the time until the end of the scope to the entry */
+        struct cppy_profile_scope
+        {
+            cppy_profile_entry& entry;
+            std::chrono::steady_clock::time_point start;
+            cppy_profile_scope(cppy_profile_entry& e)
+                : entry(e), start(std::chrono::steady_clock::now()) { }
+            ~cppy_profile_scope()
+            {
+                entry.calls.fetch_add(1, std::memory_order_relaxed);
+                entry.time.fetch_add((std::chrono::steady_clock::now() - start).count(), std::memory_order_relaxed);
+            }
+        };
+        """
+        return change_text_indent(strip_newlines(code), 0)
+
+    def _render_profile_table(self):
+        code = """
+        cppy_profile_entry %(table)s[] =
+        {
+            %(entries)s
+        };
+        """
+        entries = ""
+        for name, src_pos in self.context.profile_entries:
+            entries += '{ "%s", "%s", {0}, {0} },\n' % (to_c_string(name), to_c_string(src_pos))
+        entries += "{ nullptr, nullptr, {0}, {0} }"
+        return apply_string_dict(change_text_indent(strip_newlines(code), 0), {
+            "table": self.context.profile_table_name,
+            "entries": entries,
+        })
+
+    @profiled
+    def _render_private_decl(self):
+        """
+        Declares the interned strings and the call profiling table in the module's private namespace,
+        see Renderer.shards. They are defined by _render_private_defs() in the root .cpp file
+        """
+        decl = []
+        if self.context.strings and not self.multiphase:
+            decl.append("/* interned strings, see template tag STR(name) */\n"
+                        + "".join("extern PyObject* %s;\n" % string_var_name(i) for i in self.context.strings))
+        if self.profile:
+            decl.append("/* call profiling, see Renderer.profile */\n" + self._render_profile_types())
+            decl.append("extern cppy_profile_entry %s[];" % self.context.profile_table_name)
+        if not decl:
+            return ""
+        code = """
+        %(include)s
+        namespace %(namespace)s {
+            %(decl)s
+        } // namespace %(namespace)s
+
+        using namespace %(namespace)s;
+        """
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "include": "#include <atomic>\n#include <chrono>\n" if self.profile else "",
+            "namespace": self.context.private_namespace,
+            "decl": join_code(decl, "\n\n"),
+        })
+        return self.context.format_cpp(code, None)
+
+    @profiled
+    def _render_private_defs(self):
+        """Defines the data declared by _render_private_decl()"""
+        defs = []
+        if self.context.strings and not self.multiphase:
+            defs.append("".join("PyObject* %s = nullptr;\n" % string_var_name(i) for i in self.context.strings))
+        if self.profile:
+            defs.append(self._render_profile_table())
+        if not defs:
+            return ""
+        code = """
+        namespace %(namespace)s {
+            %(defs)s
+        } // namespace %(namespace)s
+        """
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "namespace": self.context.private_namespace,
+            "defs": join_code(defs, "\n\n"),
+        })
+        return self.context.format_cpp(code, None)
+
+    @profiled
+    def _render_profile_stats(self):
+        """The module function returning the call profiling table, see Renderer.profile"""
+        name = "cppy_module_profile_stats_%s" % self.context.name
+        body = """
+        int reset = 0;
+        if (!PyArg_ParseTuple(arg1, "|p", &reset))
+            return NULL;
+        PyObject* list = PyList_New(0);
+        if (!list)
+            return NULL;
+        for (cppy_profile_entry* e = %(table)s; e->name; ++e)
+        {
+            std::chrono::steady_clock::duration time(e->time.load(std::memory_order_relaxed));
+            PyObject* item = Py_BuildValue("(ssKd)", e->name, e->src_pos, e->calls.load(std::memory_order_relaxed),
+                                           std::chrono::duration<double>(time).count());
+            if (!item || 0 != PyList_Append(list, item))
+            {
+                Py_XDECREF(item);
+                Py_DECREF(list);
+                return NULL;
+            }
+            Py_DECREF(item);
+        }
+        if (reset)
+        {
+            for (cppy_profile_entry* e = %(table)s; e->name; ++e)
+            {
+                e->calls.store(0, std::memory_order_relaxed);
+                e->time.store(0, std::memory_order_relaxed);
+            }
+        }
+        return list;
+        """ % { "table": self.context.profile_table_name }
+        code = "/* call profiling statistics */\n"
+        code += 'static const char* %s_doc = "%s";\n' % (name, to_c_string(
+            "cppy_profile_stats(reset=False) -> list\n"
+            "Returns a tuple (name, src_pos, calls, seconds) for each wrapped function, getter and setter.\n"
+            "If reset is True, the counters are set to zero afterwards"))
+        code += render_function(name, "binaryfunc", change_text_indent(body, 0))
+        return self.context.format_cpp(code, None)
+
+    @profiled
+    def _render_impl_decl(self):
+        return join_code(i.render_part("impl") for i in self.context.all_objects)
+
+    @profiled
     def _render_namespace_open(self):
         code = ""
         for i in self.namespaces:
             code += "namespace %s {\n" % i
         return self.context.format_cpp(code, None)
 
+    @profiled
     def _render_namespace_close(self):
         code = ""
         for i in reversed(self.namespaces):
             code += "} // namespace %s\n" % i
         return self.context.format_cpp(code, None)
 
+    @profiled
+    def _render_state_struct(self):
+        """Renders the struct of the module state and the declaration of the function to get it"""
+        members = self.context.cpp("STATE")
+        if members:
+            members += "\n"
+        if self.classes:
+            members += "/* heap types, see initialize_class_<Class>() */\n"
+        for i in self.classes:
+            members += "PyTypeObject* %s;\n" % i.state_type_name
+            if i.has_iterator():
+                members += "PyTypeObject* %s;\n" % i.iterator_state_type_name
+        if self.context.strings:
+            members += "/* interned strings, see template tag STR(name) */\n"
+        for i in self.context.strings:
+            members += "PyObject* %s;\n" % string_var_name(i)
+        code = """
+        extern "C" {
+            /* state of each module instance, see _CPP_(STATE) */
+            struct %(struct_name)s
+            {
+                %(members)s
+            };
+
+            /** Returns the state of the module 'arg', or of the module of the instance or the type 'arg',
+                or NULL if 'arg' does not belong to the module */
+            %(state_func)s
+        } // extern "C"
+        """
+        code = apply_string_dict(change_text_indent(code, 0), {
+            "struct_name": self.context.state_struct_name,
+            "state_func": "%s%s* %s(PyObject* arg);" % (
+                "" if self.shards else "static ", self.context.state_struct_name, self.context.state_func_name),
+            "members": strip_newlines(members) or "char unused;",
+        })
+        return self.context.format_cpp(code, None)
+
+    @profiled
+    def _render_state_getter(self):
+        """Renders the function to get the module state, see _render_state_struct()"""
+        code = """
+        %(static)s%(struct_name)s* %(state_func)s(PyObject* arg)
+        {
+            if (!arg)
+                return nullptr;
+            PyObject* module = arg;
+            if (PyModule_Check(arg))
+            {
+                if (PyModule_GetDef(arg) != &%(module_def)s)
+                    return nullptr;
+            }
+            else
+            {
+                PyTypeObject* type = PyType_Check(arg) ? reinterpret_cast<PyTypeObject*>(arg) : Py_TYPE(arg);
+                module = PyType_GetModuleByDef(type, &%(module_def)s);
+                if (!module)
+                {
+                    PyErr_Clear();
+                    return nullptr;
+                }
+            }
+            return reinterpret_cast<%(struct_name)s*>(PyModule_GetState(module));
+        }
+        """
+        return change_text_indent(code, 0) % {
+            "static": "" if self.shards else "static ",
+            "struct_name": self.context.state_struct_name,
+            "state_func": self.context.state_func_name,
+            "module_def": self.context.struct_name,
+        }
+
+    @profiled
+    def _render_state_funcs(self):
+        """
+        Renders the traverse and clear functions of the module state
+        for the heap types and the members from the module's _CPP_(TRAVERSE).
+        The interned strings are only cleared, they can not be part of a cycle
+        """
+        members = []
+        for i in self.classes:
+            members.append(i.state_type_name)
+            if i.has_iterator():
+                members.append(i.iterator_state_type_name)
+        members += self.context.get_traverse_members()
+
+        get_state = "auto state = reinterpret_cast<%s*>(PyModule_GetState(arg0));\n" \
+                    "if (!state)\n%sreturn 0;\n" % (self.context.state_struct_name, INDENT)
+        visit = get_state + "visitproc visit = arg1;\nvoid* arg = arg2;\n"
+        clear = get_state
+        for name in members:
+            visit += "Py_VISIT(state->%s);\n" % name
+            clear += "Py_CLEAR(state->%s);\n" % name
+        for i in self.context.strings:
+            clear += "Py_CLEAR(state->%s);\n" % string_var_name(i)
+        code = render_function("cppy_module_traverse_%s" % self.context.name, "traverseproc", visit + "return 0;")
+        code += render_function("cppy_module_clear_%s" % self.context.name, "inquiry", clear + "return 0;")
+        return code
+
+    @profiled
+    def _render_module_exec(self):
+        """Renders the Py_mod_exec function and the slots of multi-phase initialization"""
+        body = ""
+        if self.context.strings:
+            # released by the module's clear function, see _render_state_funcs()
+            body += "// the interned strings of this module instance\n"
+            body += "auto state = reinterpret_cast<%s*>(PyModule_GetState(arg0));\n" % self.context.state_struct_name
+            for i in self.context.strings:
+                body += "state->%s = PyUnicode_InternFromString(\"%s\");\n" % (string_var_name(i), i)
+                body += "if (!state->%s)\n%sreturn -1;\n" % (string_var_name(i), INDENT)
+        if self.classes:
+            body += "// add the classes, base classes first\n"
+            for i in self._classes_bases_first():
+                body += "if (!initialize_class_%s(arg0))\n%sreturn -1;\n" % (i.name, INDENT)
+        code = "/* multi-phase initialization */\n"
+        code += render_function("cppy_module_exec_%s" % self.context.name, "inquiry", body + "return 0;")
+        # the call profiling table is shared by all interpreters
+        gil = "Py_MOD_MULTIPLE_INTERPRETERS_SUPPORTED" if self.profile \
+              else "Py_MOD_PER_INTERPRETER_GIL_SUPPORTED"
+        slots = """
+        static PyModuleDef_Slot cppy_module_slots_%(name)s[] =
+        {
+            { Py_mod_exec, (void*)cppy_module_exec_%(name)s },
+        #if PY_VERSION_HEX >= 0x030C0000
+            { Py_mod_multiple_interpreters, %(gil)s },
+        #endif
+            { 0, NULL }
+        };
+        """ % { "name": self.context.name, "gil": gil }
+        return code + change_text_indent(strip_newlines(slots), 0) + "\n\n"
+
+    def _classes_bases_first(self):
+        """Returns the classes, each after it's base classes"""
+        classes = []
+        def add(c):
+            if c not in classes:
+                for i in c.bases:
+                    add(i)
+                classes.append(c)
+        for i in self.classes:
+            add(i)
+        return classes
+
+    @profiled
     def _render_module_init(self):
+        if self.multiphase:
+            return self._render_multiphase_module_init()
         code = """
         namespace {
             PyMODINIT_FUNC create_module_%(name)s_func()
             {
-                auto module = PyModule_Create(&%(module_def)s);
+                %(create_module)s
                 if (!module)
                     return nullptr;
 
@@ -477,14 +1408,43 @@ class Renderer:
             for i in self.classes:
                 init_calls += "initialize_class_%s(module);\n" % i.name
 
+        # the interned strings are created before the module
+        create_module = "auto module = PyModule_Create(&%s);" % self.context.struct_name
+        if self.context.strings:
+            create_module = "if (!cppy_create_strings_%s())\n    return nullptr;\n%s" % (
+                self.context.name, create_module)
+
         code = apply_string_dict(code, {
             "name": self.context.name,
-            "module_def": self.context.struct_name,
+            "create_module": create_module,
             "init_calls": init_calls
         })
 
         return self.context.format_cpp(code, None)
 
+    @profiled
+    def _render_multiphase_module_init(self):
+        code = """
+        namespace {
+            PyMODINIT_FUNC create_module_%(name)s_func()
+            {
+                return PyModuleDef_Init(&%(module_def)s);
+            }
+        } // namespace
+
+        bool initialize_module_%(name)s()
+        {
+            PyImport_AppendInittab("%(name)s", create_module_%(name)s_func);
+            return true;
+        }
+        """
+        code = change_text_indent(code, 0) % {
+            "name": self.context.name,
+            "module_def": self.context.struct_name,
+        }
+        return self.context.format_cpp(code, None)
+
+    @profiled
     def _render_module_def(self):
         dic = { "name": self.context.name,
                 "m_name": '"%s"' % self.context.name,
@@ -493,17 +1453,48 @@ class Renderer:
                 "m_methods" : "nullptr",
                 "m_size": "-1",
                 "doc": to_c_string(self.context.doc) }
-        if len(self.functions):
+        if len(self.functions) or self.profile:
             dic.update({ "m_methods": "static_cast<PyMethodDef*>(%s)" % self.context.method_struct_name})
 
-        code = """/* module definition for '%(name)s' */\nstatic const char* %(m_doc)s = "%(doc)s";\n""" % dic
-        code += render_struct("PyModuleDef", PyModuleDef, dic["struct_name"], dic,
-                              first_line="PyModuleDef_HEAD_INIT,")
+        code = ""
+        freelists = [i for i in self.classes if i.get_freelist_size()]
+        if self.context.strings and not self.multiphase:
+            code += self._render_strings_funcs()
+        if self.multiphase:
+            dic.update({
+                "m_size": "sizeof(%s)" % self.context.state_struct_name,
+                "m_slots": "cppy_module_slots_%s" % self.context.name,
+                "m_traverse": "cppy_module_traverse_%s" % self.context.name,
+                "m_clear": "cppy_module_clear_%s" % self.context.name,
+                "m_free": "cppy_module_free_%s" % self.context.name,
+            })
+            code += "/* module state */\n" + self._render_state_funcs() + "\n"
+            code += "/* module teardown */\nstatic void %s(void* arg0)\n{\n" % dic["m_free"]
+            code += INDENT + "%s(reinterpret_cast<PyObject*>(arg0));\n}\n\n" % dic["m_clear"]
+            code += self._render_module_exec()
+        elif freelists or self.context.strings:
+            dic.update({ "m_free": "cppy_module_free_%s" % self.context.name })
+            code += "/* module teardown */\nstatic void %s(void*)\n{\n" % dic["m_free"]
+            for i in freelists:
+                code += INDENT + "%s();\n" % i.clear_freelist_func_name
+            if self.context.strings:
+                code += INDENT + "cppy_release_strings_%s();\n" % self.context.name
+            code += "}\n\n"
+
+        code += """/* module definition for '%(name)s' */\nstatic const char* %(m_doc)s = "%(doc)s";\n""" % dic
+        code += render_struct("PyModuleDef", PyModuleDef_multiphase if self.multiphase else PyModuleDef,
+                              dic["struct_name"], dic, first_line="PyModuleDef_HEAD_INIT,")
+        if self.multiphase:
+            code += "\n" + self._render_state_getter()
         return self.context.format_cpp(code, None)
 
+    @profiled
     def _render_method_struct(self):
-        code = "static PyMethodDef %s[] =\n{\n" % self.context.method_struct_name
+        code = "%sPyMethodDef %s[] =\n{\n" % ("" if self.shards else "static ", self.context.method_struct_name)
         for i in self.functions:
             code += "    " + i.render_member_struct_entry()
+        if self.profile:
+            code += '    { "cppy_profile_stats", reinterpret_cast<PyCFunction>(%(func)s), METH_VARARGS, %(func)s_doc },\n' % {
+                "func": "cppy_module_profile_stats_%s" % self.context.name }
         code += "\n    { NULL, NULL, 0, NULL }\n};\n"
         return self.context.format_cpp(code, None)
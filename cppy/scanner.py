@@ -0,0 +1,225 @@
+"""
+Static front end that reads an annotated module without importing it.
+
+The source is parsed with the ast module and reduced to the parts cppy needs:
+doc-strings, function signatures, classes with their bases, properties and typed attributes.
+Annotations are replaced by their source text, default values, decorators
+and all other statements are removed, so no code of the module is executed. The reduced source is then executed
+in a new module object, which can be passed to compiler.compile().
+"""
+import ast, os, types
+
+
+"""
+Decorators that are kept because they change how cppy sees a function
+"""
+KEEP_DECORATORS = ("property", "staticmethod", "classmethod")
+KEEP_PROPERTY_DECORATORS = ("setter", "getter", "deleter")
+
+
+def load_module(filename, name=None):
+    """
+    Parses the python file and returns a module object with all
+    functions and classes but without executing the code of the file
+    :param filename: str, name of the python file
+    :param name: str, name of the module, defaults to the basename of the file
+    :return: module
+    """
+    if name is None:
+        name = os.path.basename(filename).split(".")[0]
+    with open(filename, "rb") as f:
+        source = f.read()
+    return load_source(name, source, filename)
+
+
+def load_source(name, source, filename="<string>"):
+    """
+    Same as load_module() for a string or bytes containing the source
+    :return: module
+    """
+    tree = ast.parse(source, filename)
+    tree = ast.fix_missing_locations(_Reducer().reduce_module(tree))
+    module = types.ModuleType(name)
+    module.__file__ = filename
+    exec(compile(tree, filename, "exec"), module.__dict__)
+    return module
+
+
+def _is_doc_string(node):
+    return isinstance(node, ast.Expr) \
+        and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def _is_doc_assignment(node):
+    """Returns True for '__doc__ = "string"'"""
+    return isinstance(node, ast.Assign) \
+        and len(node.targets) == 1 \
+        and isinstance(node.targets[0], ast.Name) and node.targets[0].id == "__doc__" \
+        and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def _annotation_string(node):
+    """Returns the annotation as string constant, which is not evaluated"""
+    if node is None:
+        return None
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node
+    return ast.Constant(value=ast.unparse(node))
+
+
+"""
+Operators of the arithmetic expressions that are folded in typed attribute values.
+Pow and the shifts are left out, as a short expression like '9 ** 9 ** 9' would not finish
+"""
+_FOLD_BINARY = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+}
+_FOLD_UNARY = {
+    ast.UAdd: lambda a: +a,
+    ast.USub: lambda a: -a,
+    ast.Invert: lambda a: ~a,
+}
+
+
+def _literal_value(node):
+    """
+    Returns the value of a literal or of an arithmetic expression of number literals, e.g. '2 * 3.5'
+    :param node: ast expression
+    :return: the value
+    :raise ValueError: if the expression is not a literal or can not be evaluated, e.g. '1 / 0'
+    """
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        # ast.literal_eval() does not support arithmetic
+        return _fold_numbers(node)
+
+
+def _fold_numbers(node):
+    """
+    Evaluates an arithmetic expression of number literals with the operators in _FOLD_BINARY and _FOLD_UNARY.
+    The operands are restricted to numbers, so the size of the result is bounded by the length of the expression
+    """
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float, complex):
+        return node.value
+    try:
+        if isinstance(node, ast.BinOp) and type(node.op) in _FOLD_BINARY:
+            return _FOLD_BINARY[type(node.op)](_fold_numbers(node.left), _fold_numbers(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _FOLD_UNARY:
+            return _FOLD_UNARY[type(node.op)](_fold_numbers(node.operand))
+    except (ArithmeticError, TypeError) as e:
+        # e.g. division by zero or '~1.5'
+        raise ValueError(str(e))
+    raise ValueError("not a literal")
+
+
+class _Reducer:
+    """
+    Removes everything from a module ast that is not required for cppy
+    """
+    def __init__(self):
+        self.class_names = set()
+
+    def reduce_module(self, tree):
+        body = []
+        for i, node in enumerate(tree.body):
+            if i == 0 and _is_doc_string(node) or _is_doc_assignment(node):
+                body.append(node)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                body.append(self.reduce_function(node, set()))
+            elif isinstance(node, ast.ClassDef):
+                body.append(self.reduce_class(node))
+                self.class_names.add(node.name)
+        tree.body = body
+        return tree
+
+    def reduce_class(self, node):
+        # bases that are not defined in this module are replaced by empty classes of the same name
+        bases = []
+        for b in node.bases:
+            if isinstance(b, ast.Name) and (b.id in self.class_names or b.id == "object"):
+                bases.append(b)
+            else:
+                name = b.attr if isinstance(b, ast.Attribute) else b.id if isinstance(b, ast.Name) else "base"
+                bases.append(ast.Call(
+                    func=ast.Name(id="type", ctx=ast.Load()),
+                    args=[ast.Constant(value=name), ast.Tuple(elts=[], ctx=ast.Load()),
+                          ast.Dict(keys=[], values=[])],
+                    keywords=[]))
+        node.bases = bases
+        node.keywords = []
+        node.decorator_list = []
+
+        body = []
+        properties = set()
+        for i, n in enumerate(node.body):
+            if i == 0 and _is_doc_string(n) or _is_doc_assignment(n):
+                body.append(n)
+            elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                body.append(self.reduce_function(n, properties))
+                if any(isinstance(d, ast.Name) and d.id == "property" for d in n.decorator_list):
+                    properties.add(n.name)
+            elif isinstance(n, ast.AnnAssign) and isinstance(n.target, ast.Name):
+                body.append(self.reduce_attribute(n))
+        node.body = body or [ast.Pass()]
+        return node
+
+    def reduce_attribute(self, node):
+        """
+        Keeps a typed class attribute with the annotation as string, see Class.get_attributes().
+        The value must be a literal or an arithmetic expression of number literals, e.g. '-1' or '2 * 3.5',
+        without '**', '<<' and '>>', see _literal_value()
+        """
+        node.annotation = _annotation_string(node.annotation)
+        if node.value is not None:
+            try:
+                value = _literal_value(node.value)
+            except ValueError as e:
+                raise ValueError("Value of typed attribute '%s' in line %d is not a literal: '%s' (%s)" % (
+                    node.target.id, node.lineno, ast.unparse(node.value), e))
+            if type(value) in (int, float, complex):
+                # the folded number is executed instead of the expression
+                node.value = ast.Constant(value=value)
+        return node
+
+    def reduce_function(self, node, properties):
+        """
+        Removes the body except the doc-string, all default values
+        and decorators but the ones in KEEP_DECORATORS.
+        Annotations are replaced by strings, see Function.get_signature()
+        :param properties: set of str, names of properties defined before in the class
+        """
+        first_line = min([d.lineno for d in node.decorator_list] + [node.lineno])
+        decorators = []
+        for d in node.decorator_list:
+            if isinstance(d, ast.Name) and d.id in KEEP_DECORATORS:
+                decorators.append(d)
+            elif isinstance(d, ast.Attribute) and d.attr in KEEP_PROPERTY_DECORATORS \
+                    and isinstance(d.value, ast.Name) and d.value.id in properties:
+                decorators.append(d)
+        # keep the line number of the code object, which starts at the first decorator
+        if decorators:
+            decorators[0].lineno = first_line
+        else:
+            node.lineno = first_line
+        node.decorator_list = decorators
+
+        args = node.args
+        args.defaults = [ast.Constant(value=None) for d in args.defaults]
+        args.kw_defaults = [None if d is None else ast.Constant(value=None) for d in args.kw_defaults]
+        for a in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if a is not None:
+                a.annotation = _annotation_string(a.annotation)
+        node.returns = _annotation_string(node.returns)
+
+        body = []
+        if node.body and _is_doc_string(node.body[0]):
+            body.append(node.body[0])
+        body.append(ast.Pass())
+        node.body = body
+        return node
@@ -0,0 +1,792 @@
+
+/* generated by cppy */
+
+#include <python3.4/Python.h>
+#include <python3.4/structmember.h>
+
+#include "bench_3_2.h"
+
+#ifndef CPPY_ERROR
+#   include <iostream>
+#   define CPPY_ERROR(arg__) { std::cerr << arg__ << std::endl; }
+#endif
+
+#ifndef CPPY_UNUSED
+#   define CPPY_UNUSED(arg__) (void)arg__
+#endif
+
+/* compatibility checks */
+#include <type_traits>
+static_assert(std::is_same<unaryfunc,
+    PyObject*(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<binaryfunc,
+    PyObject*(*)(PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<ternaryfunc,
+    PyObject*(*)(PyObject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<inquiry,
+    int(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<lenfunc,
+    Py_ssize_t(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<ssizeargfunc,
+    PyObject*(*)(PyObject*, Py_ssize_t)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<ssizessizeargfunc,
+    PyObject*(*)(PyObject*, Py_ssize_t, Py_ssize_t)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<ssizeobjargproc,
+    int(*)(PyObject*, Py_ssize_t, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<ssizessizeobjargproc,
+    int(*)(PyObject*, Py_ssize_t, Py_ssize_t, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<objobjargproc,
+    int(*)(PyObject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<freefunc,
+    void(*)(void*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<destructor,
+    void(*)(PyObject*)>::value, "cppy/python api mismatch");
+#if PY_VERSION_HEX < 0x03080000
+static_assert(std::is_same<printfunc,
+    int(*)(PyObject*, FILE*, int)>::value, "cppy/python api mismatch");
+#endif
+static_assert(std::is_same<getattrfunc,
+    PyObject*(*)(PyObject*, char*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<getattrofunc,
+    PyObject*(*)(PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<setattrfunc,
+    int(*)(PyObject*, char*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<setattrofunc,
+    int(*)(PyObject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<reprfunc,
+    PyObject*(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<hashfunc,
+    Py_hash_t(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<richcmpfunc,
+    PyObject*(*)(PyObject*, PyObject*, int)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<getiterfunc,
+    PyObject*(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<iternextfunc,
+    PyObject*(*)(PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<descrgetfunc,
+    PyObject*(*)(PyObject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<descrsetfunc,
+    int(*)(PyObject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<initproc,
+    int(*)(PyObject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<newfunc,
+    PyObject*(*)(struct _typeobject*, PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<allocfunc,
+    PyObject*(*)(struct _typeobject*, Py_ssize_t)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<getter,
+    PyObject*(*)(PyObject*, void*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<setter,
+    int(*)(PyObject*, PyObject*, void*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<objobjproc,
+    int(*)(PyObject*, PyObject*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<visitproc,
+    int(*)(PyObject*, void*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<traverseproc,
+    int(*)(PyObject*, visitproc, void*)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<getbufferproc,
+    int(*)(PyObject*, Py_buffer*, int)>::value, "cppy/python api mismatch");
+static_assert(std::is_same<releasebufferproc,
+    void(*)(PyObject*, Py_buffer*)>::value, "cppy/python api mismatch");
+
+namespace cppy_test {
+
+/* forwards */
+extern "C" {
+
+} // extern "C"
+
+} // namespace cppy_test
+
+/* declarations from configuration */
+
+
+/* user declarations */
+#include <string>
+
+/* start the python c-api tango */
+namespace cppy_test {
+
+
+/* #################### class Class0 ##################### */
+
+extern "C" {
+
+    static const char* Class0_struct_doc_string = "Generated class number 0";
+    /* -- 'Class0' struct member impl -- */
+    void Class0_struct::cppy_new()
+    {
+        value = 0;
+        name = new std::string("Class0");
+    }
+    void Class0_struct::cppy_free()
+    {
+        delete name;
+    }
+    void Class0_struct::cppy_copy(Class0_struct* copy)
+    {
+        CPPY_UNUSED(copy);
+        copy->value = value;
+        *copy->name = *name;
+    }
+
+    /* ---------- Class0 methods ----------- */
+
+    /* <bench_3_2>:23 */
+    static int cppy_classmethod_Class0___init__(PyObject* arg0, PyObject* arg1, PyObject* arg2)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); CPPY_UNUSED(arg2); 
+        Class0_struct* self = reinterpret_cast<Class0_struct*>(arg0);
+        self->value = 0.;
+        return 0;
+    }
+    /* <bench_3_2>:29 */
+    static PyObject* cppy_classmethod_Class0___str__(PyObject* arg0)
+    {
+        CPPY_UNUSED(arg0); 
+        Class0_struct* self = reinterpret_cast<Class0_struct*>(arg0);
+        return PyUnicode_FromString(self->name->c_str());
+    }
+    /* <bench_3_2>:35 */
+    static const char* cppy_classmethod_Class0_method0_doc = "method0(Class0) -> Class0\nReturns a modified copy";
+    static PyObject* cppy_classmethod_Class0_method0(PyObject* arg0, PyObject* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class0_struct* self = reinterpret_cast<Class0_struct*>(arg0);
+        if (!is_Class0(arg1))
+            return NULL;
+        auto copy = copy_Class0(self);
+        copy->value += reinterpret_cast<Class0_struct*>(arg1)->value * 0;
+        return (PyObject*)copy;
+    }
+    /* <bench_3_2>:47 */
+    static const char* cppy_classmethod_Class0_method1_doc = "method1(Class0) -> Class0\nReturns a modified copy";
+    static PyObject* cppy_classmethod_Class0_method1(PyObject* arg0, PyObject* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class0_struct* self = reinterpret_cast<Class0_struct*>(arg0);
+        if (!is_Class0(arg1))
+            return NULL;
+        auto copy = copy_Class0(self);
+        copy->value += reinterpret_cast<Class0_struct*>(arg1)->value * 1;
+        return (PyObject*)copy;
+    }
+
+    /* ---------- Class0 properties ----------- */
+
+    /* <bench_3_2>:59 */
+    static const char* Class0_prop0_doc = "_CPP_:\n    return PyFloat_FromDouble(self->value + 0);";
+    static PyObject* Class0_prop0_getter(PyObject* arg0, void* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class0_struct* self = reinterpret_cast<Class0_struct*>(arg0);
+        return PyFloat_FromDouble(self->value + 0);
+    }
+    /* <bench_3_2>:69 */
+    static const char* Class0_prop1_doc = "_CPP_:\n    return PyFloat_FromDouble(self->value + 1);";
+    static PyObject* Class0_prop1_getter(PyObject* arg0, void* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class0_struct* self = reinterpret_cast<Class0_struct*>(arg0);
+        return PyFloat_FromDouble(self->value + 1);
+    }
+
+    /* ---------- Class0 structs ----------- */
+
+    static PyMethodDef Class0_method_struct[] =
+    {
+        { "method0", reinterpret_cast<PyCFunction>(cppy_classmethod_Class0_method0), METH_O, cppy_classmethod_Class0_method0_doc },
+        { "method1", reinterpret_cast<PyCFunction>(cppy_classmethod_Class0_method1), METH_O, cppy_classmethod_Class0_method1_doc },
+
+        { NULL, NULL, 0, NULL }
+    };
+    static PyGetSetDef Class0_getset_struct[] =
+    {
+        { (char*)"prop0", (getter)Class0_prop0_getter, (setter)NULL, (char*)Class0_prop0_doc, (void*)NULL },
+        { (char*)"prop1", (getter)Class0_prop1_getter, (setter)NULL, (char*)Class0_prop1_doc, (void*)NULL },
+
+        { NULL, NULL, NULL, NULL, NULL }
+    };
+    /* https://docs.python.org/3/c-api/typeobj.html */
+    static PyTypeObject Class0_type_struct =
+    {
+        PyVarObject_HEAD_INIT(NULL, 0)
+        /* tp_name */           static_cast<const char*>        ("bench_3_2.Class0"),
+        /* tp_basicsize */      static_cast<Py_ssize_t>         (sizeof(Class0_struct)),
+        /* tp_itemsize */       static_cast<Py_ssize_t>         (NULL),
+        /* tp_dealloc */        static_cast<destructor>         (destroy_Class0),
+        /* tp_print */          static_cast<printfunc>          (NULL),
+        /* tp_getattr */        static_cast<getattrfunc>        (NULL),
+        /* tp_setattr */        static_cast<setattrfunc>        (NULL),
+    #if PY_VERSION_HEX < 0x03050000
+        /* tp_reserved */       static_cast<void*>              (NULL),
+    #endif
+    #if PY_VERSION_HEX >= 0x03050000
+        /* tp_as_async */       static_cast<PyAsyncMethods*>    (NULL),
+    #endif
+        /* tp_repr */           static_cast<reprfunc>           (NULL),
+        /* tp_as_number */      static_cast<PyNumberMethods*>   (NULL),
+        /* tp_as_sequence */    static_cast<PySequenceMethods*> (NULL),
+        /* tp_as_mapping */     static_cast<PyMappingMethods*>  (NULL),
+        /* tp_hash */           static_cast<hashfunc>           (NULL),
+        /* tp_call */           static_cast<ternaryfunc>        (NULL),
+        /* tp_str */            static_cast<reprfunc>           (cppy_classmethod_Class0___str__),
+        /* tp_getattro */       static_cast<getattrofunc>       (PyObject_GenericGetAttr),
+        /* tp_setattro */       static_cast<setattrofunc>       (PyObject_GenericSetAttr),
+        /* tp_as_buffer */      static_cast<PyBufferProcs*>     (NULL),
+        /* tp_flags */          static_cast<unsigned long>      (Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE),
+        /* tp_doc */            static_cast<const char*>        (Class0_struct_doc_string),
+        /* tp_traverse */       static_cast<traverseproc>       (NULL),
+        /* tp_clear */          static_cast<inquiry>            (NULL),
+        /* tp_richcompare */    static_cast<richcmpfunc>        (NULL),
+        /* tp_weaklistoffset */ static_cast<Py_ssize_t>         (NULL),
+        /* tp_iter */           static_cast<getiterfunc>        (NULL),
+        /* tp_iternext */       static_cast<iternextfunc>       (NULL),
+        /* tp_methods */        static_cast<struct PyMethodDef*>(Class0_method_struct),
+        /* tp_members */        static_cast<struct PyMemberDef*>(NULL),
+        /* tp_getset */         static_cast<struct PyGetSetDef*>(Class0_getset_struct),
+        /* tp_base */           static_cast<struct _typeobject*>(NULL),
+        /* tp_dict */           static_cast<PyObject*>          (NULL),
+        /* tp_descr_get */      static_cast<descrgetfunc>       (NULL),
+        /* tp_descr_set */      static_cast<descrsetfunc>       (NULL),
+        /* tp_dictoffset */     static_cast<Py_ssize_t>         (NULL),
+        /* tp_init */           static_cast<initproc>           (cppy_classmethod_Class0___init__),
+        /* tp_alloc */          static_cast<allocfunc>          (NULL),
+        /* tp_new */            reinterpret_cast<newfunc>       (create_Class0),
+        /* tp_free */           static_cast<freefunc>           (NULL),
+        /* tp_is_gc */          static_cast<inquiry>            (NULL),
+        /* tp_bases */          static_cast<PyObject*>          (NULL),
+        /* tp_mro */            static_cast<PyObject*>          (NULL),
+        /* tp_cache */          static_cast<PyObject*>          (NULL),
+        /* tp_subclasses */     static_cast<PyObject*>          (NULL),
+        /* tp_weaklist */       static_cast<PyObject*>          (NULL),
+        /* tp_del */            static_cast<destructor>         (NULL),
+        /* tp_version_tag */    static_cast<unsigned int>       (NULL),
+        /* tp_finalize */       static_cast<destructor>         (NULL)
+    }; /* Class0_type_struct */
+
+    /* ---------- Class0 ctor/dtor ----------- */
+
+    /** Creates new instance of Class0 class.
+        @note Original function signature requires to return PyObject*,
+        but here we return the actual Class0 struct for convenience. */
+    Class0_struct* create_Class0()
+    {
+        auto o = PyObject_New(Class0_struct, &Class0_type_struct);
+        o->cppy_new();
+        return o;
+    }
+
+    /** Deletes a Class0 instance */
+    void destroy_Class0(PyObject* self)
+    {
+        reinterpret_cast<Class0_struct*>(self)->cppy_free();
+        self->ob_type->tp_free(self);
+    }
+
+    /** Makes a copy of the Class0 instance @p self,
+        using user-supplied Class0_struct::cppy_copy() */
+    Class0_struct* copy_Class0(Class0_struct* self)
+    {
+        Class0_struct* copy = create_Class0();
+        self->cppy_copy(copy);
+        return copy;
+    }
+
+    /** Wrapper for type checking after declaration of Class0_type_struct */
+    bool is_Class0(PyObject* arg)
+    {
+        return PyObject_TypeCheck(arg, &Class0_type_struct);
+    }
+} // extern "C"
+
+bool initialize_class_Class0(void* vmodule)
+{
+    PyObject* module = reinterpret_cast<PyObject*>(vmodule);
+
+    if (0 != PyType_Ready(&Class0_type_struct))
+    {
+        CPPY_ERROR("Failed to readify class Class0 for Python 3.4 module");
+        return false;
+    }
+
+    PyObject* object = reinterpret_cast<PyObject*>(&Class0_type_struct);
+    Py_INCREF(object);
+    if (0 != PyModule_AddObject(module, "Class0", object))
+    {
+        Py_DECREF(object);
+        CPPY_ERROR("Failed to add class Class0 to Python 3.4 module");
+        return false;
+    }
+    return true;
+}
+
+/* #################### class Class1 ##################### */
+
+extern "C" {
+
+    static const char* Class1_struct_doc_string = "Generated class number 1";
+    /* -- 'Class1' struct member impl -- */
+    void Class1_struct::cppy_new()
+    {
+        value = 1;
+        name = new std::string("Class1");
+    }
+    void Class1_struct::cppy_free()
+    {
+        delete name;
+    }
+    void Class1_struct::cppy_copy(Class1_struct* copy)
+    {
+        CPPY_UNUSED(copy);
+        copy->value = value;
+        *copy->name = *name;
+    }
+
+    /* ---------- Class1 methods ----------- */
+
+    /* <bench_3_2>:94 */
+    static int cppy_classmethod_Class1___init__(PyObject* arg0, PyObject* arg1, PyObject* arg2)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); CPPY_UNUSED(arg2); 
+        Class1_struct* self = reinterpret_cast<Class1_struct*>(arg0);
+        self->value = 0.;
+        return 0;
+    }
+    /* <bench_3_2>:100 */
+    static PyObject* cppy_classmethod_Class1___str__(PyObject* arg0)
+    {
+        CPPY_UNUSED(arg0); 
+        Class1_struct* self = reinterpret_cast<Class1_struct*>(arg0);
+        return PyUnicode_FromString(self->name->c_str());
+    }
+    /* <bench_3_2>:106 */
+    static const char* cppy_classmethod_Class1_method0_doc = "method0(Class1) -> Class1\nReturns a modified copy";
+    static PyObject* cppy_classmethod_Class1_method0(PyObject* arg0, PyObject* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class1_struct* self = reinterpret_cast<Class1_struct*>(arg0);
+        if (!is_Class1(arg1))
+            return NULL;
+        auto copy = copy_Class1(self);
+        copy->value += reinterpret_cast<Class1_struct*>(arg1)->value * 0;
+        return (PyObject*)copy;
+    }
+    /* <bench_3_2>:118 */
+    static const char* cppy_classmethod_Class1_method1_doc = "method1(Class1) -> Class1\nReturns a modified copy";
+    static PyObject* cppy_classmethod_Class1_method1(PyObject* arg0, PyObject* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class1_struct* self = reinterpret_cast<Class1_struct*>(arg0);
+        if (!is_Class1(arg1))
+            return NULL;
+        auto copy = copy_Class1(self);
+        copy->value += reinterpret_cast<Class1_struct*>(arg1)->value * 1;
+        return (PyObject*)copy;
+    }
+
+    /* ---------- Class1 properties ----------- */
+
+    /* <bench_3_2>:130 */
+    static const char* Class1_prop0_doc = "_CPP_:\n    return PyFloat_FromDouble(self->value + 0);";
+    static PyObject* Class1_prop0_getter(PyObject* arg0, void* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class1_struct* self = reinterpret_cast<Class1_struct*>(arg0);
+        return PyFloat_FromDouble(self->value + 0);
+    }
+    /* <bench_3_2>:140 */
+    static const char* Class1_prop1_doc = "_CPP_:\n    return PyFloat_FromDouble(self->value + 1);";
+    static PyObject* Class1_prop1_getter(PyObject* arg0, void* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class1_struct* self = reinterpret_cast<Class1_struct*>(arg0);
+        return PyFloat_FromDouble(self->value + 1);
+    }
+
+    /* ---------- Class1 structs ----------- */
+
+    static PyMethodDef Class1_method_struct[] =
+    {
+        { "method0", reinterpret_cast<PyCFunction>(cppy_classmethod_Class1_method0), METH_O, cppy_classmethod_Class1_method0_doc },
+        { "method1", reinterpret_cast<PyCFunction>(cppy_classmethod_Class1_method1), METH_O, cppy_classmethod_Class1_method1_doc },
+
+        { NULL, NULL, 0, NULL }
+    };
+    static PyGetSetDef Class1_getset_struct[] =
+    {
+        { (char*)"prop0", (getter)Class1_prop0_getter, (setter)NULL, (char*)Class1_prop0_doc, (void*)NULL },
+        { (char*)"prop1", (getter)Class1_prop1_getter, (setter)NULL, (char*)Class1_prop1_doc, (void*)NULL },
+
+        { NULL, NULL, NULL, NULL, NULL }
+    };
+    /* https://docs.python.org/3/c-api/typeobj.html */
+    static PyTypeObject Class1_type_struct =
+    {
+        PyVarObject_HEAD_INIT(NULL, 0)
+        /* tp_name */           static_cast<const char*>        ("bench_3_2.Class1"),
+        /* tp_basicsize */      static_cast<Py_ssize_t>         (sizeof(Class1_struct)),
+        /* tp_itemsize */       static_cast<Py_ssize_t>         (NULL),
+        /* tp_dealloc */        static_cast<destructor>         (destroy_Class1),
+        /* tp_print */          static_cast<printfunc>          (NULL),
+        /* tp_getattr */        static_cast<getattrfunc>        (NULL),
+        /* tp_setattr */        static_cast<setattrfunc>        (NULL),
+    #if PY_VERSION_HEX < 0x03050000
+        /* tp_reserved */       static_cast<void*>              (NULL),
+    #endif
+    #if PY_VERSION_HEX >= 0x03050000
+        /* tp_as_async */       static_cast<PyAsyncMethods*>    (NULL),
+    #endif
+        /* tp_repr */           static_cast<reprfunc>           (NULL),
+        /* tp_as_number */      static_cast<PyNumberMethods*>   (NULL),
+        /* tp_as_sequence */    static_cast<PySequenceMethods*> (NULL),
+        /* tp_as_mapping */     static_cast<PyMappingMethods*>  (NULL),
+        /* tp_hash */           static_cast<hashfunc>           (NULL),
+        /* tp_call */           static_cast<ternaryfunc>        (NULL),
+        /* tp_str */            static_cast<reprfunc>           (cppy_classmethod_Class1___str__),
+        /* tp_getattro */       static_cast<getattrofunc>       (PyObject_GenericGetAttr),
+        /* tp_setattro */       static_cast<setattrofunc>       (PyObject_GenericSetAttr),
+        /* tp_as_buffer */      static_cast<PyBufferProcs*>     (NULL),
+        /* tp_flags */          static_cast<unsigned long>      (Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE),
+        /* tp_doc */            static_cast<const char*>        (Class1_struct_doc_string),
+        /* tp_traverse */       static_cast<traverseproc>       (NULL),
+        /* tp_clear */          static_cast<inquiry>            (NULL),
+        /* tp_richcompare */    static_cast<richcmpfunc>        (NULL),
+        /* tp_weaklistoffset */ static_cast<Py_ssize_t>         (NULL),
+        /* tp_iter */           static_cast<getiterfunc>        (NULL),
+        /* tp_iternext */       static_cast<iternextfunc>       (NULL),
+        /* tp_methods */        static_cast<struct PyMethodDef*>(Class1_method_struct),
+        /* tp_members */        static_cast<struct PyMemberDef*>(NULL),
+        /* tp_getset */         static_cast<struct PyGetSetDef*>(Class1_getset_struct),
+        /* tp_base */           static_cast<struct _typeobject*>(NULL),
+        /* tp_dict */           static_cast<PyObject*>          (NULL),
+        /* tp_descr_get */      static_cast<descrgetfunc>       (NULL),
+        /* tp_descr_set */      static_cast<descrsetfunc>       (NULL),
+        /* tp_dictoffset */     static_cast<Py_ssize_t>         (NULL),
+        /* tp_init */           static_cast<initproc>           (cppy_classmethod_Class1___init__),
+        /* tp_alloc */          static_cast<allocfunc>          (NULL),
+        /* tp_new */            reinterpret_cast<newfunc>       (create_Class1),
+        /* tp_free */           static_cast<freefunc>           (NULL),
+        /* tp_is_gc */          static_cast<inquiry>            (NULL),
+        /* tp_bases */          static_cast<PyObject*>          (NULL),
+        /* tp_mro */            static_cast<PyObject*>          (NULL),
+        /* tp_cache */          static_cast<PyObject*>          (NULL),
+        /* tp_subclasses */     static_cast<PyObject*>          (NULL),
+        /* tp_weaklist */       static_cast<PyObject*>          (NULL),
+        /* tp_del */            static_cast<destructor>         (NULL),
+        /* tp_version_tag */    static_cast<unsigned int>       (NULL),
+        /* tp_finalize */       static_cast<destructor>         (NULL)
+    }; /* Class1_type_struct */
+
+    /* ---------- Class1 ctor/dtor ----------- */
+
+    /** Creates new instance of Class1 class.
+        @note Original function signature requires to return PyObject*,
+        but here we return the actual Class1 struct for convenience. */
+    Class1_struct* create_Class1()
+    {
+        auto o = PyObject_New(Class1_struct, &Class1_type_struct);
+        o->cppy_new();
+        return o;
+    }
+
+    /** Deletes a Class1 instance */
+    void destroy_Class1(PyObject* self)
+    {
+        reinterpret_cast<Class1_struct*>(self)->cppy_free();
+        self->ob_type->tp_free(self);
+    }
+
+    /** Makes a copy of the Class1 instance @p self,
+        using user-supplied Class1_struct::cppy_copy() */
+    Class1_struct* copy_Class1(Class1_struct* self)
+    {
+        Class1_struct* copy = create_Class1();
+        self->cppy_copy(copy);
+        return copy;
+    }
+
+    /** Wrapper for type checking after declaration of Class1_type_struct */
+    bool is_Class1(PyObject* arg)
+    {
+        return PyObject_TypeCheck(arg, &Class1_type_struct);
+    }
+} // extern "C"
+
+bool initialize_class_Class1(void* vmodule)
+{
+    PyObject* module = reinterpret_cast<PyObject*>(vmodule);
+
+    if (0 != PyType_Ready(&Class1_type_struct))
+    {
+        CPPY_ERROR("Failed to readify class Class1 for Python 3.4 module");
+        return false;
+    }
+
+    PyObject* object = reinterpret_cast<PyObject*>(&Class1_type_struct);
+    Py_INCREF(object);
+    if (0 != PyModule_AddObject(module, "Class1", object))
+    {
+        Py_DECREF(object);
+        CPPY_ERROR("Failed to add class Class1 to Python 3.4 module");
+        return false;
+    }
+    return true;
+}
+
+/* #################### class Class2 ##################### */
+
+extern "C" {
+
+    static const char* Class2_struct_doc_string = "Generated class number 2";
+    /* -- 'Class2' struct member impl -- */
+    void Class2_struct::cppy_new()
+    {
+        value = 2;
+        name = new std::string("Class2");
+    }
+    void Class2_struct::cppy_free()
+    {
+        delete name;
+    }
+    void Class2_struct::cppy_copy(Class2_struct* copy)
+    {
+        CPPY_UNUSED(copy);
+        copy->value = value;
+        *copy->name = *name;
+    }
+
+    /* ---------- Class2 methods ----------- */
+
+    /* <bench_3_2>:165 */
+    static int cppy_classmethod_Class2___init__(PyObject* arg0, PyObject* arg1, PyObject* arg2)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); CPPY_UNUSED(arg2); 
+        Class2_struct* self = reinterpret_cast<Class2_struct*>(arg0);
+        self->value = 0.;
+        return 0;
+    }
+    /* <bench_3_2>:171 */
+    static PyObject* cppy_classmethod_Class2___str__(PyObject* arg0)
+    {
+        CPPY_UNUSED(arg0); 
+        Class2_struct* self = reinterpret_cast<Class2_struct*>(arg0);
+        return PyUnicode_FromString(self->name->c_str());
+    }
+    /* <bench_3_2>:177 */
+    static const char* cppy_classmethod_Class2_method0_doc = "method0(Class2) -> Class2\nReturns a modified copy";
+    static PyObject* cppy_classmethod_Class2_method0(PyObject* arg0, PyObject* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class2_struct* self = reinterpret_cast<Class2_struct*>(arg0);
+        if (!is_Class2(arg1))
+            return NULL;
+        auto copy = copy_Class2(self);
+        copy->value += reinterpret_cast<Class2_struct*>(arg1)->value * 0;
+        return (PyObject*)copy;
+    }
+    /* <bench_3_2>:189 */
+    static const char* cppy_classmethod_Class2_method1_doc = "method1(Class2) -> Class2\nReturns a modified copy";
+    static PyObject* cppy_classmethod_Class2_method1(PyObject* arg0, PyObject* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class2_struct* self = reinterpret_cast<Class2_struct*>(arg0);
+        if (!is_Class2(arg1))
+            return NULL;
+        auto copy = copy_Class2(self);
+        copy->value += reinterpret_cast<Class2_struct*>(arg1)->value * 1;
+        return (PyObject*)copy;
+    }
+
+    /* ---------- Class2 properties ----------- */
+
+    /* <bench_3_2>:201 */
+    static const char* Class2_prop0_doc = "_CPP_:\n    return PyFloat_FromDouble(self->value + 0);";
+    static PyObject* Class2_prop0_getter(PyObject* arg0, void* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class2_struct* self = reinterpret_cast<Class2_struct*>(arg0);
+        return PyFloat_FromDouble(self->value + 0);
+    }
+    /* <bench_3_2>:211 */
+    static const char* Class2_prop1_doc = "_CPP_:\n    return PyFloat_FromDouble(self->value + 1);";
+    static PyObject* Class2_prop1_getter(PyObject* arg0, void* arg1)
+    {
+        CPPY_UNUSED(arg0); CPPY_UNUSED(arg1); 
+        Class2_struct* self = reinterpret_cast<Class2_struct*>(arg0);
+        return PyFloat_FromDouble(self->value + 1);
+    }
+
+    /* ---------- Class2 structs ----------- */
+
+    static PyMethodDef Class2_method_struct[] =
+    {
+        { "method0", reinterpret_cast<PyCFunction>(cppy_classmethod_Class2_method0), METH_O, cppy_classmethod_Class2_method0_doc },
+        { "method1", reinterpret_cast<PyCFunction>(cppy_classmethod_Class2_method1), METH_O, cppy_classmethod_Class2_method1_doc },
+
+        { NULL, NULL, 0, NULL }
+    };
+    static PyGetSetDef Class2_getset_struct[] =
+    {
+        { (char*)"prop0", (getter)Class2_prop0_getter, (setter)NULL, (char*)Class2_prop0_doc, (void*)NULL },
+        { (char*)"prop1", (getter)Class2_prop1_getter, (setter)NULL, (char*)Class2_prop1_doc, (void*)NULL },
+
+        { NULL, NULL, NULL, NULL, NULL }
+    };
+    /* https://docs.python.org/3/c-api/typeobj.html */
+    static PyTypeObject Class2_type_struct =
+    {
+        PyVarObject_HEAD_INIT(NULL, 0)
+        /* tp_name */           static_cast<const char*>        ("bench_3_2.Class2"),
+        /* tp_basicsize */      static_cast<Py_ssize_t>         (sizeof(Class2_struct)),
+        /* tp_itemsize */       static_cast<Py_ssize_t>         (NULL),
+        /* tp_dealloc */        static_cast<destructor>         (destroy_Class2),
+        /* tp_print */          static_cast<printfunc>          (NULL),
+        /* tp_getattr */        static_cast<getattrfunc>        (NULL),
+        /* tp_setattr */        static_cast<setattrfunc>        (NULL),
+    #if PY_VERSION_HEX < 0x03050000
+        /* tp_reserved */       static_cast<void*>              (NULL),
+    #endif
+    #if PY_VERSION_HEX >= 0x03050000
+        /* tp_as_async */       static_cast<PyAsyncMethods*>    (NULL),
+    #endif
+        /* tp_repr */           static_cast<reprfunc>           (NULL),
+        /* tp_as_number */      static_cast<PyNumberMethods*>   (NULL),
+        /* tp_as_sequence */    static_cast<PySequenceMethods*> (NULL),
+        /* tp_as_mapping */     static_cast<PyMappingMethods*>  (NULL),
+        /* tp_hash */           static_cast<hashfunc>           (NULL),
+        /* tp_call */           static_cast<ternaryfunc>        (NULL),
+        /* tp_str */            static_cast<reprfunc>           (cppy_classmethod_Class2___str__),
+        /* tp_getattro */       static_cast<getattrofunc>       (PyObject_GenericGetAttr),
+        /* tp_setattro */       static_cast<setattrofunc>       (PyObject_GenericSetAttr),
+        /* tp_as_buffer */      static_cast<PyBufferProcs*>     (NULL),
+        /* tp_flags */          static_cast<unsigned long>      (Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE),
+        /* tp_doc */            static_cast<const char*>        (Class2_struct_doc_string),
+        /* tp_traverse */       static_cast<traverseproc>       (NULL),
+        /* tp_clear */          static_cast<inquiry>            (NULL),
+        /* tp_richcompare */    static_cast<richcmpfunc>        (NULL),
+        /* tp_weaklistoffset */ static_cast<Py_ssize_t>         (NULL),
+        /* tp_iter */           static_cast<getiterfunc>        (NULL),
+        /* tp_iternext */       static_cast<iternextfunc>       (NULL),
+        /* tp_methods */        static_cast<struct PyMethodDef*>(Class2_method_struct),
+        /* tp_members */        static_cast<struct PyMemberDef*>(NULL),
+        /* tp_getset */         static_cast<struct PyGetSetDef*>(Class2_getset_struct),
+        /* tp_base */           static_cast<struct _typeobject*>(NULL),
+        /* tp_dict */           static_cast<PyObject*>          (NULL),
+        /* tp_descr_get */      static_cast<descrgetfunc>       (NULL),
+        /* tp_descr_set */      static_cast<descrsetfunc>       (NULL),
+        /* tp_dictoffset */     static_cast<Py_ssize_t>         (NULL),
+        /* tp_init */           static_cast<initproc>           (cppy_classmethod_Class2___init__),
+        /* tp_alloc */          static_cast<allocfunc>          (NULL),
+        /* tp_new */            reinterpret_cast<newfunc>       (create_Class2),
+        /* tp_free */           static_cast<freefunc>           (NULL),
+        /* tp_is_gc */          static_cast<inquiry>            (NULL),
+        /* tp_bases */          static_cast<PyObject*>          (NULL),
+        /* tp_mro */            static_cast<PyObject*>          (NULL),
+        /* tp_cache */          static_cast<PyObject*>          (NULL),
+        /* tp_subclasses */     static_cast<PyObject*>          (NULL),
+        /* tp_weaklist */       static_cast<PyObject*>          (NULL),
+        /* tp_del */            static_cast<destructor>         (NULL),
+        /* tp_version_tag */    static_cast<unsigned int>       (NULL),
+        /* tp_finalize */       static_cast<destructor>         (NULL)
+    }; /* Class2_type_struct */
+
+    /* ---------- Class2 ctor/dtor ----------- */
+
+    /** Creates new instance of Class2 class.
+        @note Original function signature requires to return PyObject*,
+        but here we return the actual Class2 struct for convenience. */
+    Class2_struct* create_Class2()
+    {
+        auto o = PyObject_New(Class2_struct, &Class2_type_struct);
+        o->cppy_new();
+        return o;
+    }
+
+    /** Deletes a Class2 instance */
+    void destroy_Class2(PyObject* self)
+    {
+        reinterpret_cast<Class2_struct*>(self)->cppy_free();
+        self->ob_type->tp_free(self);
+    }
+
+    /** Makes a copy of the Class2 instance @p self,
+        using user-supplied Class2_struct::cppy_copy() */
+    Class2_struct* copy_Class2(Class2_struct* self)
+    {
+        Class2_struct* copy = create_Class2();
+        self->cppy_copy(copy);
+        return copy;
+    }
+
+    /** Wrapper for type checking after declaration of Class2_type_struct */
+    bool is_Class2(PyObject* arg)
+    {
+        return PyObject_TypeCheck(arg, &Class2_type_struct);
+    }
+} // extern "C"
+
+bool initialize_class_Class2(void* vmodule)
+{
+    PyObject* module = reinterpret_cast<PyObject*>(vmodule);
+
+    if (0 != PyType_Ready(&Class2_type_struct))
+    {
+        CPPY_ERROR("Failed to readify class Class2 for Python 3.4 module");
+        return false;
+    }
+
+    PyObject* object = reinterpret_cast<PyObject*>(&Class2_type_struct);
+    Py_INCREF(object);
+    if (0 != PyModule_AddObject(module, "Class2", object))
+    {
+        Py_DECREF(object);
+        CPPY_ERROR("Failed to add class Class2 to Python 3.4 module");
+        return false;
+    }
+    return true;
+}
+extern "C" {
+    /* module definition for 'bench_3_2' */
+    static const char* cppy_module_bench_3_2_doc = "Generated benchmark module";
+    static PyModuleDef cppy_module_bench_3_2 =
+    {
+        PyModuleDef_HEAD_INIT,
+        /* m_name */     static_cast<const char*>      ("bench_3_2"),
+        /* m_doc */      static_cast<const char*>      (cppy_module_bench_3_2_doc),
+        /* m_size */     static_cast<Py_ssize_t>       (-1),
+        /* m_methods */  static_cast<PyMethodDef*>     (nullptr),
+    #if PY_VERSION_HEX < 0x03050000
+        /* m_reload */   static_cast<inquiry>          (NULL),
+    #endif
+    #if PY_VERSION_HEX >= 0x03050000
+        /* m_slots */    static_cast<PyModuleDef_Slot*>(NULL),
+    #endif
+        /* m_traverse */ static_cast<traverseproc>     (NULL),
+        /* m_clear */    static_cast<inquiry>          (NULL),
+        /* m_free */     static_cast<freefunc>         (NULL)
+    }; /* cppy_module_bench_3_2 */
+} // extern "C"
+
+namespace {
+    PyMODINIT_FUNC create_module_bench_3_2_func()
+    {
+        auto module = PyModule_Create(&cppy_module_bench_3_2);
+        if (!module)
+            return nullptr;
+
+        // add the classes
+        initialize_class_Class0(module);
+        initialize_class_Class1(module);
+        initialize_class_Class2(module);
+
+        return module;
+    }
+} // namespace
+
+bool initialize_module_bench_3_2()
+{
+    PyImport_AppendInittab("bench_3_2", create_module_bench_3_2_func);
+    return true;
+}
+} // namespace cppy_test
+/* footer from configuration */
@@ -0,0 +1,70 @@
+/* generated by cppy */
+
+#include <python3.4/Python.h>
+
+namespace cppy_test {
+
+/* Call this before Py_Initialize() */
+bool initialize_module_bench_3_2();
+
+extern "C" {
+    /* Class0 forward decl */
+    struct Class0_struct;
+    Class0_struct* create_Class0();
+    void destroy_Class0(PyObject* self);
+    Class0_struct* copy_Class0(Class0_struct* self);
+    bool is_Class0(PyObject* arg);
+
+    /* Class1 forward decl */
+    struct Class1_struct;
+    Class1_struct* create_Class1();
+    void destroy_Class1(PyObject* self);
+    Class1_struct* copy_Class1(Class1_struct* self);
+    bool is_Class1(PyObject* arg);
+
+    /* Class2 forward decl */
+    struct Class2_struct;
+    Class2_struct* create_Class2();
+    void destroy_Class2(PyObject* self);
+    Class2_struct* copy_Class2(Class2_struct* self);
+    bool is_Class2(PyObject* arg);
+
+    /* class 'Class0' */
+    struct Class0_struct
+    {
+        PyObject_HEAD
+        double value;
+        std::string* name;
+
+        void cppy_new();
+        void cppy_free();
+        void cppy_copy(Class0_struct* copy);
+    };
+
+    /* class 'Class1' */
+    struct Class1_struct
+    {
+        PyObject_HEAD
+        double value;
+        std::string* name;
+
+        void cppy_new();
+        void cppy_free();
+        void cppy_copy(Class1_struct* copy);
+    };
+
+    /* class 'Class2' */
+    struct Class2_struct
+    {
+        PyObject_HEAD
+        double value;
+        std::string* name;
+
+        void cppy_new();
+        void cppy_free();
+        void cppy_copy(Class2_struct* copy);
+    };
+
+} // extern "C"
+
+} // namespace cppy_test
\ No newline at end of file
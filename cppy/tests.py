@@ -1,5 +1,10 @@
-import unittest
+import unittest, os, sys, tempfile
 from cppy.renderer import *
+from cppy import compiler, batch, scanner, benchmarks
+from cppy.profiler import Profiler
+from cppy.benchmarks import load_module_source, make_module
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), "test_data")
 
 class TestRenderer(unittest.TestCase):
 
@@ -47,7 +52,1303 @@ class TestRenderer(unittest.TestCase):
 """
         self.assertEqual(expect, apply_string_dict(code, dic))
 
+    def test_template(self):
+        code = "foo:\n    %(bar)s\n    %(baz)s %(bar)s"
+        self.assertIs(get_template(code), get_template(code))
+        # unknown keys are left in place
+        self.assertEqual("foo:\n    a\n    %(baz)s a", get_template(code).render({ "bar": "a" }))
+        # empty values remove the indentation
+        self.assertEqual("foo:\n\n    b ", get_template(code).render({ "bar": "", "baz": "b" }))
+        # values are not scanned for tags
+        self.assertEqual("foo:\n    %(baz)s\n    c %(baz)s",
+                         get_template(code).render({ "bar": "%(baz)s", "baz": "c" }))
+        # the cache is bounded
+        for i in range(get_template.cache_info().maxsize + 10):
+            get_template("%%(bar)s %d" % i)
+        self.assertEqual(get_template.cache_info().maxsize, get_template.cache_info().currsize)
+
+    def test_join_code(self):
+        ctx = compiler.compile(load_module_source("test_join", "")).context
+        frags = ["a\n  b", "", "c", "", "", "  d\ne", "f"]
+        for sep in ("\n", "\n\n"):
+            for i in range(len(frags)):
+                for j in range(i, len(frags) + 1):
+                    expect = ctx.format_cpp("".join(sep + f for f in frags[i:j]), None)
+                    self.assertEqual(expect, join_code(frags[i:j], sep))
+
+    def test_collapse_newlines(self):
+        self.assertEqual("  a\n\nb\n  \nc", collapse_newlines("\n\n  a\n\n\n\nb\n  \nc\n\n"))
+
+
+
+class TestContext(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        int x;
+    """
+    def bar(self):
+        """
+        _CPP_:
+            return NULL;
+        """
+
+class Baz(Foo):
+    pass
+'''
+
+    def setUp(self):
+        self.ctx = compiler.compile(load_module_source("test_context", self.source)).context
+        self.foo = self.ctx.get_class("Foo")
+
+    def test_template_tags(self):
+        ctx = self.ctx
+        self.assertEqual("Foo", ctx.format_cpp("$NAME()", self.foo))
+        self.assertEqual("Baz_struct", ctx.format_cpp("$STRUCT(Baz)", self.foo))
+        self.assertEqual("Foo_type_struct", ctx.format_cpp("$TYPE_STRUCT()", self.foo))
+        self.assertEqual("create_Baz()", ctx.format_cpp("$NEW(Baz)", None))
+        self.assertEqual("is_Foo(a)", ctx.format_cpp("$is_instance(a)", self.foo))
+        self.assertEqual("is_Baz(a)", ctx.format_cpp("$IS_INSTANCE(a, Baz)", self.foo))
+        self.assertEqual("reinterpret_cast<Baz_struct*>(arg1)->x",
+                         ctx.format_cpp("$CAST(arg1, Baz)->x", None))
+        self.assertEqual("copy_Foo(self); copy_Baz(self);",
+                         ctx.format_cpp("$COPY(self); $COPY(self, Baz);", self.foo))
+
+    def test_template_tag_errors(self):
+        with self.assertRaises(ValueError):
+            self.ctx.format_cpp("$NAME()", None)
+        with self.assertRaises(ValueError):
+            self.ctx.format_cpp("$STRUCT(Unknown)", self.foo)
+        with self.assertRaises(ValueError):
+            self.ctx.format_cpp("$UNKNOWN()", self.foo)
+
+    def test_invalidate(self):
+        """Each setting of the Renderer that changes the rendered code clears the caches of the context"""
+        renderer = compiler.compile(load_module_source("test_context", self.source))
+        ctx = renderer.context
+        for name, value in (("fastcall", True), ("multiphase", True), ("profile", True), ("shards", 2)):
+            source_hash = ctx.source_hash()
+            ctx.format_cpp("$STRUCT(Baz)", None)
+            setattr(renderer, name, value)
+            self.assertEqual({}, ctx._template_cache, name)
+            self.assertNotEqual(source_hash, ctx.source_hash(), name)
+
+
+class TestFastcall(unittest.TestCase):
+
+    source = '''
+def add(a, b):
+    """
+    _CPP_:
+        return PyNumber_Add($ARG(0), $ARG(1));
+    """
+
+def kw(a, b):
+    """
+    _CPP_:
+        return $NARGS() ? Py_None : $KWNAMES();
+    """
+
+class Foo:
+    """
+    _CPP_:
+        int x;
+    """
+    def __init__(self):
+        """
+        _CPP_:
+            return 0;
+        """
+'''
+
+    def test_fastcall(self):
+        renderer = compiler.compile(load_module_source("test_fastcall", self.source))
+        code = renderer.render_cpp()
+        self.assertIn("PyNumber_Add(PyTuple_GET_ITEM(arg1, 0), PyTuple_GET_ITEM(arg1, 1))", code)
+        self.assertIn("PyTuple_GET_SIZE(arg1) ? Py_None : NULL", code)
+        self.assertNotIn("METH_FASTCALL", code)
+        self.assertNotIn("vectorcall", code)
+
+        renderer.fastcall = True
+        code = renderer.render_cpp()
+        self.assertIn("cppy_add(PyObject* arg0, PyObject* const* arg1, Py_ssize_t arg2)", code)
+        self.assertIn("PyNumber_Add(arg1[0], arg1[1])", code)
+        self.assertIn("reinterpret_cast<PyCFunction>(cppy_add), METH_FASTCALL,", code)
+        self.assertIn("arg2 ? Py_None : arg3", code)
+        self.assertIn("reinterpret_cast<PyCFunction>(cppy_kw), METH_FASTCALL | METH_KEYWORDS,", code)
+        self.assertIn("cppy_classmethod_Foo___init__(self, args, kwargs)", code)
+        self.assertIn("Foo_type_struct.tp_vectorcall = vectorcall_Foo;", code)
+
+
+class TestSignature(unittest.TestCase):
+
+    source = '''
+def add(a: float, b: int) -> float:
+    """
+    _CPP_:
+        return a + b;
+    """
+
+def name(a):
+    """
+    name(a: Foo) -> str
+    _CPP_:
+        return "$NAME(Foo)";
+    """
+
+def untyped(a, b):
+    """
+    untyped(float, float) -> float
+    _CPP_:
+        return NULL;
+    """
+
+def hint(a: "not_installed.Type") -> float:
+    """
+    _CPP_:
+        return NULL;
+    """
+
+class Foo:
+    """
+    _CPP_:
+        int x;
+    """
+    def set(self, x: int) -> None:
+        """
+        _CPP_:
+            self->x = x;
+        """
+'''
+
+    def _functions(self, module):
+        renderer = compiler.compile(module)
+        return dict((f.name, f) for f in renderer.functions + renderer.context.get_class("Foo").functions)
+
+    def test_signature(self):
+        funcs = self._functions(load_module_source("test_signature", self.source))
+        self.assertEqual(([("a", "float"), ("b", "int")], "float"), funcs["add"].get_signature())
+        self.assertEqual(([("a", "Foo")], "str"), funcs["name"].get_signature())
+        self.assertEqual(([("x", "int")], "None"), funcs["set"].get_signature())
+        self.assertIsNone(funcs["untyped"].get_signature())
+        self.assertIsNone(funcs["hint"].get_signature())
+
+        code = funcs["add"].render_python_api()
+        self.assertIn("double a = PyFloat_AsDouble(PyTuple_GET_ITEM(arg1, 0));", code)
+        self.assertIn("long b = PyLong_AsLong(PyTuple_GET_ITEM(arg1, 1));", code)
+        self.assertIn("return PyFloat_FromDouble(cppy_result);", code)
+        code = funcs["name"].render_python_api()
+        self.assertIn("if (!(is_Foo(arg1)))", code)
+        self.assertIn("Foo_struct* a = reinterpret_cast<Foo_struct*>(arg1);", code)
+        self.assertIn("return PyUnicode_FromString(cppy_result);", code)
+        code = funcs["set"].render_python_api()
+        self.assertIn("long x = PyLong_AsLong(arg1);", code)
+        self.assertIn("Py_RETURN_NONE;", code)
+
+    def test_static(self):
+        funcs = self._functions(scanner.load_source("test_signature", self.source))
+        self.assertEqual(([("a", "float"), ("b", "int")], "float"), funcs["add"].get_signature())
+        self.assertIsNone(funcs["hint"].get_signature())
+
+
+class TestBuffer(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        double v[3];
+    _CPP_(GETBUFFER):
+        return PyBuffer_FillInfo(arg1, arg0, self->v, sizeof(self->v), 0, arg2);
+    _CPP_(RELEASEBUFFER):
+        CPPY_PRINT("release");
+    """
+
+class Bar(Foo):
+    pass
+
+class Baz:
+    """
+    _CPP_:
+        int x;
+    """
+'''
+
+    def test_buffer(self):
+        renderer = compiler.compile(load_module_source("test_buffer", self.source))
+        code = renderer.render_cpp()
+        for name in ("Foo", "Bar"):
+            self.assertIn("static int cppy_getbuffer_%s(PyObject* arg0, Py_buffer* arg1, int arg2)" % name, code)
+            self.assertIn("static void cppy_releasebuffer_%s(PyObject* arg0, Py_buffer* arg1)" % name, code)
+            self.assertIn("static_cast<PyBufferProcs*>     (&%s_buffer_struct)" % name, code)
+        # the code of the base class is not repeated
+        self.assertEqual(2, code.count("return PyBuffer_FillInfo(arg1, arg0, self->v, sizeof(self->v), 0, arg2);"))
+        self.assertNotIn("Baz_buffer_struct", code)
+
+
+class TestFreelist(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        double v[3];
+    _CPP_(FREELIST):
+        %s
+    """
+'''
+
+    def test_freelist(self):
+        renderer = compiler.compile(load_module_source("test_freelist", self.source % "16"))
+        code = renderer.render_cpp()
+        self.assertIn("static Foo_struct* Foo_freelist[16];", code)
+        self.assertIn("o = Foo_freelist[--Foo_freelist_size];", code)
+        self.assertIn("if (Py_TYPE(self) == &Foo_type_struct && Foo_freelist_size < 16)", code)
+        self.assertIn("static_cast<freefunc>         (cppy_module_free_test_freelist)", code)
+        self.assertIn("void clear_freelist_Foo();", renderer.render_hpp())
+
+        code = compiler.compile(load_module_source("test_freelist", self.source % "0")).render_cpp()
+        self.assertNotIn("Foo_freelist", code)
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source("test_freelist", self.source % "many")).render_cpp()
+
+
+class TestMembers(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_(MEMBERS):
+        // comment; with semicolon
+        std::string name;
+        std::map<int, std::string> map;
+        long count = 23;
+    """
+
+class Bar(Foo):
+    """
+    _CPP_(MEMBERS):
+        $STRUCT(Foo)* foo = nullptr;
+    """
+'''
+
+    def test_members(self):
+        renderer = compiler.compile(load_module_source("test_members", self.source))
+        foo, bar = renderer.context.get_class("Foo"), renderer.context.get_class("Bar")
+        self.assertEqual([("std::string name", "name", ""),
+                          ("std::map<int, std::string> map", "map", ""),
+                          ("long count", "count", "23")], foo.get_members())
+        self.assertEqual(foo.get_members() + [("Foo_struct* foo", "foo", "nullptr")], bar.get_members())
+
+        hpp = renderer.render_hpp()
+        self.assertIn("#include <new>", hpp)
+        self.assertIn("union { std::map<int, std::string> map; };", hpp)
+        code = renderer.render_cpp()
+        self.assertIn("new (&count) decltype(count)(23);", code)
+        self.assertIn("{ typedef decltype(name) T; name.~T(); }", code)
+        self.assertIn("copy->foo = foo;", code)
+
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source(
+                "test_members", self.source.replace("std::string name;", "double v[3];"))).render_hpp()
+
+
+class TestAttributes(unittest.TestCase):
+
+    source = '''
+from typing import Final
+
+class Foo:
+    """
+    _CPP_:
+        int other;
+    """
+    x: float = 2
+    count: Final[int] = 3
+    flag: bool
+    ignored: list
+
+class Bar(Foo):
+    """
+    Derived class
+    """
+    y: "float"
+'''
+
+    def test_attributes(self):
+        for module in (load_module_source("test_attributes", self.source),
+                       scanner.load_source("test_attributes", self.source)):
+            renderer = compiler.compile(module)
+            foo, bar = renderer.context.get_class("Foo"), renderer.context.get_class("Bar")
+            self.assertEqual([("x", "float", False, "2.0"),
+                              ("count", "int", True, "3"),
+                              ("flag", "bool", False, "false")], foo.get_attributes())
+            self.assertEqual(foo.get_attributes() + [("y", "float", False, "0")], bar.get_attributes())
+
+            self.assertIn("long count;", renderer.render_hpp())
+            code = renderer.render_cpp()
+            self.assertIn("x = 2.0;", code)
+            self.assertIn("copy->y = y;", code)
+            self.assertIn('{ const_cast<char*>("count"), T_LONG, offsetof(Foo_struct, count), READONLY, NULL },', code)
+            self.assertIn('{ const_cast<char*>("y"), T_DOUBLE, offsetof(Bar_struct, y), 0, NULL },', code)
+            self.assertIn("static_cast<struct PyMemberDef*>(Bar_member_struct)", code)
+            self.assertNotIn("ignored", code)
+
+    def test_redeclared(self):
+        source = self.source + "    x: float = 5\n"
+        for module in (load_module_source("test_attributes", source),
+                       scanner.load_source("test_attributes", source)):
+            renderer = compiler.compile(module)
+            bar = renderer.context.get_class("Bar")
+            self.assertEqual([("x", "float", False, "5.0"),
+                              ("count", "int", True, "3"),
+                              ("flag", "bool", False, "false"),
+                              ("y", "float", False, "0")], bar.get_attributes())
+            self.assertEqual(2, renderer.render_hpp().count("double x;"))
+            self.assertIn("x = 5.0;", renderer.render_cpp())
+
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source("test_attributes", self.source + "    x: int = 5\n")).render_cpp()
+
+
+class TestStructLayout(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        int foo_decl;
+    _CPP_(MEMBERS):
+        std::string foo_member;
+    """
+    foo_attr: int = 1
+    def __hash__(self):
+        """
+        _CPP_(CACHED):
+            return 1;
+        """
+
+class Bar(Foo):
+    """
+    _CPP_:
+        int bar_decl;
+    _CPP_(MEMBERS):
+        std::string bar_member;
+    """
+    bar_attr: int = 2
+'''
+
+    def test_base_first(self):
+        """The struct of a derived class starts with the fields of the base struct"""
+        hpp = compiler.compile(load_module_source("test_layout", self.source)).render_hpp()
+        foo = hpp[hpp.index("struct Foo_struct\n"):]
+        foo = foo[:foo.index("void cppy_new();")]
+        bar = hpp[hpp.index("struct Bar_struct\n"):]
+        bar = bar[:bar.index("void cppy_new();")]
+        fields = ["foo_decl", "foo_member", "foo_attr", "cppy_hash", "bar_decl", "bar_member", "bar_attr"]
+        self.assertEqual(fields[:4], [f for f in fields if f in foo])
+        self.assertEqual(fields, sorted(fields, key=bar.index))
+        self.assertEqual(1, bar.count("cppy_hash;"))
+        self.assertEqual(2, compiler.compile(load_module_source("test_layout", self.source))
+                         .render_cpp().count("cppy_hash = -1;"))
+
+
+class TestRichCompare(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        long k;
+    """
+    def __eq__(self, other):
+        """
+        _CPP_:
+            Py_RETURN_TRUE;
+        """
+    def __lt__(self, other):
+        """
+        _CPP_:
+            Py_RETURN_FALSE;
+        """
+    def __hash__(self):
+        """
+        _CPP_(CACHED):
+            return self->k;
+        """
+
+class Bar:
+    """
+    _CPP_:
+        long k;
+    """
+    def __hash__(self):
+        """
+        _CPP_:
+            return self->k;
+        """
+'''
+
+    def test_richcompare(self):
+        renderer = compiler.compile(load_module_source("test_richcompare", self.source))
+        foo, bar = renderer.context.get_class("Foo"), renderer.context.get_class("Bar")
+        self.assertTrue(foo.has_richcompare_function())
+        self.assertFalse(bar.has_richcompare_function())
+        self.assertFalse(foo.get_function("__eq__").is_normal_function())
+
+        code = renderer.render_cpp()
+        self.assertIn("static PyObject* cppy_classmethod_Foo___lt__(PyObject* arg0, PyObject* arg1)", code)
+        self.assertIn("case Py_LT: return cppy_classmethod_Foo___lt__(arg0, arg1);", code)
+        self.assertIn("case Py_NE:", code)
+        self.assertIn("default: Py_RETURN_NOTIMPLEMENTED;", code)
+        self.assertIn("(cppy_richcompare_Foo)", code)
+        self.assertNotIn("cppy_richcompare_Bar", code)
+
+    def test_hash(self):
+        renderer = compiler.compile(load_module_source("test_richcompare", self.source))
+        foo, bar = renderer.context.get_class("Foo"), renderer.context.get_class("Bar")
+        self.assertTrue(foo.has_hash_cache())
+        self.assertFalse(bar.has_hash_cache())
+
+        hpp = renderer.render_hpp()
+        self.assertEqual(1, hpp.count("Py_hash_t cppy_hash;"))
+        code = renderer.render_cpp()
+        self.assertIn("static Py_hash_t cppy_classmethod_Foo___hash__(PyObject* arg0)", code)
+        self.assertIn("cppy_hash = -1;", code)
+        self.assertIn("self->cppy_hash = cppy_result;", code)
+        self.assertIn("static_cast<hashfunc>           (cppy_classmethod_Bar___hash__)", code)
+
+
+class TestIterator(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        long n;
+    _CPP_(ITER):
+        if (index >= self->n)
+            return NULL;
+        return PyLong_FromSsize_t(index);
+    """
+
+class Bar(Foo):
+    """
+    Derived class
+    """
+
+class Baz:
+    """
+    _CPP_:
+        long n;
+    """
+    def __iter__(self):
+        """
+        _CPP_:
+            Py_INCREF(arg0);
+            return arg0;
+        """
+    def __next__(self):
+        """
+        _CPP_:
+            return NULL;
+        """
+'''
+
+    def test_iterator(self):
+        renderer = compiler.compile(load_module_source("test_iterator", self.source))
+        foo, bar, baz = [renderer.context.get_class(n) for n in ("Foo", "Bar", "Baz")]
+        self.assertTrue(foo.has_iterator())
+        self.assertTrue(bar.has_iterator())
+        self.assertFalse(baz.has_iterator())
+
+        code = renderer.render_cpp()
+        self.assertIn("struct Bar_iterator_struct", code)
+        self.assertIn("static PyObject* cppy_iternext_Foo(PyObject* arg0)", code)
+        self.assertIn('("test_iterator.Foo_iterator")', code)
+        self.assertIn("static_cast<getiterfunc>        (cppy_iter_Bar)", code)
+        self.assertIn("PyType_Ready(&Foo_iterator_type_struct)", code)
+        self.assertIn("static_cast<getiterfunc>        (cppy_classmethod_Baz___iter__)", code)
+        self.assertIn("static_cast<iternextfunc>       (cppy_classmethod_Baz___next__)", code)
+        self.assertNotIn('"__next__"', code)
+
+
+class TestMapping(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        long n;
+    """
+    def __len__(self):
+        """
+        _CPP_:
+            return self->n;
+        """
+    def __getitem__(self, key):
+        """
+        _CPP_(MAPPING):
+            Py_INCREF(arg1);
+            return arg1;
+        """
+    def __delitem__(self, key):
+        """
+        _CPP_(MAPPING):
+            return 0;
+        """
+
+class Bar:
+    """
+    _CPP_:
+        long n;
+    """
+    def __len__(self):
+        """
+        _CPP_:
+            return self->n;
+        """
+    def __getitem__(self, index):
+        """
+        _CPP_:
+            return PyLong_FromSsize_t(arg1);
+        """
+'''
+
+    def test_mapping(self):
+        renderer = compiler.compile(load_module_source("test_mapping", self.source))
+        foo, bar = renderer.context.get_class("Foo"), renderer.context.get_class("Bar")
+        self.assertTrue(foo.is_mapping())
+        self.assertFalse(bar.is_mapping())
+        self.assertFalse(foo.has_sequence_function())
+        self.assertTrue(bar.has_sequence_function())
+        self.assertEqual("objobjproc", foo.get_function("__delitem__").get_function_type())
+        self.assertEqual("ssizeargfunc", bar.get_function("__getitem__").get_function_type())
+
+        code = renderer.render_cpp()
+        self.assertIn("static PyObject* cppy_classmethod_Foo___getitem__(PyObject* arg0, PyObject* arg1)", code)
+        self.assertIn("static int cppy_ass_subscript_Foo(PyObject* arg0, PyObject* arg1, PyObject* arg2)", code)
+        self.assertIn("static_cast<objobjargproc>(cppy_ass_subscript_Foo)", code)
+        self.assertIn("static_cast<PyMappingMethods*>  (&Foo_mapping_struct)", code)
+        self.assertNotIn("Foo_sequence_struct", code)
+        self.assertNotIn("Bar_mapping_struct", code)
+
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source(
+                "test_mapping", self.source.replace("_CPP_(MAPPING):\n            return 0;",
+                                                    "_CPP_:\n            return 0;"))).render_cpp()
+
+
+class TestNumber(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        double x;
+    """
+    def __add__(self, other):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        """
+    def __rsub__(self, other):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        """
+    def __pow__(self, other, mod):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        """
+    def __neg__(self):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        """
+    def __iadd__(self, other):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        """
+    def __matmul__(self, other):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        """
+'''
+
+    def test_number(self):
+        renderer = compiler.compile(load_module_source("test_number", self.source))
+        foo = renderer.context.get_class("Foo")
+        self.assertEqual("unaryfunc", foo.get_function("__neg__").get_function_type())
+        self.assertEqual("ternaryfunc", foo.get_function("__pow__").get_function_type())
+        self.assertEqual("binaryfunc", foo.get_function("__rsub__").get_function_type())
+        self.assertFalse(foo.get_function("__rsub__").is_normal_function())
+
+        code = renderer.render_cpp()
+        self.assertIn("static PyObject* cppy_nb_add_Foo(PyObject* arg0, PyObject* arg1)", code)
+        self.assertIn("return cppy_classmethod_Foo___add__(arg0, arg1);", code)
+        self.assertIn("return cppy_classmethod_Foo___rsub__(arg1, arg0);", code)
+        self.assertIn("return cppy_classmethod_Foo___pow__(arg0, arg1, arg2);", code)
+        self.assertIn("static_cast<binaryfunc> (cppy_nb_subtract_Foo)", code)
+        self.assertIn("static_cast<unaryfunc>  (cppy_classmethod_Foo___neg__)", code)
+        self.assertIn("static_cast<binaryfunc> (cppy_classmethod_Foo___iadd__)", code)
+        self.assertIn("#if PY_VERSION_HEX >= 0x03050000\n"
+                      "        /* nb_matrix_multiply */         static_cast<binaryfunc> (cppy_nb_matrix_multiply_Foo),",
+                      code)
+        self.assertNotIn("cppy_nb_multiply_Foo", code)
+        self.assertNotIn('"__rsub__"', code)
+
+
+class TestGC(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        PyObject* a;
+        PyObject* b;
+    _CPP_(TRAVERSE):
+        a, b // comment
+    """
+
+class Bar(Foo):
+    """
+    _CPP_:
+        $STRUCT(Foo)* foo;
+    _CPP_(TRAVERSE):
+        foo
+    """
+
+class Baz:
+    """
+    _CPP_:
+        PyObject* a;
+    """
+'''
+
+    def test_gc(self):
+        renderer = compiler.compile(load_module_source("test_gc", self.source))
+        foo, bar, baz = [renderer.context.get_class(n) for n in ("Foo", "Bar", "Baz")]
+        self.assertEqual(["a", "b"], foo.get_traverse_members())
+        self.assertEqual(["a", "b", "foo"], bar.get_traverse_members())
+        self.assertFalse(baz.has_gc())
+
+        code = renderer.render_cpp()
+        self.assertIn("static int cppy_traverse_Bar(PyObject* arg0, visitproc arg1, void* arg2)", code)
+        self.assertIn("Py_VISIT(self->foo);", code)
+        self.assertIn("Py_CLEAR(self->b);", code)
+        self.assertIn("(Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_HAVE_GC)", code)
+        self.assertIn("PyObject_GC_New(Foo_struct, &Foo_type_struct);", code)
+        self.assertIn("PyObject_New(Baz_struct, &Baz_type_struct);", code)
+        self.assertEqual(2, code.count("PyObject_GC_Track(o);"))
+        self.assertEqual(2, code.count("PyObject_GC_UnTrack(self);"))
+        self.assertNotIn("cppy_traverse_Baz", code)
+
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source(
+                "test_gc", self.source.replace("foo\n", "foo->x\n"))).render_cpp()
+
+
+class TestStrings(unittest.TestCase):
+
+    source = '''
+"""
+_CPP_:
+    static PyObject* get_name(PyObject* o) { return PyObject_GetAttr(o, $STR(__name__)); }
+"""
+def func(a):
+    """
+    _CPP_:
+        return PyObject_GetAttr(arg1, $str(value));
+    """
+
+class Foo:
+    """
+    _CPP_:
+        int a;
+    """
+    @property
+    def prop(self):
+        """
+        _CPP_:
+            return PyObject_GetAttr((PyObject*)self, $STR( value ));
+        _CPP_(SET):
+            return PyObject_SetAttr((PyObject*)self, $STR(other), arg1);
+        """
+
+    @prop.setter
+    def prop(self, v):
+        pass
+'''
+
+    def test_strings(self):
+        renderer = compiler.compile(load_module_source("test_strings", self.source))
+        self.assertEqual(["__name__", "other", "value"], renderer.context.strings)
+
+        code = renderer.render_cpp()
+        self.assertIn("static PyObject* cppy_str_value = nullptr;", code)
+        self.assertIn("PyObject_GetAttr(arg1, cppy_str_value);", code)
+        self.assertIn("PyObject_SetAttr((PyObject*)self, cppy_str_other, arg1);", code)
+        self.assertIn('cppy_str___name__ = PyUnicode_InternFromString("__name__");', code)
+        self.assertIn("if (!cppy_create_strings_test_strings())", code)
+        self.assertIn("Py_CLEAR(cppy_str_other);", code)
+        self.assertIn("static_cast<freefunc>         (cppy_module_free_test_strings)", code)
+
+        code = compiler.compile(load_module_source("test_strings", "")).render_cpp()
+        self.assertNotIn("cppy_str", code)
+        self.assertNotIn("cppy_module_free", code)
+
+        for bad in ("$STR()", "$STR(a, b)", "$STR(1a)"):
+            with self.assertRaises(ValueError):
+                compiler.compile(load_module_source("test_strings", self.source.replace("$STR(other)", bad)))
+
+    def test_multiphase_strings(self):
+        """Each module instance creates it's own strings in the module state"""
+        renderer = compiler.compile(load_module_source("test_strings", self.source))
+        renderer.multiphase = True
+        code = renderer.render_cpp()
+        self.assertIn("PyObject_GetAttr(arg1, cppy_get_state_test_strings(arg0)->cppy_str_value);", code)
+        self.assertIn("        PyObject* cppy_str_value;\n", code)
+        self.assertIn('state->cppy_str_value = PyUnicode_InternFromString("value");', code)
+        self.assertIn("Py_CLEAR(state->cppy_str_value);", code)
+        self.assertIn("{ Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED },", code)
+        self.assertNotIn("static PyObject* cppy_str_", code)
+        self.assertNotIn("cppy_create_strings_test_strings", code)
+
+
+class TestMultiphase(unittest.TestCase):
+
+    source = '''
+"""
+_CPP_(STATE):
+    long counter;
+    PyObject* cache;
+_CPP_(TRAVERSE):
+    cache
+"""
+def count():
+    """
+    _CPP_:
+        return PyLong_FromLong(++$STATE()->counter);
+    """
+
+class Foo:
+    """
+    _CPP_:
+        int a;
+    _CPP_(ITER):
+        return NULL;
+    _CPP_(FREELIST):
+        16
+    """
+    def copy(self):
+        """
+        _CPP_:
+            return (PyObject*)$NEW(Foo);
+        """
+
+class Goo(Foo):
+    """
+    A derived class
+    """
+'''
+
+    def test_multiphase(self):
+        renderer = compiler.compile(load_module_source("test_mp", self.source))
+        renderer.multiphase = True
+        foo = renderer.context.get_class("Foo")
+        self.assertEqual(0, foo.get_freelist_size())
+        self.assertIn("Foo_struct* create_Foo(PyTypeObject* type);", renderer.render_hpp())
+
+        code = renderer.render_cpp()
+        self.assertIn("long counter;\n        PyObject* cache;\n", code)
+        self.assertIn("PyTypeObject* Foo_iterator_type;", code)
+        self.assertIn("return PyLong_FromLong(++cppy_get_state_test_mp(arg0)->counter);", code)
+        self.assertIn("return (PyObject*)create_Foo(cppy_get_state_test_mp(arg0)->Foo_type);", code)
+        self.assertIn("{ Py_tp_new, (void*)new_Foo },", code)
+        self.assertIn("static PyType_Spec Foo_iterator_type_spec =", code)
+        self.assertIn("PyType_FromModuleAndSpec(module, &Goo_type_spec, "
+                      "reinterpret_cast<PyObject*>(state->Foo_type))", code)
+        self.assertIn("Py_VISIT(state->cache);", code)
+        self.assertIn("Py_CLEAR(state->Goo_type);", code)
+        self.assertIn("static_cast<Py_ssize_t>       (sizeof(cppy_state_test_mp))", code)
+        self.assertIn("{ Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED },", code)
+        self.assertIn("return PyModuleDef_Init(&cppy_module_test_mp);", code)
+        self.assertNotIn("PyModule_Create", code)
+        self.assertNotIn("Foo_type_struct", code)
+        self.assertNotIn("Foo_freelist", code)
+        # base classes are created first
+        self.assertLess(code.index("if (!initialize_class_Foo(arg0))"), code.index("if (!initialize_class_Goo(arg0))"))
+
+    def test_state_requires_multiphase(self):
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source("test_mp", self.source)).render_cpp()
+        source = self.source.replace("_CPP_(STATE)", "_CPP_").replace("_CPP_(TRAVERSE):\n    cache\n", "")
+        with self.assertRaises(ValueError):
+            compiler.compile(load_module_source("test_mp", source)).render_cpp()
+        code = compiler.compile(load_module_source("test_mp", source.replace("$STATE()->", ""))).render_cpp()
+        self.assertIn("return (PyObject*)create_Foo();", code)
+        self.assertNotIn("cppy_state_test_mp", code)
+
+
+class TestProfile(unittest.TestCase):
+
+    source = '''
+def func(a):
+    """
+    _CPP_:
+        return arg1;
+    """
+
+class Foo:
+    """
+    _CPP_:
+        int x;
+    """
+    def __len__(self):
+        """
+        _CPP_:
+            return 0;
+        """
+
+    @property
+    def prop(self):
+        """
+        _CPP_:
+            Py_RETURN_NONE;
+        _CPP_(SET):
+            return 0;
+        """
+
+    @prop.setter
+    def prop(self, v):
+        pass
+'''
+
+    def test_profile(self):
+        renderer = compiler.compile(load_module_source("test_profile", self.source))
+        code = renderer.render_cpp()
+        self.assertNotIn("cppy_profile", code)
+        self.assertNotIn("<chrono>", code)
+
+        renderer.profile = True
+        code = renderer.render_cpp()
+        self.assertIn('{ "func", "<test_profile>:2", {0}, {0} },', code)
+        self.assertIn('{ "Foo.__len__", "<test_profile>:13", {0}, {0} },', code)
+        self.assertIn('{ "Foo.prop (get)", "<test_profile>:19", {0}, {0} },', code)
+        self.assertIn('{ "Foo.prop (set)", "<test_profile>:19", {0}, {0} },', code)
+        # the counters are atomic for free-threaded builds
+        self.assertIn("std::atomic<unsigned long long> calls;", code)
+        self.assertIn("entry.calls.fetch_add(1, std::memory_order_relaxed);", code)
+        self.assertIn("cppy_profile_scope cppy_profile_scope_(cppy_profile_test_profile[0]);\n"
+                      "    return arg1;", code)
+        self.assertIn("cppy_profile_scope cppy_profile_scope_(cppy_profile_test_profile[3]);\n"
+                      "        Foo_struct* self", code)
+        self.assertIn('{ "cppy_profile_stats", reinterpret_cast<PyCFunction>(cppy_module_profile_stats_test_profile), '
+                      'METH_VARARGS, cppy_module_profile_stats_test_profile_doc },', code)
+
+        # the table is shared by all interpreters
+        renderer.multiphase = True
+        code = renderer.render_cpp()
+        self.assertIn("{ Py_mod_multiple_interpreters, Py_MOD_MULTIPLE_INTERPRETERS_SUPPORTED },", code)
+
+    def test_no_functions(self):
+        renderer = compiler.compile(load_module_source("test_profile", "class Foo:\n    \"\"\"_CPP_:\n    int x;\"\"\""))
+        renderer.profile = True
+        code = renderer.render_cpp()
+        self.assertIn("cppy_profile_entry cppy_profile_test_profile[] =\n    {\n        { nullptr, nullptr, {0}, {0} }", code)
+        self.assertIn("(static_cast<PyMethodDef*>(cppy_module_methods_test_profile))", code)
+
+
+class TestShards(unittest.TestCase):
+
+    def test_shards(self):
+        renderer = compiler.compile(make_module(5, 2))
+        self.assertRaises(ValueError, renderer.render_shards)
+        self.assertIn("static PyTypeObject Class0_type_struct =", renderer.render_cpp())
+
+        renderer.shards = 3
+        shards = renderer.render_shards()
+        self.assertEqual(3, len(shards))
+        for c in renderer.classes:
+            self.assertEqual(1, sum("/* #################### class %s ####" % c.name in i for i in shards))
+            self.assertEqual(1, sum("\n    PyTypeObject %s =" % c.type_struct_name in i for i in shards))
+        self.assertIn('#include "bench_5_2_private.h"', shards[0])
+
+        root = renderer.render_cpp()
+        self.assertIn('#include "bench_5_2_private.h"', root)
+        self.assertNotIn("#### class", root)
+        self.assertIn("static PyModuleDef cppy_module_bench_5_2 =", root)
+        self.assertIn("initialize_class_Class4(module);", root)
+
+        private = renderer.render_private_hpp()
+        self.assertIn("extern PyTypeObject Class0_type_struct;", private)
+        self.assertIn("bool initialize_class_Class0(void* vmodule);", private)
+        self.assertNotIn("cppy_module_methods_bench_5_2", private)
+
+    def test_groups(self):
+        renderer = compiler.compile(make_module(5, 2))
+        renderer.shards = 2
+        self.assertEqual([renderer.classes[:3], renderer.classes[3:]], renderer._get_shard_groups())
+        renderer.shards = 10
+        self.assertEqual([[i] for i in renderer.classes], renderer._get_shard_groups())
+        renderer.profile = True
+        renderer.shards = 3
+        self.assertEqual([renderer.classes[:2], renderer.classes[2:4], renderer.classes[4:] + [None]],
+                         renderer._get_shard_groups())
+        self.assertIn("global functions", renderer.render_shards()[-1])
+
+    def test_private_data(self):
+        renderer = compiler.compile(load_module_source("test_shards", TestStrings.source))
+        renderer.shards = 2
+        renderer.profile = True
+        private = renderer.render_private_hpp()
+        self.assertIn("namespace cppy_private_test_shards {", private)
+        self.assertIn("extern PyObject* cppy_str_value;", private)
+        self.assertIn("extern cppy_profile_entry cppy_profile_test_shards[];", private)
+        self.assertIn("extern PyMethodDef cppy_module_methods_test_shards[];", private)
+        root = renderer.render_cpp()
+        self.assertIn("    PyObject* cppy_str_value = nullptr;", root)
+        self.assertIn("cppy_profile_entry cppy_profile_test_shards[] =", root)
+        self.assertNotIn("static PyObject* cppy_str_", "".join(renderer.render_shards()))
+
+        # the strings are members of the module state
+        renderer.multiphase = True
+        private = renderer.render_private_hpp()
+        self.assertIn("    cppy_state_test_shards* cppy_get_state_test_shards(PyObject* arg);", private)
+        self.assertIn("PyObject* cppy_str_value;", private)
+        self.assertNotIn("extern PyObject* cppy_str_value;", private)
+        root = renderer.render_cpp()
+        self.assertIn("\n    cppy_state_test_shards* cppy_get_state_test_shards(PyObject* arg)\n", root)
+        self.assertNotIn("cppy_str_value = nullptr;", root)
+        self.assertIn("cppy_get_state_test_shards(arg0)->cppy_str_value", "".join(renderer.render_shards()))
+
+
+class TestSplitHeader(unittest.TestCase):
+
+    def test_split_header(self):
+        renderer = compiler.compile(load_module_source("test_split", TestContext.source))
+        renderer.split_header = True
+        renderer.stamp = None
+        hpp = renderer.render_hpp()
+        self.assertEqual('/* generated by cppy */\n\n#include "test_split_types.h"\n#include "test_split_api.h"\n', hpp)
+
+        types = renderer.render_types_hpp()
+        self.assertIn("#include <python3.4/Python.h>", types)
+        self.assertIn("    struct Baz_struct;\n    struct Foo_struct;\n", types)
+        self.assertIn("    struct Baz_struct\n    {", types)
+        self.assertNotIn("create_Foo", types)
+        self.assertNotIn("initialize_module_", types)
+
+        api = renderer.render_api_hpp()
+        self.assertNotIn("#include", api)
+        self.assertNotIn("PyTypeObject", api)
+        self.assertIn("typedef struct _object PyObject;", api)
+        self.assertIn("bool initialize_module_test_split();", api)
+        self.assertIn("    Foo_struct* create_Foo();\n", api)
+        self.assertIn("    bool is_Baz(PyObject* arg);\n", api)
+        self.assertNotIn("Baz_struct\n", api)
+
+        renderer.multiphase = True
+        self.assertIn("typedef struct _typeobject PyTypeObject;", renderer.render_api_hpp())
+
+    def test_include(self):
+        renderer = compiler.compile(load_module_source("test_split", TestContext.source))
+        self.assertIn("\n#include <python3.4/Python.h>\n", renderer.render_cpp())
+        renderer.split_header = True
+        # the types header is included first, as required for precompiled headers
+        self.assertIn('\n#include "test_split_types.h"\n#include <python3.4/structmember.h>\n',
+                      renderer.render_cpp())
+        renderer.shards = 2
+        self.assertIn('\n#include "test_split_types.h"\n#include "test_split_private.h"\n',
+                      renderer.render_shards()[0])
+
+
+class TestOutput(unittest.TestCase):
+
+    def _test_output(self, renderer, name):
+        for ext, code in (("h", renderer.render_hpp()), ("cpp", renderer.render_cpp())):
+            with open(os.path.join(TEST_DATA_PATH, "%s.%s" % (name, ext))) as f:
+                self.assertEqual(f.read(), code)
+
+    def test_unchanged_output(self):
+        renderer = compiler.compile(make_module(3, 2))
+        renderer.namespaces = ["cppy_test"]
+        renderer.stamp = None
+        self._test_output(renderer, "bench_3_2")
+
+    def test_stamp(self):
+        renderer = compiler.compile(make_module(3, 2))
+        self.assertIn("/* generated by cppy on ", renderer.render_hpp())
+        renderer.stamp = None
+        self.assertTrue(renderer.render_cpp().startswith("\n/* generated by cppy */\n"))
+        renderer.stamp = "hash"
+        hpp = renderer.render_hpp()
+        self.assertTrue(hpp.startswith("/* generated by cppy, content hash "))
+        self.assertEqual(hpp, renderer.render_hpp())
+        renderer.h_footer = "// changed"
+        self.assertNotEqual(hpp.split("\n")[0], renderer.render_hpp().split("\n")[0])
+
+
+class TestCache(unittest.TestCase):
+
+    source = '''
+class Foo:
+    """
+    _CPP_:
+        int x;
+    """
+    def bar(self):
+        """
+        _CPP_:
+            return %s;
+        """
+    def baz(self):
+        """
+        _CPP_:
+            return NULL;
+        """
+'''
+
+    def _render(self, directory, body):
+        renderer = compiler.compile(load_module_source("test_cache", self.source % body))
+        cache = renderer.use_cache(directory)
+        renderer.stamp = None
+        code = renderer.render_hpp() + renderer.render_cpp()
+        renderer.save_cache()
+        return code, cache
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            code1, cache = self._render(directory, "NULL")
+            self.assertEqual(0, cache.hits)
+            code2, cache = self._render(directory, "NULL")
+            self.assertEqual(0, cache.misses)
+            self.assertEqual(code1, code2)
+            # only the class and the changed function are rendered again
+            code3, cache = self._render(directory, "Py_None")
+            self.assertIn("return Py_None;", code3)
+            self.assertEqual(code1, code3.replace("return Py_None;", "return NULL;"))
+            # forwards, python_api and impl of baz()
+            self.assertEqual(3, cache.hits)
+
+    def test_write_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.h")
+            self.assertTrue(Renderer.write_to_file(filename, "code"))
+            self.assertFalse(Renderer.write_to_file(filename, "code"))
+            self.assertTrue(Renderer.write_to_file(filename, "code2"))
+
+
+class TestScanner(unittest.TestCase):
+
+    source = '''"""
+Module doc
+"""
+%(imports)s
+
+def func(a, b=%(value)s, *args, c%(annotation)s=None):
+    """
+    _CPP_:
+        return NULL;
+    """
+    return a
+
+class Foo:
+    """
+    _CPP_:
+        int x;
+    """
+    member = %(value)s
+    negative: int = -1
+    scaled: float = 2 * 3.5
+
+    @%(decorator)s
+    def bar(self, other):
+        """
+        _CPP_:
+            return $COPY(self);
+        """
+
+    @property
+    def prop(self):
+        """
+        _CPP_:
+            return NULL;
+        _CPP_(SET):
+            return 0;
+        """
+    @prop.setter
+    def prop(self, v):
+        pass
+
+class Baz(Foo):
+    pass
+'''
+
+    # can not be imported
+    static_source = source % {
+        "imports": "import not_installed; raise RuntimeError('must not be executed')",
+        "value": "not_installed.value",
+        "annotation": ": not_installed.Type",
+        "decorator": "not_installed.decorator",
+    }
+
+    def test_no_import(self):
+        module = scanner.load_source("test_scanner", self.static_source, "test_scanner.py")
+        self.assertEqual(["Baz", "Foo", "func"], [n for n in dir(module) if not n.startswith("__")])
+        self.assertIsInstance(module.Foo.prop, property)
+        self.assertTrue(issubclass(module.Baz, module.Foo))
+        module = scanner.load_source("test_scanner", "import a\nclass Foo(Missing, a.Other):\n    pass\n")
+        self.assertEqual(["Missing", "Other"], [b.__name__ for b in module.Foo.__bases__])
+        with self.assertRaises(ValueError):
+            scanner.load_source("test_scanner", "class Foo:\n    x: int = not_installed.value\n")
+
+    def test_attribute_values(self):
+        module = scanner.load_source("test_scanner", "class Foo:\n    x: float = -2 * 3.5 + 7 // 2\n    y: str = 'y'\n")
+        self.assertEqual(-4.0, module.Foo.x)
+        self.assertEqual("y", module.Foo.y)
+        # expressions that do not finish, raise or are not restricted to numbers are rejected
+        for value in ("9 ** 9 ** 9", "1 << 100000000", "1 / 0", "5 % 0", "~1.5", "'x' * 1000", "-'x'"):
+            with self.assertRaises(ValueError):
+                scanner.load_source("test_scanner", "class Foo:\n    x: int = %s\n" % value)
+
+    def test_same_output(self):
+        source = self.source % {
+            "imports": "",
+            "value": "None",
+            "annotation": "",
+            "decorator": "staticmethod",
+        }
+        r1 = compiler.compile(load_module_source("test_scanner", source))
+        r2 = compiler.compile(scanner.load_source("test_scanner", self.static_source, "<test_scanner>"))
+        r1.stamp = r2.stamp = None
+        self.assertEqual(r1.render_hpp(), r2.render_hpp())
+        self.assertEqual(r1.render_cpp(), r2.render_cpp())
+        self.assertIn("negative = -1;", r2.render_cpp())
+        self.assertIn("scaled = 7.0;", r2.render_cpp())
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_generate_all(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "manifest.txt"), "w") as f:
+                f.write("# comment\n\ngood.py\nbad.py\ngood.py other\n")
+            with open(os.path.join(directory, "good.py"), "w") as f:
+                f.write(TestContext.source)
+            with open(os.path.join(directory, "bad.py"), "w") as f:
+                f.write("raise ImportError\n")
+            modules = batch.read_manifest(os.path.join(directory, "manifest.txt"))
+            self.assertEqual([(os.path.join(directory, "good.py"), None),
+                              (os.path.join(directory, "bad.py"), None),
+                              (os.path.join(directory, "good.py"), "other")], modules)
+
+            results = batch.generate_all([{"module_file": m, "out_name": n, "options": {"stamp": None}}
+                                          for m, n in modules], processes=1)
+            self.assertNotIn("error", results[0])
+            self.assertIn("ImportError", results[1]["error"])
+            self.assertEqual([os.path.join(directory, "other.h"), os.path.join(directory, "other.cpp")],
+                             results[2]["files"])
+            for filename in results[0]["files"] + results[2]["files"]:
+                self.assertTrue(os.path.exists(filename))
+
+            results = batch.generate_all([{"module_file": modules[0][0], "options": {"shards": 2}},
+                                          {"module_file": modules[0][0], "options": {"unknown": True}}],
+                                         processes=1)
+            self.assertIn(os.path.join(directory, "good_2.cpp"), results[0]["files"])
+            self.assertIn("Unknown renderer options unknown", results[1]["error"])
+
+    def test_same_module_name(self):
+        """Modules with the same name in different directories are loaded separately"""
+        with tempfile.TemporaryDirectory() as directory:
+            jobs = []
+            for sub, func in (("a", "fa"), ("b", "fb")):
+                os.mkdir(os.path.join(directory, sub))
+                jobs.append({"module_file": os.path.join(directory, sub, "mod.py")})
+                with open(jobs[-1]["module_file"], "w") as f:
+                    f.write('def %s():\n    """\n    _CPP_:\n        return NULL;\n    """\n' % func)
+            for result in batch.generate_all(jobs, processes=1):
+                self.assertNotIn("error", result)
+            self.assertNotIn("mod", sys.modules)
+            with open(os.path.join(directory, "b", "mod.cpp")) as f:
+                code = f.read()
+            self.assertIn("cppy_fb", code)
+            self.assertNotIn("cppy_fa", code)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_profiler(self):
+        profiler = Profiler()
+        renderer = compiler.compile(make_module(3, 2), profiler)
+        renderer.stamp = None
+        code = renderer.render_hpp() + renderer.render_cpp()
+        for stage in ("inspect_module", "inspect_class", "inspect_function", "finalize", "format_cpp",
+                      "Class.render_python_api", "Class._render_type_struct", "Function.render_python_api",
+                      "Renderer.render_hpp", "Renderer.render_cpp"):
+            self.assertIn(stage, profiler.stages)
+        self.assertEqual(3, profiler.stages["inspect_class"][0])
+        self.assertEqual(3, profiler.stages["Class.render_python_api"][0])
+        self.assertIn("Class(Class0)", profiler.objects)
+        self.assertIn("Function(Class1.method1)", profiler.objects)
+        # own times add up to the time of the outermost stages
+        outer = sum(profiler.stages[i][1] for i in ("inspect_module", "finalize",
+                                                    "Renderer.render_hpp", "Renderer.render_cpp"))
+        self.assertAlmostEqual(outer, profiler.total_time(), places=6)
+
+        renderer = compiler.compile(make_module(3, 2))
+        renderer.stamp = None
+        self.assertEqual(code, renderer.render_hpp() + renderer.render_cpp())
+
+    def test_report_and_trace(self):
+        import io, json
+        profiler = Profiler()
+        compiler.compile(make_module(2, 1), profiler).render_cpp()
+        other = Profiler()
+        compiler.compile(make_module(1, 1), other)
+        calls = profiler.stages["inspect_class"][0]
+        profiler.merge(other)
+        self.assertEqual(calls + 1, profiler.stages["inspect_class"][0])
+
+        out = io.StringIO()
+        profiler.report(out, limit=2)
+        self.assertIn("Renderer.render_cpp", out.getvalue())
+        self.assertIn("# code objects by own time (2 of ", out.getvalue())
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "trace.json")
+            profiler.save_trace(filename)
+            with open(filename) as f:
+                events = json.load(f)["traceEvents"]
+        self.assertEqual(len(profiler.events), len(events))
+        self.assertEqual({"X"}, set(e["ph"] for e in events))
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_call_module(self):
+        """The call benchmarks cover each calling convention and slot in every build variant"""
+        for variant, settings in benchmarks.build_variants():
+            renderer = compiler.compile(load_module_source("cppy_calls", benchmarks.CALL_MODULE_SOURCE))
+            for key in settings:
+                setattr(renderer, key, settings[key])
+            code = renderer.render_cpp()
+            for flag in ("METH_NOARGS", "METH_O"):
+                self.assertIn(flag, code)
+            self.assertIn("METH_FASTCALL" if renderer.fastcall else "METH_VARARGS", code)
+            for slot in ("tp_init", "nb_add", "sq_length", "sq_item", "getset"):
+                self.assertIn(slot, code, variant)
 
+    def test_build_command(self):
+        cmd = benchmarks.build_command(["a.cpp", "b.cpp"], "a.out", ["include"])
+        self.assertIn("-Iinclude", cmd)
+        self.assertEqual(["a.cpp", "b.cpp"], cmd[cmd.index("a.cpp"):cmd.index("b.cpp") + 1])
+        self.assertTrue([i for i in cmd if i.startswith("-lpython")])
 
 
 if __name__ == "__main__":
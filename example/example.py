@@ -26,13 +26,21 @@ def func_a():
 
 def func_add(a, b):
     """
-    func_add(float, float) -> float
+    func_add(a: float, b: float) -> float
     Adds two numbers
     _CPP_:
-    double a, b;
-    if (!PyArg_ParseTuple(arg1, "dd", &a, &b))
-        return NULL;
-    return toPython(a+b);
+    // the typed signature above converts the arguments and the return value
+    return a + b;
+    """
+    pass
+
+def func_name(obj):
+    """
+    func_name(obj) -> str
+    Returns obj.__name__
+    _CPP_:
+    // STR(name) is an interned string, created once when the module is loaded
+    return PyObject_GetAttr(arg1, $STR(__name__));
     """
     pass
 
@@ -41,29 +49,37 @@ class Abel:
     """
     An example to create an embedded class object
 
-    _CPP_:
-        // These are the C members of the class
-        // (Since we are in 'C namespace' they are not constructed by default!)
-        std::string* data;
-        long justice;
+    _CPP_(MEMBERS):
+        // These are c++ members, stored inside the object.
+        // They are constructed in place when the object is created, destroyed when it's freed
+        // and copied with the assignment operator, one declaration per member
+        std::string data;
 
     _CPP_(NEW):
-        // When object is created we have to initialize all members ourselves
-        data = new std::string();
-        justice = 23;
+        // When object is created we have to initialize all C members ourselves
+        // (Since we are in 'C namespace' they are not constructed by default!)
         // template tags make life easier
         // $NAME() resolves to Abel or Kain, when Kain is derived from Abel
         CPPY_PRINT("NEW $NAME()");
 
     _CPP_(FREE):
         CPPY_PRINT("FREE $NAME()");
-        delete data;
 
-    _CPP_(COPY):
-        // A low-level copy function you can use later
-        // should copy all members to instance 'copy'
-        *copy->data = *data;
+    _CPP_(ITER):
+        // Iterates over the characters, e.g. list(Abel("abc"))
+        // 'self' is the instance and 'index' the position, NULL ends the iteration
+        if (index >= (Py_ssize_t)self->data.size())
+            return NULL;
+        return toPython(self->data.substr(index, 1));
+
+    _CPP_(GETBUFFER):
+        // Read-only access to the bytes of the string, e.g. memoryview(Abel("x"))
+        // 'arg1' is the Py_buffer to fill and 'arg2' the flags
+        return PyBuffer_FillInfo(arg1, arg0, &self->data[0], self->data.size(), 1, arg2);
     """
+    # Typed attributes become C members of the struct, initialized with the value.
+    # Python accesses them directly, with type checks but without any c function
+    justice: int = 23
     member = 1.
     def __init__(self, arg):
         """
@@ -73,7 +89,7 @@ class Abel:
             // so 'arg1' is always a tuple and 'arg2' is a dict with keywords
             arg1 = removeArgumentTuple(arg1);
             // if we got a string, that's fine
-            if (fromPython(arg1, self->data))
+            if (fromPython(arg1, &self->data))
                 return 0;
             // An empty argument is also acceptable
             if (PyTuple_Check(arg1) && PyTuple_Size(arg1) == 0)
@@ -90,12 +106,33 @@ class Abel:
         """
         Test for equality of content
         _CPP_:
+            // All comparisons go into one rich-compare function of the type.
+            // Returning NotImplemented lets python try the other object.
+            // != is the negation of == unless __ne__ is defined.
             if (!$IS_INSTANCE(arg1))
-            {
-                setPythonError(PyExc_TypeError, SStream() << "Expected $NAME(), got " << typeName(arg1));
-                return NULL;
-            }
-            return toPython(*self->data == *($CAST(arg1)->data));
+                Py_RETURN_NOTIMPLEMENTED;
+            return toPython(self->data == $CAST(arg1)->data);
+        """
+        pass
+
+    def __lt__(self, other):
+        """
+        Compares the content, which makes the objects sortable
+        _CPP_:
+            if (!$IS_INSTANCE(arg1))
+                Py_RETURN_NOTIMPLEMENTED;
+            return toPython(self->data < $CAST(arg1)->data);
+        """
+        pass
+
+    def __hash__(self):
+        """
+        Hash of the content, for use as dict key
+        _CPP_:
+            // Immutable classes can use _CPP_(CACHED) instead,
+            // to compute the hash only once per instance
+            Py_hash_t h = std::hash<std::string>()(self->data);
+            return h == -1 ? -2 : h;
         """
         pass
 
@@ -109,7 +146,48 @@ class Abel:
     def __str__(self):
         """
         _CPP_:
-            return SStream() << "$NAME()(\\"" << *self->data << "\\")";
+            return SStream() << "$NAME()(\\"" << self->data << "\\")";
+        """
+        pass
+
+    def __len__(self):
+        """
+        _CPP_:
+            return self->data.size();
+        """
+        pass
+
+    def __getitem__(self, key):
+        """
+        Returns a character or a slice of the content
+        _CPP_(MAPPING):
+            // With _CPP_(MAPPING) the class implements the mapping protocol
+            // and 'arg1' is the key as python object, e.g. an int or a slice
+            Py_ssize_t len = self->data.size();
+            if (PySlice_Check(arg1))
+            {
+                Py_ssize_t start, stop, step, slicelength;
+                if (0 != PySlice_GetIndicesEx(arg1, len, &start, &stop, &step, &slicelength))
+                    return NULL;
+                // a range is copied in one call
+                if (step == 1)
+                    return toPython(self->data.substr(start, slicelength));
+                std::string s;
+                for (Py_ssize_t i = 0; i < slicelength; ++i)
+                    s += self->data[start + i * step];
+                return toPython(s);
+            }
+            Py_ssize_t i = PyNumber_AsSsize_t(arg1, PyExc_IndexError);
+            if (i == -1 && PyErr_Occurred())
+                return NULL;
+            if (i < 0)
+                i += len;
+            if (i < 0 || i >= len)
+            {
+                PyErr_SetString(PyExc_IndexError, "$NAME() index out of range");
+                return NULL;
+            }
+            return toPython(self->data.substr(i, 1));
         """
         pass
 
@@ -127,7 +205,7 @@ class Abel:
         set(string) -> self
         Sets the contents of the object
         _CPP_:
-            if (!expectFromPython(arg1, self->data))
+            if (!expectFromPython(arg1, &self->data))
                 return NULL;
             Py_RETURN_SELF;
         """
@@ -143,24 +221,12 @@ class Abel:
         """
         pass
 
-    @property
-    def justice(self):
-        """
-        _CPP_:
-            return toPython(self->justice);
-        _CPP_(SET):
-            // Use ^ this annotation to implement the setter code
-            if (!expectFromPython(arg1, &self->justice))
-                return -1;
-            return 0; // setters have a special return type as well
-        """
-
     def get(self):
         """
         get() -> string
         Returns the contents as string
         _CPP_:
-            return toPython(*self->data);
+            return toPython(self->data);
         """
 
     def spawn(self):
@@ -168,7 +234,7 @@ class Abel:
         Spawn new instance of a Kain
         _CPP_:
             auto k = $NEW(Kain);
-            *k->data = "from_" + *self->data;
+            k->data = "from_" + self->data;
             k->setAbel(self);
             // k is of type $STRUCT(Kain), we need to cast to PyObject* on return
             return (PyObject*)k;
@@ -199,6 +265,11 @@ class Kain(Abel):
         copy->abel = abel;
         Py_XINCREF(copy->abel);
 
+    _CPP_(TRAVERSE):
+        // Members that hold a reference to a python object.
+        // They are visited by the garbage collector, so reference cycles can be freed
+        abel
+
     """
     def __init__(self):
         """
@@ -207,7 +278,7 @@ class Kain(Abel):
             if (!PyArg_ParseTuple(arg1, "|OO", &a1, &a2))
                 return -1;
 
-            if (a1 && !expectFromPython(a1, self->data))
+            if (a1 && !expectFromPython(a1, &self->data))
                 return -1;
 
             if (a2)
@@ -227,19 +298,43 @@ class Kain(Abel):
         """
         Slays Abel
         _CPP_:
-            std::string s = SStream() << "Kain(" << *self->data << ") slew Abel("
-                       << (self->abel ? *self->abel->data : std::string()) << ")";
+            std::string s = SStream() << "Kain(" << self->data << ") slew Abel("
+                       << (self->abel ? self->abel->data : std::string()) << ")";
             CPPY_PRINT(s);
             return toPython(s);
         """
         pass
 
+    @property
+    def abel(self):
+        """
+        The Abel that is slain by Kain, or None
+        _CPP_:
+            if (!self->abel)
+                Py_RETURN_NONE;
+            Py_INCREF(self->abel);
+            return reinterpret_cast<PyObject*>(self->abel);
+        _CPP_(SET):
+            if (arg1 && arg1 != Py_None && !$IS_INSTANCE(arg1, Abel))
+            {
+                setPythonError(PyExc_TypeError, SStream() << "Expected Abel, got " << typeName(arg1));
+                return -1;
+            }
+            self->setAbel(arg1 && arg1 != Py_None ? $CAST(arg1, Abel) : nullptr);
+            return 0;
+        """
+        pass
+
+    @abel.setter
+    def abel(self, a):
+        pass
+
     def spawn(self):
         """
         Spawn new instance of an Abel
         _CPP_:
             auto a = $NEW(Abel);
-            *a->data = "from_" + *self->data;
+            a->data = "from_" + self->data;
             return (PyObject*)a;
         """
 
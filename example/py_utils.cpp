@@ -259,10 +259,16 @@ void dumpObject(PyObject* arg, bool introspect)
             CPPY__PRINT(arg->ob_type->tp_itemsize);
 
             CPPY__PRINT(arg->ob_type->tp_dealloc);
+#if PY_VERSION_HEX < 0x03080000
             CPPY__PRINT(arg->ob_type->tp_print);
+#endif
             CPPY__PRINT(arg->ob_type->tp_getattr);
             CPPY__PRINT(arg->ob_type->tp_setattr);
+#if PY_VERSION_HEX < 0x03050000
             CPPY__PRINT(arg->ob_type->tp_reserved);
+#else
+            CPPY__PRINT(arg->ob_type->tp_as_async);
+#endif
             CPPY__PRINT(arg->ob_type->tp_repr);
             CPPY__PRINT(arg->ob_type->tp_as_number);
             CPPY__PRINT(arg->ob_type->tp_as_sequence);
@@ -8,6 +8,11 @@ class TestExample(unittest.TestCase):
         self.assertEqual(5., func_add(2,3))
         self.assertEqual(27., func_add(13,14))
 
+    def test_strings(self):
+        self.assertEqual("Abel", func_name(Abel))
+        with self.assertRaises(AttributeError):
+            func_name(Abel())
+
     def test_init(self):
         self.assertIsInstance(Abel(), Abel)
         self.assertIsInstance(Kain(), Kain)
@@ -37,6 +42,77 @@ class TestExample(unittest.TestCase):
         self.assertEqual("Abel(\"Bro\")", str(Abel("Bro")))
         self.assertEqual("Kain(\"Sis\")", str(Kain("Sis")))
 
+    def test_compare(self):
+        self.assertEqual(Abel("a"), Abel("a"))
+        self.assertNotEqual(Abel("a"), Abel("b"))
+        self.assertNotEqual(Abel("a"), "a")
+        self.assertTrue(Abel("a") < Abel("b"))
+        self.assertTrue(Abel("b") > Abel("a"))
+        self.assertEqual(["a", "b", "c"], [x.get() for x in sorted([Abel("c"), Abel("a"), Abel("b")])])
+        with self.assertRaises(TypeError):
+            Abel("a") <= Abel("b")
+
+    def test_hash(self):
+        self.assertEqual(hash(Abel("a")), hash(Abel("a")))
+        d = { Abel("a"): 1, Abel("b"): 2 }
+        self.assertEqual(2, d[Abel("b")])
+        self.assertEqual(2, len({ Abel("a"), Abel("a"), Abel("b") }))
+
+    def test_base_and_derived(self):
+        """The functions of Abel work on Kain instances, which start with the fields of Abel"""
+        self.assertEqual(Abel("world"), Kain("world"))
+        self.assertEqual(Kain("world"), Abel("world"))
+        self.assertTrue(Abel("a") < Kain("b"))
+        self.assertEqual(hash(Abel("a")), hash(Kain("a")))
+        self.assertEqual(1, len({ Abel("a"), Kain("a") }))
+        self.assertEqual(2, { Abel("a"): 1, Kain("b"): 2 }[Abel("b")])
+        k = Kain("x")
+        self.assertEqual(23, k.justice)
+        k.justice = 5
+        self.assertEqual(5, k.justice)
+        self.assertEqual(23, Abel("x").justice)
+        self.assertEqual("x", k.get())
+
+    def test_iter(self):
+        self.assertEqual(["a", "b", "c"], list(Abel("abc")))
+        self.assertEqual(["x"], list(Kain("x")))
+        self.assertEqual([], list(Abel()))
+        it = iter(Abel("a"))
+        self.assertIs(it, iter(it))
+        self.assertEqual("a", next(it))
+        with self.assertRaises(StopIteration):
+            next(it)
+
+    def test_subscript(self):
+        a = Abel("hello")
+        self.assertEqual(5, len(a))
+        self.assertEqual("e", a[1])
+        self.assertEqual("o", a[-1])
+        self.assertEqual("el", a[1:3])
+        self.assertEqual("hlo", a[::2])
+        self.assertEqual("olleh", Kain("hello")[::-1])
+        with self.assertRaises(IndexError):
+            a[5]
+        with self.assertRaises(TypeError):
+            a["x"]
+
+    def test_gc(self):
+        import gc
+        self.assertTrue(gc.is_tracked(Kain()))
+        self.assertFalse(gc.is_tracked(Abel()))
+        k = Kain("cycle")
+        k.abel = k
+        self.assertIs(k, k.abel)
+        gc.collect()
+        del k
+        self.assertEqual(1, gc.collect())
+
+    def test_buffer(self):
+        self.assertEqual(b"Bro", bytes(memoryview(Abel("Bro"))))
+        self.assertEqual(b"Sis", bytes(memoryview(Kain("Sis"))))
+        with self.assertRaises(TypeError):
+            memoryview(Abel("Bro"))[0] = 1
+
     def test_spawn(self):
         self.assertIsInstance(Abel().spawn(), Kain)
         self.assertIsInstance(Kain().spawn(), Abel)
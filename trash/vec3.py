@@ -5,21 +5,11 @@ _CPP_:
 #include "vector_helper.h"
 #include "io/log.h"
 
-#define MO__VEC_OP_COPY(op__, op_rev__) \
-    PyObject* left = (PyObject*)self, *right = (PyObject*)arg1; \
-    bool reversed = false; \
-    if (!$IS_INSTANCE(left, vec3)) \
-        { std::swap(left, right); reversed = true; }\
-    if (!$IS_INSTANCE(left, vec3)) \
-        { setPythonError(PyExc_TypeError, \
-                QString("Illegal arguments to binary operator, '%1' and '%2'") \
-                .arg(typeName(arg0)).arg(typeName(arg1))); } \
-    self = ($STRUCT(vec3)*)left; \
+// 'self' is always the vec3, reflected operators are called with the operands swapped
+#define MO__VEC_OP_COPY(op__) \
     auto ret = $COPY(self, vec3); \
-    if (reversed) \
-        { if (vectorBinaryOpInplace(ret, right, [](double& l, double r){ op_rev__; })) return (PyObject*)ret; } \
-    else \
-        if (vectorBinaryOpInplace(ret, right, [](double& l, double r){ op__; })) return (PyObject*)ret; \
+    if (vectorBinaryOpInplace(ret, arg1, [](double& l, double r){ op__; })) \
+        return (PyObject*)ret; \
     Py_DECREF(ret); \
     return NULL;
 
@@ -51,6 +41,10 @@ class vec3:
         for (size_t i=0; i<len; ++i)
             copy->v[i] = this->v[i];
     }
+    _CPP_(ITER):
+    if (index >= (Py_ssize_t)self->len)
+        return NULL;
+    return toPython(self->v[index]);
     """
 
     def __init__(self, arg=None):
@@ -162,7 +156,7 @@ class vec3:
         :param other: float sequence of length 3
         :return: True or False
         _CPP_:
-        return vectorRichCompare(self, arg1, arg2);
+        return vectorRichCompare(self, arg1, Py_EQ);
         """
         if isinstance(other, vec3):
             return self.v == other.v
@@ -193,11 +187,15 @@ class vec3:
     def __add__(self, arg):
         """
         _CPP_:
-        MO__VEC_OP_COPY(l += r, l = r + l)
+        MO__VEC_OP_COPY(l += r)
         """
         return self._binary_operator(arg, lambda l, r: l + r)
 
     def __radd__(self, arg):
+        """
+        _CPP_:
+        MO__VEC_OP_COPY(l = r + l)
+        """
         return self._binary_operator_inplace(arg, lambda r, l: l + r)
 
     def __iadd__(self, arg):
@@ -211,11 +209,15 @@ class vec3:
     def __sub__(self, arg):
         """
         _CPP_:
-        MO__VEC_OP_COPY(l -= r, l = r - l)
+        MO__VEC_OP_COPY(l -= r)
         """
         return self._binary_operator(arg, lambda l, r: l - r)
 
     def __rsub__(self, arg):
+        """
+        _CPP_:
+        MO__VEC_OP_COPY(l = r - l)
+        """
         return self._binary_operator(arg, lambda r, l: l - r)
 
     def __isub__(self, arg):
@@ -229,11 +231,15 @@ class vec3:
     def __mul__(self, arg):
         """
         _CPP_:
-        MO__VEC_OP_COPY(l *= r, l = r * l)
+        MO__VEC_OP_COPY(l *= r)
         """
         return self._binary_operator(arg, lambda l, r: l * r)
 
     def __rmul__(self, arg):
+        """
+        _CPP_:
+        MO__VEC_OP_COPY(l = r * l)
+        """
         return self._binary_operator(arg, lambda r, l: l * r)
 
     def __imul__(self, arg):
@@ -247,11 +253,15 @@ class vec3:
     def __truediv__(self, arg):
         """
         _CPP_:
-        MO__VEC_OP_COPY(l /= r, l = r / l)
+        MO__VEC_OP_COPY(l /= r)
         """
         return self._binary_operator(arg, lambda l, r: l / r)
 
     def __rtruediv__(self, arg):
+        """
+        _CPP_:
+        MO__VEC_OP_COPY(l = r / l)
+        """
         return self._binary_operator(arg, lambda r, l: l / r)
 
     def __itruediv__(self, arg):
@@ -265,11 +275,15 @@ class vec3:
     def __mod__(self, arg):
         """
         _CPP_:
-        MO__VEC_OP_COPY(l = std::fmod(l, r), l = std::fmod(r, l))
+        MO__VEC_OP_COPY(l = std::fmod(l, r))
         """
         return self._binary_operator(arg, lambda l, r: l % r)
 
     def __rmod__(self, arg):
+        """
+        _CPP_:
+        MO__VEC_OP_COPY(l = std::fmod(r, l))
+        """
         return self._binary_operator(arg, lambda r, l: l % r)
 
     def __imod__(self, arg):